@@ -1,6 +1,6 @@
 """Configuration settings for the Restaurant Manager API"""
 
-from typing import Optional
+from typing import Dict, List, Optional
 from pydantic import Field
 from pydantic_settings import BaseSettings
 
@@ -33,7 +33,165 @@ class Settings(BaseSettings):
         default=None,
         description="Supabase service role key"
     )
-    
+
+    # Supabase HTTP Client
+    supabase_max_connections: int = Field(
+        default=100,
+        description="Maximum number of concurrent connections to the Supabase REST API"
+    )
+    supabase_max_keepalive_connections: int = Field(
+        default=20,
+        description="Maximum number of idle connections kept open for reuse"
+    )
+    supabase_keepalive_expiry: float = Field(
+        default=30.0,
+        description="Seconds an idle keep-alive connection is kept before closing"
+    )
+    supabase_http2: bool = Field(
+        default=False,
+        description="Use HTTP/2 for Supabase requests (requires the 'h2' package)"
+    )
+    supabase_timeout: float = Field(
+        default=10.0,
+        description="Default timeout in seconds for Supabase REST calls"
+    )
+    supabase_connect_timeout: float = Field(
+        default=5.0,
+        description="Timeout in seconds for establishing a Supabase connection"
+    )
+
+    # Supabase Read Cache
+    supabase_cache_enabled: bool = Field(
+        default=False,
+        description="Cache Supabase GET responses in process memory"
+    )
+    supabase_cache_max_entries: int = Field(
+        default=2048,
+        description="Maximum number of cached Supabase GET responses"
+    )
+    supabase_cache_ttl: Dict[str, float] = Field(
+        default={"restaurants": 300.0, "tables": 60.0, "admins": 60.0},
+        description="Cache TTL in seconds per table; tables not listed are never cached"
+    )
+
+    # Reservations
+    reservation_duration_minutes: int = Field(
+        default=120,
+        description="How long a reservation occupies its table, in minutes"
+    )
+    business_hours_start: str = Field(
+        default="09:00",
+        description="Earliest reservation start time offered to guests (HH:MM)"
+    )
+    business_hours_end: str = Field(
+        default="22:00",
+        description="Latest reservation start time offered to guests (HH:MM, exclusive)"
+    )
+    availability_slot_minutes: int = Field(
+        default=15,
+        description="Granularity of the availability bitmaps, in minutes"
+    )
+    availability_cache_ttl: float = Field(
+        default=30.0,
+        description="Seconds a cached per-day availability bitmap is trusted"
+    )
+    dashboard_cache_ttl: float = Field(
+        default=60.0,
+        description="Seconds a cached per-day dashboard snapshot is trusted before it is rebuilt"
+    )
+    dashboard_cache_max_entries: int = Field(
+        default=256,
+        description="Maximum number of cached dashboard snapshots"
+    )
+
+    # Live dashboard events
+    events_history_size: int = Field(
+        default=1000,
+        description="Events kept per restaurant so reconnecting clients can resume from Last-Event-ID"
+    )
+    events_client_buffer: int = Field(
+        default=256,
+        description="Undelivered events a stream client may fall behind before it is disconnected"
+    )
+    events_keepalive_seconds: float = Field(
+        default=15.0,
+        description="Seconds between keepalive comments on idle event streams"
+    )
+    events_max_subscribers: int = Field(
+        default=50,
+        description="Event stream clients allowed per restaurant in one process; further connections get 429"
+    )
+
+    # Analytics
+    analytics_workers: int = Field(
+        default=2,
+        description="Worker processes computing analytics reports for large histories"
+    )
+    analytics_inline_rows: int = Field(
+        default=100000,
+        description="Histories up to this many reservations are computed in-process instead of in the pool"
+    )
+    analytics_page_size: int = Field(
+        default=10000,
+        description="Reservations fetched per page when loading analytics history"
+    )
+    analytics_cache_ttl: float = Field(
+        default=300.0,
+        description="Seconds a loaded reservation history is reused for analytics reports"
+    )
+    analytics_max_days: int = Field(
+        default=1096,
+        description="Longest date range one analytics report may cover"
+    )
+
+    # Joined tables
+    table_groups_cache_ttl: float = Field(
+        default=300.0,
+        description="Seconds a restaurant's joined-table index is cached; bounds staleness from other processes"
+    )
+    table_groups_cache_max_entries: int = Field(
+        default=256,
+        description="Maximum number of restaurants whose joined-table index is cached"
+    )
+
+    # Large-party seating
+    seating_max_tables: int = Field(
+        default=4,
+        description="Most adjacent tables joined to seat one party; 1 disables joining"
+    )
+    seating_max_sets: int = Field(
+        default=50000,
+        description="Cap on the connected table sets precomputed per floor plan"
+    )
+    seating_plan_ttl: float = Field(
+        default=3600.0,
+        description="Seconds a precomputed seating plan is kept; plans are rebuilt anyway when tables change"
+    )
+    seating_floor_plans: Dict[str, Dict[str, List[str]]] = Field(
+        default={},
+        description="Per-restaurant adjacency (table name -> neighbouring table names), keyed by restaurant id; restaurants without one join neighbouring table numbers in the same location"
+    )
+
+    # Reservation export
+    export_page_size: int = Field(
+        default=1000,
+        description="Reservations fetched per page while streaming an export"
+    )
+
+    # Reservation rollups
+    rollups_enabled: bool = Field(
+        default=True,
+        description="Maintain per-restaurant daily and hourly reservation counters on write"
+    )
+    rollup_flush_interval: float = Field(
+        default=5.0,
+        description="Seconds buffered rollup deltas wait before being flushed"
+    )
+    rollup_max_pending: int = Field(
+        default=1000,
+        description="Buffered rollup counters that trigger an early flush"
+    )
+
     # Server Configuration
     host: str = "0.0.0.0"
     port: int = 8000
@@ -63,6 +221,188 @@ class Settings(BaseSettings):
         default=None,
         description="Secret token for validating Telegram webhook requests"
     )
+    telegram_webhook_async: bool = Field(
+        default=False,
+        description="Acknowledge webhook updates immediately and process them on a worker queue"
+    )
+    telegram_webhook_workers: int = Field(
+        default=4,
+        description="Number of worker coroutines processing queued Telegram updates"
+    )
+    telegram_webhook_queue_size: int = Field(
+        default=1000,
+        description="Maximum number of queued Telegram updates before the webhook sheds load"
+    )
+    telegram_global_rate: float = Field(
+        default=30.0,
+        description="Maximum Telegram messages sent per second across all chats"
+    )
+    telegram_per_chat_interval: float = Field(
+        default=1.0,
+        description="Minimum seconds between two messages to the same chat"
+    )
+    telegram_send_max_retries: int = Field(
+        default=3,
+        description="Retries for a Telegram send after rate limiting, timeouts or network errors"
+    )
+    admin_cache_ttl: float = Field(
+        default=300.0,
+        description="Seconds an admin profile looked up by Telegram chat id stays cached"
+    )
+    admin_cache_negative_ttl: float = Field(
+        default=30.0,
+        description="Seconds a chat id with no linked admin stays cached"
+    )
+    admin_cache_max_entries: int = Field(
+        default=1024,
+        description="Maximum number of cached admin profiles"
+    )
+
+    # Pending-reservation notifications
+    notification_batch_size: int = Field(
+        default=1000,
+        description="Maximum number of pending reservations notified per background tick"
+    )
+    notification_sweep_interval: float = Field(
+        default=300.0,
+        description="Seconds between reconciliation sweeps for pending reservations nobody was notified about"
+    )
+    notification_wake_delay: float = Field(
+        default=1.0,
+        description="Seconds a new reservation waits so bursts are notified in one batch"
+    )
+
+    # Notification outbox
+    outbox_path: str = Field(
+        default="outbox.sqlite3",
+        description="SQLite file holding queued notifications until Telegram accepts them"
+    )
+    outbox_batch_size: int = Field(
+        default=200,
+        description="Maximum entries written or dispatched per outbox round"
+    )
+    outbox_flush_interval: float = Field(
+        default=0.05,
+        description="Seconds the outbox writer waits to group concurrent enqueues into one transaction"
+    )
+    outbox_concurrency: int = Field(
+        default=20,
+        description="Maximum number of outbox deliveries in flight"
+    )
+    outbox_max_attempts: int = Field(
+        default=8,
+        description="Delivery attempts before an outbox entry is marked failed"
+    )
+    outbox_lease_seconds: float = Field(
+        default=120.0,
+        description="Seconds a claimed outbox entry is reserved before another dispatcher may retry it"
+    )
+    outbox_drain_timeout: float = Field(
+        default=10.0,
+        description="Seconds shutdown waits for the outbox to drain"
+    )
+    outbox_retention_days: float = Field(
+        default=7.0,
+        description="Days sent and failed outbox entries are kept"
+    )
+    outbox_record_messages: bool = Field(
+        default=True,
+        description="Record delivered Telegram message ids in the telegram_messages table"
+    )
+
+    # Notification digests
+    digest_window_seconds: float = Field(
+        default=60.0,
+        description="Seconds over which new-reservation notifications to one admin are counted and coalesced"
+    )
+    digest_threshold: int = Field(
+        default=3,
+        description="Notifications per restaurant within the window from which admins get one digest instead of single messages; 0 disables digests"
+    )
+    digest_thresholds: Dict[str, int] = Field(
+        default={},
+        description="Per-restaurant overrides of digest_threshold, keyed by restaurant id"
+    )
+
+    # Client reminders
+    reminders_enabled: bool = Field(
+        default=True,
+        description="Send clients a reminder before their confirmed reservations"
+    )
+    reminder_hours_before: float = Field(
+        default=2.0,
+        description="Hours before a reservation to remind the client (system_settings.reminder_hours_before overrides it)"
+    )
+    reminder_channels: List[str] = Field(
+        default=["telegram", "email"],
+        description="Reminder channels in priority order: telegram, email, file"
+    )
+    reminder_language: str = Field(
+        default="en",
+        description="Language of client reminders"
+    )
+    reminder_refresh_interval: float = Field(
+        default=600.0,
+        description="Seconds between reloads of the upcoming reminder schedule"
+    )
+    reminder_page_size: int = Field(
+        default=1000,
+        description="Rows fetched per page when loading upcoming reservations"
+    )
+    reminder_state_path: str = Field(
+        default="reminders.sqlite3",
+        description="SQLite file recording which reminders were sent"
+    )
+    reminder_file_path: str = Field(
+        default="reminders.jsonl",
+        description="Output of the file reminder channel (local stand-in for real delivery)"
+    )
+    smtp_host: Optional[str] = Field(
+        default=None,
+        description="SMTP server used for email reminders"
+    )
+    smtp_port: int = Field(
+        default=587,
+        description="SMTP server port"
+    )
+    smtp_username: Optional[str] = Field(
+        default=None,
+        description="SMTP login username"
+    )
+    smtp_password: Optional[str] = Field(
+        default=None,
+        description="SMTP login password"
+    )
+    smtp_sender: Optional[str] = Field(
+        default=None,
+        description="From address of email reminders (defaults to the SMTP username)"
+    )
+    smtp_use_tls: bool = Field(
+        default=True,
+        description="Upgrade the SMTP connection with STARTTLS"
+    )
+
+    # Background jobs
+    run_background_tasks: bool = Field(
+        default=True,
+        description="Run the periodic jobs inside the API process; disable when running app.worker"
+    )
+    leader_lock_backend: str = Field(
+        default="file",
+        description="Leader election used by the periodic jobs: file, postgres or none"
+    )
+    leader_lock_path: str = Field(
+        default="/tmp/restaurant-manager-scheduler.lock",
+        description="Lock file used by the file leader lock"
+    )
+    leader_lock_key: int = Field(
+        default=72_410_001,
+        description="Advisory lock key used by the postgres leader lock"
+    )
+    leader_retry_interval: float = Field(
+        default=5.0,
+        description="Seconds between leadership attempts and health checks"
+    )
     
 # Global settings instance
 settings = Settings()
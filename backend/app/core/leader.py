@@ -0,0 +1,180 @@
+"""Leader election so periodic jobs run in exactly one process"""
+
+import asyncio
+import fcntl
+import logging
+import os
+from typing import Awaitable, Callable, Optional
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderLock:
+    """
+    A lock that at most one process holds at a time. acquire() never blocks:
+    it returns whether this process is now the leader.
+    """
+
+    name = "none"
+
+    async def acquire(self) -> bool:
+        return True
+
+    async def is_held(self) -> bool:
+        return True
+
+    async def release(self):
+        pass
+
+
+class FileLeaderLock(LeaderLock):
+    """
+    flock() on a local file. Elects one leader among processes on the same
+    host (e.g. several uvicorn workers); the OS drops the lock if the
+    process dies.
+    """
+
+    name = "file"
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd: Optional[int] = None
+
+    async def acquire(self) -> bool:
+        if self._fd is not None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._fd = fd
+        return True
+
+    async def is_held(self) -> bool:
+        return self._fd is not None
+
+    async def release(self):
+        if self._fd is None:
+            return
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+        self._fd = None
+
+
+class PostgresAdvisoryLock(LeaderLock):
+    """
+    Session-level pg_try_advisory_lock on a dedicated connection. Elects one
+    leader across hosts and replicas; the lock is released when the
+    connection closes, so a crashed leader is replaced automatically.
+    """
+
+    name = "postgres"
+
+    def __init__(self, dsn: str, key: int):
+        # asyncpg doesn't understand SQLAlchemy-style driver suffixes
+        self.dsn = dsn.replace("postgresql+asyncpg://", "postgresql://", 1)
+        self.key = key
+        self._conn = None
+
+    async def acquire(self) -> bool:
+        if self._conn is not None:
+            return True
+        import asyncpg
+
+        conn = await asyncpg.connect(self.dsn)
+        try:
+            acquired = await conn.fetchval("SELECT pg_try_advisory_lock($1)", self.key)
+        except Exception:
+            await conn.close()
+            raise
+        if not acquired:
+            await conn.close()
+            return False
+        self._conn = conn
+        return True
+
+    async def is_held(self) -> bool:
+        if self._conn is None:
+            return False
+        try:
+            await self._conn.fetchval("SELECT 1")
+            return True
+        except Exception as e:
+            logger.warning(f"Lost leader connection: {e}")
+            await self._drop_connection()
+            return False
+
+    async def release(self):
+        if self._conn is None:
+            return
+        try:
+            await self._conn.fetchval("SELECT pg_advisory_unlock($1)", self.key)
+        except Exception as e:
+            logger.warning(f"Failed to release advisory lock {self.key}: {e}")
+        await self._drop_connection()
+
+    async def _drop_connection(self):
+        conn, self._conn = self._conn, None
+        try:
+            await conn.close()
+        except Exception:
+            pass
+
+
+def create_leader_lock() -> LeaderLock:
+    """
+    Builds the lock selected by LEADER_LOCK_BACKEND (file, postgres or none).
+    """
+    backend = settings.leader_lock_backend
+    if backend == "file":
+        return FileLeaderLock(settings.leader_lock_path)
+    if backend == "postgres":
+        if not settings.database_url:
+            raise ValueError("LEADER_LOCK_BACKEND=postgres requires DATABASE_URL")
+        return PostgresAdvisoryLock(settings.database_url, settings.leader_lock_key)
+    if backend == "none":
+        return LeaderLock()
+    raise ValueError(f"Unknown leader lock backend: {backend}")
+
+
+async def run_as_leader(
+    lock: LeaderLock,
+    job: Callable[[], Awaitable[None]],
+    retry_interval: Optional[float] = None,
+):
+    """
+    Runs job() only while this process holds the lock. Followers retry every
+    retry_interval seconds; a leader that loses the lock cancels its job and
+    goes back to following. Runs until cancelled.
+    """
+    retry_interval = retry_interval or settings.leader_retry_interval
+    while True:
+        try:
+            acquired = await lock.acquire()
+        except Exception as e:
+            logger.error(f"Leader election via {lock.name} lock failed: {e}")
+            acquired = False
+        if not acquired:
+            await asyncio.sleep(retry_interval)
+            continue
+
+        logger.info(f"Acquired {lock.name} leader lock (pid {os.getpid()}); starting background jobs")
+        task = asyncio.create_task(job())
+        try:
+            while not task.done():
+                await asyncio.wait({task}, timeout=retry_interval)
+                if not task.done() and not await lock.is_held():
+                    logger.warning("Leadership lost; stopping background jobs")
+                    break
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            await lock.release()
+        if task.done() and not task.cancelled() and task.exception():
+            logger.error(f"Background job crashed: {task.exception()}")
+        await asyncio.sleep(retry_interval)
@@ -8,8 +8,23 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 
 from .core.config import settings
-from .routers import tables, reservations, telegram, auth, restaurants, telegram_settings
+from .routers import tables, reservations, telegram, auth, restaurants, telegram_settings, analytics
+from .core.leader import create_leader_lock, run_as_leader
 from .services.background_tasks import main_task
+from .services.scheduler import scheduler
+from .services.reminders import reminder_engine
+from .services.outbox import outbox
+from .supabase_client import init_http_client, close_http_client, get_supabase_stats
+from .services.availability_cache import availability_cache
+from .services.dashboard import dashboard_cache
+from .services.events import event_bus
+from .services.analytics import analytics_engine
+from .services.rollups import rollup_writer
+from .services.seating import seating_planner
+from .services.table_groups import table_groups
+from .services.table_numbers import table_number_allocator
+from .services.booking import booking_coordinator
+from .services.telegram_service import telegram_service, get_admin_cache_stats
 
 # Load environment variables from .env file
 load_dotenv()
@@ -24,7 +39,15 @@ async def lifespan(app: FastAPI):
     print(
         f"📊 API Documentation available at: http://{settings.host}:{settings.port}/docs"
     )
-    background_task = asyncio.create_task(main_task())
+    await init_http_client()
+    rollup_writer.start()
+    if settings.telegram_webhook_async:
+        telegram.update_queue.start()
+    if telegram_service:
+        # Picks up notifications queued before a restart
+        outbox.start()
+    if settings.run_background_tasks:
+        background_task = asyncio.create_task(run_as_leader(create_leader_lock(), main_task))
     yield
     # Shutdown
     if background_task:
@@ -33,7 +56,14 @@ async def lifespan(app: FastAPI):
             await background_task
         except asyncio.CancelledError:
             pass
-    print("🛑 No database connections to close (using Supabase REST API)")
+    await telegram.update_queue.stop()
+    await outbox.stop()
+    if telegram_service:
+        await telegram_service.sender.stop()
+    analytics_engine.shutdown()
+    await rollup_writer.stop()
+    await close_http_client()
+    print("🛑 Closed Supabase HTTP connection pool")
 
 # Create FastAPI application
 app = FastAPI(
@@ -99,6 +129,7 @@ app.include_router(telegram.router, prefix="/api/v1")
 app.include_router(telegram_settings.router, prefix="/api/v1")
 app.include_router(auth.router, prefix="/api/v1")
 app.include_router(restaurants.router, prefix="/api/v1")
+app.include_router(analytics.router, prefix="/api/v1")
 
 
 
@@ -145,6 +176,29 @@ async def health_check():
         "version": settings.app_version,
     }
 
+# Metrics endpoint
+@app.get("/metrics", tags=["health"])
+async def metrics():
+    """Runtime counters for monitoring"""
+    return {
+        "supabase": get_supabase_stats(),
+        "availability_cache": availability_cache.stats(),
+        "dashboard_cache": dashboard_cache.stats(),
+        "events": event_bus.stats(),
+        "analytics": analytics_engine.stats(),
+        "rollups": rollup_writer.stats(),
+        "table_numbers": table_number_allocator.stats(),
+        "table_groups": table_groups.stats(),
+        "seating": seating_planner.stats(),
+        "bookings": booking_coordinator.stats(),
+        "telegram_updates": telegram.update_queue.stats(),
+        "admin_cache": get_admin_cache_stats(),
+        "scheduler": scheduler.stats(),
+        "reminders": reminder_engine.stats(),
+        "telegram_sender": telegram_service.sender.stats() if telegram_service else None,
+        "outbox": outbox.stats(),
+    }
+
 # Global exception handler
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
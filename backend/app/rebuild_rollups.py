@@ -0,0 +1,72 @@
+"""Rebuilds reservation rollups from raw reservation history.
+
+Use after enabling rollups on an existing database, or to repair counters
+after a process died with deltas still buffered:
+
+    python -m app.rebuild_rollups [--restaurant ID ...] [--start YYYY-MM-DD] [--end YYYY-MM-DD]
+
+Without --restaurant every restaurant is rebuilt. Each restaurant's range is
+replaced in one transaction; writes landing while its history is being read
+may be counted twice or not at all, so prefer a quiet moment.
+"""
+
+import argparse
+import asyncio
+import logging
+from datetime import date, timedelta
+from dotenv import load_dotenv
+
+from .services.analytics import analytics_engine, hourly_rollups
+from .services.restaurant_service import restaurant_service
+from .services.rollups import replace_rollups
+from .supabase_client import init_http_client, close_http_client
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+async def rebuild_restaurant(restaurant_id: str, first_day: date, last_day: date) -> int:
+    """
+    Recomputes one restaurant's rollups in [first_day, last_day] and returns
+    the number of rollup rows written.
+    """
+    history = await analytics_engine.fetch_history(restaurant_id, first_day, last_day)
+    rows = await asyncio.to_thread(hourly_rollups, history, first_day, (last_day - first_day).days + 1)
+    await replace_rollups(restaurant_id, first_day, last_day, rows)
+    logger.info(f"Rebuilt {len(rows)} rollups from {len(history)} reservations for restaurant {restaurant_id}")
+    return len(rows)
+
+
+async def rebuild(restaurant_ids, first_day: date, last_day: date):
+    await init_http_client()
+    try:
+        if not restaurant_ids:
+            restaurant_ids = [restaurant.id for restaurant in await restaurant_service.get_all_restaurants()]
+        for restaurant_id in restaurant_ids:
+            await rebuild_restaurant(restaurant_id, first_day, last_day)
+    finally:
+        await close_http_client()
+
+
+def main():
+    today = date.today()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--restaurant", action="append", dest="restaurants", default=[])
+    parser.add_argument("--start", type=date.fromisoformat, default=today - timedelta(days=3 * 365))
+    parser.add_argument("--end", type=date.fromisoformat, default=today + timedelta(days=365))
+    args = parser.parse_args()
+    if args.start > args.end:
+        parser.error("--start must not be after --end")
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="[%(asctime)s] %(levelname)s %(name)s: %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    asyncio.run(rebuild(args.restaurants, args.start, args.end))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Occupancy and peak-hour analytics computed from reservation history"""
+
+import logging
+from datetime import date, timedelta
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
+from ..schemas.analytics import AnalyticsResponse, RollupReportResponse
+from app.services.analytics import analytics_engine
+from app.services.rollups import get_rollups, summarize_rollups
+from app.core.config import settings
+
+router = APIRouter(prefix="/analytics", tags=["analytics"])
+
+logger = logging.getLogger(__name__)
+
+
+def _date_range(start: Optional[date], end: Optional[date]):
+    end = end or date.today()
+    start = start or end - timedelta(days=29)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    if (end - start).days >= settings.analytics_max_days:
+        raise HTTPException(status_code=400, detail=f"Date range is limited to {settings.analytics_max_days} days")
+    return start, end
+
+
+@router.get(
+    "/{restaurant_id}/rollups",
+    response_model=RollupReportResponse,
+    summary="Get daily and hourly totals from rollups",
+    description="Daily totals by status and seated reservations per hour, read from the counters maintained on write (the last 30 days by default).",
+)
+async def get_rollup_report(
+    restaurant_id: str,
+    start: Optional[date] = Query(None),
+    end: Optional[date] = Query(None),
+):
+    start, end = _date_range(start, end)
+    try:
+        rows = await get_rollups(restaurant_id, start, end)
+    except Exception as e:
+        logger.error(f"Rollups for restaurant {restaurant_id} failed: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to read rollups")
+    return RollupReportResponse(restaurant_id=restaurant_id, start=start, end=end, **summarize_rollups(rows))
+
+
+@router.get(
+    "/{restaurant_id}",
+    response_model=AnalyticsResponse,
+    summary="Get reservation analytics",
+    description="Daily totals, a weekday-by-hour heatmap, seat utilization and confirmation rates for a date range (the last 30 days by default).",
+)
+async def get_analytics(
+    restaurant_id: str,
+    start: Optional[date] = Query(None),
+    end: Optional[date] = Query(None),
+):
+    start, end = _date_range(start, end)
+    try:
+        report = await analytics_engine.report(restaurant_id, start, end)
+    except Exception as e:
+        logger.error(f"Analytics for restaurant {restaurant_id} failed: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to compute analytics")
+    return AnalyticsResponse(restaurant_id=restaurant_id, start=start, end=end, **report)
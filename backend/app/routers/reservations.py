@@ -1,20 +1,33 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks, Depends, Query
+import logging
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Depends, Header, Query, Response
+from fastapi.responses import StreamingResponse
 from ..schemas.reservation import (
+    Reservation,
     ReservationCreate,
     ReservationResponse,
     ReservationErrorResponse,
     DashboardStatusResponse,
+    AvailabilityResponse,
 )
 from ..schemas.admin import Admin
 from app.services.reservation_service import reservation_service
 from app.services.telegram_service import telegram_service, get_admin_by_telegram_id
-from app.services.restaurant_service import restaurant_service
-from app.supabase_client import supabase_get
-from datetime import datetime, timedelta, date
+from app.services.background_tasks import notify_new_reservation, request_pending_notifications
+from app.services.availability import AvailabilityIndex, slot_bounds, to_minutes
+from app.services.availability_cache import availability_cache
+from app.services.booking import booking_coordinator
+from app.services.dashboard import build_all_snapshots, dashboard_cache, render_combined
+from app.services.events import RESERVATION_FIELDS, compact, event_bus
+from app.services.export import EXPORT_FORMATS, export_pages, stream_export
+from app.services.seating import seating_planner, split_party
+from app.core.config import settings
+from datetime import datetime, timedelta, date, time
 from typing import Optional, List
 
 router = APIRouter(prefix="/reservations", tags=["reservations"])
 
+logger = logging.getLogger(__name__)
+
 @router.post(
     "/",
     response_model=ReservationResponse,
@@ -24,128 +37,219 @@ router = APIRouter(prefix="/reservations", tags=["reservations"])
     description="Create a reservation if a table is available for the requested time and party size.",
 )
 async def create_reservation(reservation: ReservationCreate, background_tasks: BackgroundTasks):
-    tables_params = {
-        "capacity": f"gte.{reservation.party_size}",
-        "restaurant_id": f"eq.{reservation.restaurant_id}"
-    }
-    tables = await supabase_get("tables", params=tables_params)
-
-    suitable_tables = [t for t in tables if t.get("capacity", 0) >= reservation.party_size]
-    if not suitable_tables:
+    requested_datetime = datetime.combine(reservation.reservation_date, reservation.reservation_time)
+    slot_start, slot_end = slot_bounds(requested_datetime)
+
+    suitable_tables = await reservation_service.get_restaurant_tables(
+        reservation.restaurant_id, min_capacity=reservation.party_size
+    )
+    joining = settings.seating_max_tables > 1
+    if not suitable_tables and not joining:
         raise HTTPException(
             status_code=400,
             detail=ReservationErrorResponse(error="No tables available for this party size at the specified restaurant").dict()
         )
 
+    # Only reservations starting within one duration of the slot can overlap it
+    duration = slot_end - slot_start
+    reservations = await reservation_service.get_active_reservations(
+        [table["id"] for table in suitable_tables],
+        first_day=(slot_start - duration).date(),
+        last_day=(slot_end - timedelta(minutes=1)).date(),
+    )
 
+    availability = AvailabilityIndex.build(
+        suitable_tables,
+        reservations,
+        window_start=slot_start,
+        window_end=slot_end,
+    )
 
-    tables_for_reservations_params = {"restaurant_id": f"eq.{reservation.restaurant_id}"}
-    tables_for_reservations_data = await supabase_get("tables", params=tables_for_reservations_params)
-    table_ids_for_reservations = [table["id"] for table in tables_for_reservations_data]
-
-    reservations = []
-    if table_ids_for_reservations:
-        reservations_params = {"table_id": f"in.({','.join(map(str, table_ids_for_reservations))})"}
-        reservations = await supabase_get("reservations", params=reservations_params)
-
-    requested_datetime = datetime.combine(reservation.reservation_date, reservation.reservation_time)
-
-    slot_start = requested_datetime
-    slot_end = requested_datetime + timedelta(hours=2)
-
-    def is_conflict(existing, current_table_id):
-        full_datetime_str = f"{existing['reservation_date']}T{existing['reservation_time']}"
-        existing_time = datetime.fromisoformat(full_datetime_str)
-        if existing_time.tzinfo is not None:
-            existing_time = existing_time.replace(tzinfo=None)
-            
-        existing_start = existing_time
-        existing_end = existing_time + timedelta(hours=2)
-        return (
-            existing["table_id"] == current_table_id
-            and slot_start < existing_end
-            and slot_end > existing_start
+    async def insert(table_id: int):
+        reservation_data_for_service = ReservationCreate(
+            client_name=reservation.client_name,
+            client_contact=reservation.client_contact,
+            reservation_date=reservation.reservation_date,
+            reservation_time=reservation.reservation_time,
+            party_size=reservation.party_size,
+            customer_id=reservation.customer_id,
+            restaurant_id=reservation.restaurant_id,
+            table_id=table_id
         )
+        created = await reservation_service.create_reservation(reservation_data_for_service)
+        if not created:
+            raise HTTPException(status_code=400, detail="Failed to create reservation.")
+        return created
 
-    available_table_id = None
-    for table in suitable_tables:
-        table_id = table["id"]
-        conflict = any(
-            is_conflict(r, table_id)
-            for r in reservations
-        )
-        if not conflict:
-            available_table_id = table_id
-            break
+    start = to_minutes(slot_start)
+    created_res = await booking_coordinator.book(
+        availability.free_tables(reservation.party_size, start),
+        start,
+        availability.duration,
+        insert,
+    )
+    created_all = [created_res] if created_res else []
 
-    if available_table_id is None:
+    if created_res is None and joining:
+        created_all = await _book_joined_tables(reservation, slot_start, slot_end) or []
+        created_res = created_all[0] if created_all else None
+
+    if created_res is None:
         raise HTTPException(
             status_code=400,
             detail=ReservationErrorResponse(error="No tables available at the requested time for the specified restaurant").dict()
         )
 
-
-    reservation_data_for_service = ReservationCreate(
-        client_name=reservation.client_name,
-        client_contact=reservation.client_contact,
-        reservation_date=reservation.reservation_date,
-        reservation_time=reservation.reservation_time,
-        party_size=reservation.party_size,
-        customer_id=reservation.customer_id,
-        restaurant_id=reservation.restaurant_id,
-        table_id=available_table_id
-    )
-    
-    created_res = await reservation_service.create_reservation(reservation_data_for_service)
-
-    if not created_res:
-        raise HTTPException(status_code=400, detail="Failed to create reservation.")
-
-
-    if created_res.status == "pending" and telegram_service:
-        restaurant = await restaurant_service.get_restaurant_by_id(created_res.restaurant_id)
-        restaurant_name = restaurant.name if restaurant else "Unknown Restaurant"
-        reservation_datetime = datetime.combine(created_res.reservation_date, created_res.reservation_time)
-        reservation_info = (
-            f"<b>New pending reservation:</b>\n"
-            f"Restaurant: {restaurant_name}\n"
-            f"Reservation ID: {created_res.id}\n"
-            f"Client Name: {created_res.client_name}\n"
-            f"Contact: {created_res.client_contact}\n"
-            f"Time: {reservation_datetime.strftime('%Y-%m-%d %H:%M')}\n"
-            f"Party Size: {created_res.party_size}\n"
-            f"Status: {created_res.status}"
+    for created in created_all:
+        availability_cache.apply_reservation(
+            created.id,
+            created.table_id,
+            created.reservation_date,
+            created.reservation_time,
+            created.status,
         )
+        dashboard_cache.apply_reservation(created.model_dump(mode="json"))
+        event_bus.publish(created.restaurant_id, "reservation.created", compact(created, RESERVATION_FIELDS))
 
-        try:
-            admins_params = {
-                "restaurant_id": f"eq.{created_res.restaurant_id}",
-                "telegram_chat_id": "not.is.null"
-            }
-            admins = await supabase_get("admins", params=admins_params)
-            
-            for admin in admins:
-                chat_id = admin.get("telegram_chat_id")
-                if chat_id:
-                    background_tasks.add_task(
-                        telegram_service.send_reservation_notification,
-                        chat_id,
-                        str(created_res.id),
-                        reservation_info
-                    )
-
-        except Exception as e:
-            import logging
-            logging.getLogger(__name__).error(f"Failed to send Telegram notification to admins for restaurant {created_res.restaurant_id}: {e}")
+    if created_res.status == "pending" and telegram_service:
+        # The scheduler batches notifications and marks them sent; processes
+        # without a local scheduler notify this reservation themselves
+        if not request_pending_notifications():
+            # A joined-table booking is announced once, through its lead
+            background_tasks.add_task(notify_new_reservation, created_res)
 
     return ReservationResponse(
         reservation_id=created_res.id,
         status=created_res.status,
         table_id=created_res.table_id,
+        joined_table_ids=[created.table_id for created in created_all] if len(created_all) > 1 else None,
         message="Reservation created",
     )
 
 
+async def _book_joined_tables(
+    reservation: ReservationCreate,
+    slot_start: datetime,
+    slot_end: datetime,
+) -> Optional[List[Reservation]]:
+    """
+    Seats a party that no single free table fits on the free set of adjacent
+    tables wasting the fewest seats, with one reservation per table.
+    Returns the created reservations, or None when no set is free.
+    """
+    tables = await reservation_service.get_restaurant_tables(
+        reservation.restaurant_id, columns="id,name,capacity,location"
+    )
+    if len(tables) < 2:
+        return None
+
+    duration = slot_end - slot_start
+    reservations = await reservation_service.get_active_reservations(
+        [table["id"] for table in tables],
+        first_day=(slot_start - duration).date(),
+        last_day=(slot_end - timedelta(minutes=1)).date(),
+    )
+    availability = AvailabilityIndex.build(tables, reservations, window_start=slot_start, window_end=slot_end)
+    start = to_minutes(slot_start)
+    plan = seating_planner.plan(reservation.restaurant_id, tables)
+    free = plan.free_mask(lambda table_id: availability.is_free(table_id, start))
+    by_id = {table["id"]: table for table in tables}
+
+    async def insert(table_ids):
+        seated = [by_id[table_id] for table_id in table_ids]
+        guests = split_party(reservation.party_size, [table.get("capacity") or 0 for table in seated])
+        note = f"Party of {reservation.party_size} on joined tables {'+'.join(str(table.get('name')) for table in seated)}"
+        data = ReservationCreate(
+            client_name=reservation.client_name,
+            client_contact=reservation.client_contact,
+            reservation_date=reservation.reservation_date,
+            reservation_time=reservation.reservation_time,
+            party_size=reservation.party_size,
+            customer_id=reservation.customer_id,
+            restaurant_id=reservation.restaurant_id,
+            special_requests=f"{reservation.special_requests}\n{note}" if reservation.special_requests else note,
+        )
+        return await reservation_service.create_joined_reservations(data, list(zip(table_ids, guests)))
+
+    return await booking_coordinator.book_group(
+        plan.seatings(reservation.party_size, free),
+        start,
+        availability.duration,
+        insert,
+    )
+
+
+@router.get(
+    "/availability",
+    response_model=AvailabilityResponse,
+    summary="Get bookable times",
+    description="List every start time on a date at which a table seating the party, or a set of adjacent tables joined for it, is free.",
+)
+async def get_availability(
+    restaurant_id: str,
+    date: date = Query(...),
+    party_size: int = Query(..., ge=1),
+):
+    availability = await availability_cache.get(restaurant_id, date)
+    seating = None
+    if settings.seating_max_tables > 1:
+        # Same fallback as booking: parties no free table seats go on joined tables
+        tables = await reservation_service.get_restaurant_tables(restaurant_id, columns="id,name,capacity,location")
+        if len(tables) > 1:
+            seating = seating_planner.plan(restaurant_id, tables)
+    available_times = availability.bookable_times(
+        party_size,
+        opens=time.fromisoformat(settings.business_hours_start),
+        closes=time.fromisoformat(settings.business_hours_end),
+        seating=seating,
+    )
+    return AvailabilityResponse(
+        restaurant_id=restaurant_id,
+        date=date,
+        party_size=party_size,
+        slot_minutes=availability.slot_minutes,
+        available_times=available_times,
+    )
+
+
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"text/csv": {}, "application/x-ndjson": {}}}},
+    summary="Export reservation history",
+    description=(
+        "Streams the reservations of the admin's restaurant in id order as CSV or NDJSON without buffering the export. "
+        "To resume an interrupted export, pass the id of the last row received as cursor; "
+        "a resumed CSV export has no header row, so it can be appended to the first part."
+    ),
+)
+async def export_reservations(
+    restaurant_id: Optional[str] = Query(None, description="The restaurant whose reservations to export; defaults to the admin's own"),
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    start: Optional[date] = Query(None, description="First reservation date to include"),
+    end: Optional[date] = Query(None, description="Last reservation date to include"),
+    status: Optional[str] = Query(None),
+    cursor: Optional[int] = Query(None, ge=0, description="Export reservations after this id"),
+    current_admin: Admin = Depends(get_admin_by_telegram_id),
+):
+    # The export holds client names and contacts: only a restaurant's own admin may take it
+    if not current_admin or not current_admin.restaurant_id:
+        raise HTTPException(status_code=403, detail="Unauthorized to export reservations.")
+    if restaurant_id and restaurant_id != current_admin.restaurant_id:
+        raise HTTPException(status_code=403, detail="Unauthorized to export reservations for this restaurant.")
+    restaurant_id = current_admin.restaurant_id
+    if start and end and start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+
+    pages = export_pages(restaurant_id, start, end, status, cursor)
+    filename = f"reservations-{restaurant_id}{f'-after-{cursor}' if cursor is not None else ''}.{format}"
+    return StreamingResponse(
+        stream_export(pages, format, header=cursor is None),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
 @router.get(
     "/pending",
     response_model=List[ReservationResponse],
@@ -175,57 +279,30 @@ async def get_pending_reservations(
     ]
 
 
-@router.get("/api/v1/dashboard-status", response_model=DashboardStatusResponse)
-async def dashboard_status(date: date = Query(...)):
+@router.get(
+    "/api/v1/dashboard-status",
+    response_model=DashboardStatusResponse,
+    responses={304: {"description": "The snapshot matches If-None-Match"}},
+    summary="Get the dashboard for a day",
+    description="Every table of a restaurant (or, uncached, of all restaurants when none is given) with all of its reservations for the date, in time order. Send the returned ETag as If-None-Match to get 304 while nothing has changed.",
+)
+async def dashboard_status(
+    date: date = Query(...),
+    restaurant_id: Optional[str] = Query(None),
+    if_none_match: Optional[str] = Header(None),
+):
     try:
-        # Fetch all tables
-        tables_data = await supabase_get("tables")
-        logger.debug(f"Supabase tables: {tables_data}")
-
-        # Fetch reservations for the date
-        reservations_data = await supabase_get("reservations", {"reservation_date": f"eq.{date}"})
-        logger.debug(f"Supabase reservations: {reservations_data}")
-
-        # Map reservations by table_id for quick lookup
-        reservations_by_table = {r["table_id"]: r for r in reservations_data}
-
-        # Compose dashboard tables with status and filtered fields
-        dashboard_tables = []
-        for table in tables_data:
-            reservation = reservations_by_table.get(table["id"])
-            status = reservation["status"] if reservation else "available"
-            
-            table_data = {
-                "id": table["id"],
-                "name": table["name"],
-                "capacity": table["capacity"],
-                "location": table.get("location"),
-                "status": status,
-            }
-            
-            if reservation:
-                table_data["reservation"] = {
-                    "id": reservation["id"],
-                    "customer_name": reservation.get("customer_name") or reservation.get("client_name") or "",
-                    "reservation_time": reservation["reservation_time"],
-                    "party_size": reservation["party_size"],
-                }
-            
-            dashboard_tables.append(table_data)
-
-        logger.debug(f"Dashboard tables count: {len(dashboard_tables)}")
-        logger.debug(f"Dashboard response structure: date={date}, tables_count={len(dashboard_tables)}, reservations_count={len(reservations_data)}")
-
-        # Return the properly structured response
-        response = {
-            "date": str(date),
-            "tables": dashboard_tables,
-            "reservations": reservations_data
-        }
-        
-        logger.debug(f"Final response: {response}")
-        return response
-        
+        if restaurant_id:
+            body, etag = (await dashboard_cache.get(restaurant_id, date)).render()
+        else:
+            body, etag = render_combined(date, await build_all_snapshots(date))
     except Exception as e:
         logger.error(f"Dashboard status error: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
+
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if if_none_match:
+        candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if etag in candidates or "*" in candidates:
+            return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -1,6 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from ..services.restaurant_service import RestaurantService
+from ..services.events import SubscriberLimitError, event_bus
+from ..services.telegram_service import get_admin_by_telegram_id
+from ..schemas.admin import Admin
 from ..schemas.restaurant import Restaurant
+from app.core.config import settings
 
 router = APIRouter(
     prefix="/restaurants",
@@ -20,3 +26,46 @@ async def get_restaurant_for_widget(
     if not restaurant:
         raise HTTPException(status_code=404, detail="Restaurant not found")
     return restaurant
+
+
+@router.get(
+    "/{restaurant_id}/events",
+    summary="Stream dashboard changes",
+    description=(
+        "Server-Sent Events stream of table and reservation changes for a restaurant. "
+        "Reconnect with Last-Event-ID (or last_event_id) to resume; a reset event means "
+        "the missed changes are gone and the dashboard should be reloaded. "
+        "Only the restaurant's admins may subscribe."
+    ),
+)
+async def stream_restaurant_events(
+    restaurant_id: str,
+    last_event_id: Optional[str] = Query(None),
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+    current_admin: Optional[Admin] = Depends(get_admin_by_telegram_id),
+):
+    if not current_admin or current_admin.restaurant_id != restaurant_id:
+        raise HTTPException(status_code=403, detail="Unauthorized to view events for this restaurant.")
+    try:
+        subscription = event_bus.subscribe(restaurant_id, last_event_id_header or last_event_id)
+    except SubscriberLimitError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "30"}) from e
+
+    async def stream():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                message = await subscription.next(settings.events_keepalive_seconds)
+                if message is None:
+                    # Fell too far behind; the client reconnects and resumes
+                    break
+                yield message or ": keepalive\n\n"
+        finally:
+            event_bus.unsubscribe(subscription)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
@@ -1,13 +1,28 @@
 """API routes for table management using Supabase REST API"""
 
-from typing import List , Optional
+from typing import Dict, List , Optional, Union
 from fastapi import APIRouter, HTTPException,  Depends
 import httpx
 from ..schemas.admin import Admin
 from app.services.telegram_service import get_admin_by_telegram_id
-from ..schemas.table import TableCreate, TableUpdate, TableResponse
+from app.services.availability_cache import availability_cache
+from app.services.dashboard import dashboard_cache
+from app.services.events import TABLE_FIELDS, compact, event_bus
+from app.services.table_groups import TableGroupError, table_groups
+from app.services.table_numbers import table_number_allocator
+from ..schemas.table import (
+    ApiResponse,
+    JoinedTableResponse,
+    TableCreate,
+    TableJoinRequest,
+    TableListResponse,
+    TableResponse,
+    TableUnjoinRequest,
+    TableUpdate,
+)
 from fastapi import Body
 from ..supabase_client import (
+    SupabaseError,
     supabase_get,
     supabase_post,
     supabase_patch,
@@ -17,65 +32,113 @@ from ..supabase_client import (
 router = APIRouter(prefix="/tables", tags=["tables"])
 
 
+def _scoped_restaurant(restaurant_id: Optional[str], current_admin: Optional[Admin]) -> Optional[str]:
+    """
+    The restaurant a request may act on: the admin's own, or the requested one
+    for callers not tied to a restaurant.
+    """
+    if current_admin and current_admin.restaurant_id:
+        if restaurant_id and restaurant_id != current_admin.restaurant_id:
+            raise HTTPException(status_code=403, detail="Unauthorized to access tables for this restaurant.")
+        return current_admin.restaurant_id
+    return restaurant_id
+
+
 @router.get(
     "/",
-    response_model=List[TableResponse],
+    response_model=Union[List[TableResponse], TableListResponse],
     summary="Get all tables",
-    description="Retrieve all tables with optional filtering. Joined tables are shown as single units.",
+    description=(
+        "Retrieve all tables with optional filtering. With grouped=true (requires a restaurant), "
+        "joined tables are shown as single units with their combined capacity."
+    ),
 )
 async def get_tables(
     restaurant_id: Optional[str] = None,
+    grouped: bool = False,
     current_admin: Admin = Depends(get_admin_by_telegram_id)
 ):
     """
     Get all tables with optional filtering
     """
     try:
+        restaurant_id = _scoped_restaurant(restaurant_id, current_admin)
+        if grouped:
+            if not restaurant_id:
+                raise HTTPException(status_code=400, detail="grouped=true requires a restaurant_id.")
+            index = await table_groups.get(restaurant_id)
+            return index.listing()
+
         params = {}
-        if current_admin and current_admin.restaurant_id:
-            if restaurant_id and restaurant_id != current_admin.restaurant_id:
-                raise HTTPException(status_code=403, detail="Unauthorized to view tables for this restaurant.")
-            params["restaurant_id"] = f"eq.{current_admin.restaurant_id}"
-        elif restaurant_id:
+        if restaurant_id:
             params["restaurant_id"] = f"eq.{restaurant_id}"
-        
 
         query_string = "&".join([f"{k}={v}" for k, v in params.items()])
         
         data = await supabase_get("tables", params=query_string if query_string else None)
         return data
+    except HTTPException:
+        raise
     except httpx.HTTPStatusError as e:
         raise HTTPException(status_code=e.response.status_code, detail=e.response.text) from e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}") from e
 
 
-async def _generate_table_name(restaurant_id: str) -> str:
-    """
-    Generates the next available table name (e.g., T1, T2, T3, etc.)
-    for a specific restaurant by querying existing tables.
-    """
+def _publish_table_rows(rows: List[dict]):
+    for row in rows:
+        dashboard_cache.apply_table(row)
+        event_bus.publish(row.get("restaurant_id"), "table.updated", compact(row, TABLE_FIELDS))
+
+
+@router.post(
+    "/join",
+    response_model=JoinedTableResponse,
+    summary="Join tables",
+    description="Join two or more tables (or joined groups) into one unit, e.g. T1+T2+T3, for a larger party.",
+)
+async def join_tables(
+    request: TableJoinRequest,
+    restaurant_id: Optional[str] = None,
+    current_admin: Admin = Depends(get_admin_by_telegram_id)
+):
+    restaurant_id = _scoped_restaurant(restaurant_id, current_admin)
+    if not restaurant_id:
+        raise HTTPException(status_code=400, detail="A restaurant_id is required.")
     try:
-        existing_tables = await supabase_get("tables", params=f"select=name&restaurant_id=eq.{restaurant_id}")
-        
-        table_numbers = []
-        for t in existing_tables:
-            if t and t.get("name", "").startswith("T"):
-                try:
-                    num = int(t["name"][1:])
-                    table_numbers.append(num)
-                except ValueError:
-                    pass
-        
-        next_number = 1
-        if table_numbers:
-            next_number = max(table_numbers) + 1
-            
-        return f"T{next_number}"
-    except httpx.HTTPStatusError as e:
-        raise HTTPException(status_code=e.response.status_code, detail=f"Failed to generate table name: {e.response.text}") from e
+        unit, rows = await table_groups.join(restaurant_id, request.table_numbers)
+    except TableGroupError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e)) from e
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"An unexpected error occurred while generating table name: {str(e)}") from e
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}") from e
+    availability_cache.invalidate_restaurant(restaurant_id)
+    _publish_table_rows(rows)
+    return unit
+
+
+@router.post(
+    "/unjoin",
+    response_model=ApiResponse,
+    summary="Unjoin tables",
+    description="Split a joined group (e.g. T1-T2-T3) back into individual tables.",
+)
+async def unjoin_tables(
+    request: TableUnjoinRequest,
+    restaurant_id: Optional[str] = None,
+    current_admin: Admin = Depends(get_admin_by_telegram_id)
+):
+    restaurant_id = _scoped_restaurant(restaurant_id, current_admin)
+    if not restaurant_id:
+        raise HTTPException(status_code=400, detail="A restaurant_id is required.")
+    try:
+        rows = await table_groups.unjoin(restaurant_id, request.joined_group_id)
+    except TableGroupError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e)) from e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}") from e
+    availability_cache.invalidate_restaurant(restaurant_id)
+    _publish_table_rows(rows)
+    return ApiResponse(message=f"Unjoined {len(rows)} tables from {request.joined_group_id}")
 
 
 @router.post(
@@ -90,12 +153,28 @@ async def create_table(table: TableCreate) -> TableResponse:
     Create a new table
     """
     try:
-        if table.name is None:
-            table.name = await _generate_table_name(table.restaurant_id)
-            
-        data = await supabase_post(
-            "tables", table.model_dump(exclude_unset=True, exclude_none=True)
-        )
+        auto_named = table.name is None
+        if auto_named:
+            table.name = (await table_number_allocator.allocate(table.restaurant_id))[0]
+
+        try:
+            data = await supabase_post(
+                "tables", table.model_dump(exclude_unset=True, exclude_none=True)
+            )
+        except SupabaseError as e:
+            if not (auto_named and e.status_code == 409):
+                raise
+            # Another process took the name; reseed from the database and retry once
+            table_number_allocator.invalidate(table.restaurant_id)
+            table.name = (await table_number_allocator.allocate(table.restaurant_id))[0]
+            data = await supabase_post(
+                "tables", table.model_dump(exclude_unset=True, exclude_none=True)
+            )
+        table_number_allocator.observe(table.restaurant_id, [data[0].get("name")])
+        table_groups.apply_table(data[0])
+        availability_cache.invalidate_restaurant(table.restaurant_id)
+        dashboard_cache.apply_table(data[0])
+        event_bus.publish(table.restaurant_id, "table.created", compact(data[0], TABLE_FIELDS))
         return data[0]
     except httpx.HTTPStatusError as e:
         raise HTTPException(status_code=e.response.status_code, detail=e.response.text) from e
@@ -113,11 +192,29 @@ async def create_tables_bulk(
     tables: List[TableCreate] = Body(..., embed=True)
 ) -> List[TableResponse]:
     """
-    Create multiple tables in bulk
+    Create multiple tables in bulk, naming unnamed ones with a block of
+    consecutive numbers per restaurant
     """
     try:
+        unnamed: Dict[str, List[TableCreate]] = {}
+        for table in tables:
+            if table.name is None:
+                unnamed.setdefault(table.restaurant_id, []).append(table)
+        for restaurant_id, group in unnamed.items():
+            taken = [table.name for table in tables if table.restaurant_id == restaurant_id]
+            names = await table_number_allocator.allocate(restaurant_id, len(group), taken=taken)
+            for table, name in zip(group, names):
+                table.name = name
+
         payload = [table.model_dump(exclude_unset=True, exclude_none=True) for table in tables]
         data = await supabase_post("tables", payload)
+        for restaurant_id in {table.restaurant_id for table in tables}:
+            availability_cache.invalidate_restaurant(restaurant_id)
+        for row in data:
+            table_number_allocator.observe(row.get("restaurant_id"), [row.get("name")])
+            table_groups.apply_table(row)
+            dashboard_cache.apply_table(row)
+            event_bus.publish(row.get("restaurant_id"), "table.created", compact(row, TABLE_FIELDS))
         return data
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -137,6 +234,11 @@ async def update_table(table_id: int, table: TableUpdate) -> TableResponse:
         data = await supabase_patch(
             "tables", table_id, table.model_dump(exclude_unset=True, exclude_none=True)
         )
+        availability_cache.invalidate_table(table_id)
+        table_number_allocator.observe(data[0].get("restaurant_id"), [data[0].get("name")])
+        table_groups.apply_table(data[0])
+        dashboard_cache.apply_table(data[0])
+        event_bus.publish(data[0].get("restaurant_id"), "table.updated", compact(data[0], TABLE_FIELDS))
         return data[0]
     except httpx.HTTPStatusError as e:
         raise HTTPException(status_code=e.response.status_code, detail=e.response.text) from e
@@ -158,6 +260,11 @@ async def replace_table(table_id: int, table: TableUpdate) -> TableResponse:
         data = await supabase_patch(
             "tables", table_id, table.model_dump(exclude_unset=True, exclude_none=True)
         )
+        availability_cache.invalidate_table(table_id)
+        table_number_allocator.observe(data[0].get("restaurant_id"), [data[0].get("name")])
+        table_groups.apply_table(data[0])
+        dashboard_cache.apply_table(data[0])
+        event_bus.publish(data[0].get("restaurant_id"), "table.updated", compact(data[0], TABLE_FIELDS))
         return data[0]
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -173,7 +280,14 @@ async def delete_table(table_id: int):
     Delete a table
     """
     try:
-        await supabase_delete("tables", table_id)
+        deleted = await supabase_delete("tables", table_id)
+        availability_cache.invalidate_table(table_id)
+        dashboard_cache.remove_table(table_id)
+        table_groups.remove_table(table_id)
+        for row in deleted or []:
+            event_bus.publish(row.get("restaurant_id"), "table.deleted", {"id": table_id})
+            if row.get("is_joined") and row.get("joined_group_id"):
+                _publish_table_rows(await table_groups.release_leftover(row["restaurant_id"], row["joined_group_id"]))
         return {"ok": True}
     except httpx.HTTPStatusError as e:
         raise HTTPException(status_code=e.response.status_code, detail=e.response.text) from e
@@ -1,27 +1,46 @@
 import logging
 from fastapi import APIRouter, Request, HTTPException
 from datetime import datetime
-from app.services.telegram_service import telegram_service, is_telegram_admin
+from app.services.telegram_service import telegram_service
 from app.services.reservation_service import reservation_service
 from app.services.restaurant_service import restaurant_service
+from app.services.availability_cache import availability_cache
+from app.services.dashboard import dashboard_cache
+from app.services.events import RESERVATION_FIELDS, compact, event_bus
+from app.services.reminders import reminder_engine
 from app.core.config import settings
+from app.core.cache import TTLCache
 from app.i18n.telegram_i18n import telegram_i18n, get_admin_language
-import httpx
 import os
 import re
-from typing import Optional
+from typing import Any, Dict, List, Optional
 from fastapi import APIRouter, Request, HTTPException
 from app.supabase_client import supabase_get, supabase_patch
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup 
 from telegram.error import TelegramError 
-from app.services.telegram_service import get_admin_by_telegram_id
+from app.services.telegram_service import get_admin_by_telegram_id, invalidate_admin
 from app.services.telegram_token_service import consume_telegram_token
+from app.services.telegram_update_queue import UpdateQueue
 
 router = APIRouter(prefix="/telegram", tags=["telegram"])
 
 
 logger = logging.getLogger(__name__)
 
+# Callback query ids already handled, so double taps and Telegram retries are no-ops
+_handled_callbacks = TTLCache(max_entries=10000)
+CALLBACK_DEDUPE_TTL = 600.0
+
+
+async def _alert(chat_id: int, callback_id: Optional[str], text: str):
+    """Answers a button tap with an alert explaining why nothing happened."""
+    if not telegram_service or not callback_id:
+        return
+    try:
+        await telegram_service.answer_callback_query(chat_id, callback_id, text, show_alert=True)
+    except TelegramError as e:
+        logger.warning(f"Failed to answer callback query {callback_id}: {e}")
+
 
 @router.post("/webhook")
 async def telegram_webhook(request: Request):
@@ -40,9 +59,30 @@ async def telegram_webhook(request: Request):
     data = await request.json()
     logger.info(f"Data from Telegram: {data}")
 
+    if settings.telegram_webhook_async and update_queue.running:
+        if not update_queue.submit(data):
+            # Telegram retries non-2xx deliveries later, which sheds load at peak
+            logger.warning("Telegram update queue is full; asking Telegram to retry")
+            raise HTTPException(status_code=503, detail="Update queue is full")
+        return {"ok": True}
+
+    return await process_update(data)
+
+
+async def process_update(data: dict):
+    """
+    Runs the bot logic for one Telegram update (message or callback query).
+    """
     message = data.get("message")
     callback_query = data.get("callback_query")
 
+    callback_id = callback_query.get("id") if callback_query else None
+    if callback_id:
+        if _handled_callbacks.get(callback_id):
+            logger.info(f"Ignoring repeated callback query {callback_id}")
+            return {"ok": True}
+        _handled_callbacks.set(callback_id, True, CALLBACK_DEDUPE_TTL)
+
     user_id = None
     phone_number = None
     if message:
@@ -66,11 +106,12 @@ async def telegram_webhook(request: Request):
         " " in message.get("text", "")
     )
     
-    if not is_start_with_token and not await is_telegram_admin(user_id):
+    admin = None if is_start_with_token else await get_admin_by_telegram_id(user_id)
+    if not is_start_with_token and not admin:
         if telegram_service:
             # For unauthorized users, we'll use default language (English)
             unauthorized_text = telegram_i18n.get_text("unauthorized_detailed", "en")
-            await telegram_service.bot.send_message(
+            await telegram_service.send_message(
                 chat_id=user_id,
                 text=unauthorized_text
             )
@@ -102,12 +143,13 @@ async def telegram_webhook(request: Request):
                         },
                         id_column="id"
                     )
+                    invalidate_admin(user_id)
                     
                     # Send confirmation to user
                     if telegram_service:
                         language = await get_admin_language(user_id)
                         success_text = telegram_i18n.get_text("link_success", language)
-                        await telegram_service.bot.send_message(
+                        await telegram_service.send_message(
                             chat_id=user_id,
                             text=success_text
                         )
@@ -117,7 +159,7 @@ async def telegram_webhook(request: Request):
                     if telegram_service:
                         # Use default language for expired links
                         expired_text = telegram_i18n.get_text("link_expired", "en")
-                        await telegram_service.bot.send_message(
+                        await telegram_service.send_message(
                             chat_id=user_id,
                             text=expired_text
                         )
@@ -127,7 +169,7 @@ async def telegram_webhook(request: Request):
             if telegram_service:
                 # Use default language for non-linked users
                 instructions_text = telegram_i18n.get_text("linking_instructions", "en")
-                await telegram_service.bot.send_message(
+                await telegram_service.send_message(
                     chat_id=user_id,
                     text=instructions_text
                 )
@@ -140,12 +182,12 @@ async def telegram_webhook(request: Request):
         
         elif text.strip() == "/pending_reservations":
             if telegram_service and reservation_service:
-                current_admin = await get_admin_by_telegram_id(user_id)
-                language = await get_admin_language(user_id)
+                current_admin = admin
+                language = admin.language or "en"
                 
-                if not current_admin or not current_admin.restaurant_id:
+                if not current_admin.restaurant_id:
                     no_restaurant_text = telegram_i18n.get_text("no_restaurant_associated", language)
-                    await telegram_service.bot.send_message(
+                    await telegram_service.send_message(
                         chat_id=user_id,
                         text=no_restaurant_text
                     )
@@ -154,7 +196,7 @@ async def telegram_webhook(request: Request):
                 restaurant = await restaurant_service.get_restaurant_by_id(current_admin.restaurant_id)
                 if not restaurant:
                     restaurant_not_found_text = telegram_i18n.get_text("restaurant_not_found", language)
-                    await telegram_service.bot.send_message(
+                    await telegram_service.send_message(
                         chat_id=user_id,
                         text=restaurant_not_found_text
                     )
@@ -179,7 +221,7 @@ async def telegram_webhook(request: Request):
                             f"<b>{fields['party_size']}:</b> {reservation.party_size}\n"
                             f"<b>{fields['status']}:</b> {reservation.status}\n\n"
                         )
-                    await telegram_service.bot.send_message(
+                    await telegram_service.send_message(
                         chat_id=user_id,
                         text=response_text,
                         parse_mode="HTML"
@@ -190,7 +232,7 @@ async def telegram_webhook(request: Request):
                         language, 
                         restaurant_name=restaurant.name
                     )
-                    await telegram_service.bot.send_message(
+                    await telegram_service.send_message(
                         chat_id=user_id,
                         text=no_reservations_text
                     )
@@ -198,9 +240,9 @@ async def telegram_webhook(request: Request):
         
         elif text.strip() == "/language":
             if telegram_service:
-                language = await get_admin_language(user_id)
+                language = admin.language or "en"
                 language_info_text = telegram_i18n.get_text("language_info", language)
-                await telegram_service.bot.send_message(
+                await telegram_service.send_message(
                     chat_id=user_id,
                     text=language_info_text
                 )
@@ -217,10 +259,11 @@ async def telegram_webhook(request: Request):
                     data={"language": new_language},
                     id_column="telegram_chat_id"
                 )
+                invalidate_admin(user_id)
                 
                 # Send confirmation in the new language
                 language_changed_text = telegram_i18n.get_text("language_changed", new_language)
-                await telegram_service.bot.send_message(
+                await telegram_service.send_message(
                     chat_id=user_id,
                     text=language_changed_text
                 )
@@ -235,10 +278,11 @@ async def telegram_webhook(request: Request):
                 data={"email": text.strip()},
                 id_column="telegram_chat_id"
             )
+            invalidate_admin(user_id)
             if telegram_service:
-                language = await get_admin_language(user_id)
+                language = admin.language or "en"
                 email_registered_text = telegram_i18n.get_text("email_registered", language)
-                await telegram_service.bot.send_message(
+                await telegram_service.send_message(
                     chat_id=user_id,
                     text=email_registered_text
                 )
@@ -256,42 +300,81 @@ async def telegram_webhook(request: Request):
 
         try:
             action, reservation_id = callback_data.split(":")
-            assert action in ("confirm", "discard")
+            assert action in ("confirm", "discard", "done")
+            reservation_id = int(reservation_id)
             logger.info(f"Parsed callback data: action={action}, reservation_id={reservation_id}")
         except Exception as e:
             logger.error(f"Invalid callback data format: {callback_data}, Error: {e}")
             raise HTTPException(status_code=400, detail="Invalid callback data format")
 
+        if action == "done":
+            # Status label left in a digest's keyboard; nothing to do
+            return {"ok": True}
+
+        language = admin.language or "en"
+        if not admin.restaurant_id:
+            logger.info(f"Admin {admin.id} has no restaurant; refusing {action} of reservation {reservation_id}")
+            await _alert(chat["id"], callback_id, telegram_i18n.get_text("no_restaurant_associated", language))
+            return {"ok": True}
 
         new_status = "confirmed" if action == "confirm" else "discarded"
-        async with httpx.AsyncClient() as client:
-            resp = await client.patch(
-                f"{settings.supabase_url}/rest/v1/reservations?id=eq.{reservation_id}",
-                headers={
-                    "apikey": settings.supabase_service_key,
-                    "Authorization": f"Bearer {settings.supabase_service_key}",
-                    "Content-Type": "application/json",
-                    "Prefer": "return=representation",
-                },
-                json={"status": new_status},
+        try:
+            updated = await reservation_service.transition_status(
+                reservation_id, new_status, admin.restaurant_id, admin_id=admin.id
+            )
+        except Exception as e:
+            _handled_callbacks.delete(callback_id)
+            logger.error(f"Failed to update reservation status for ID {reservation_id}: {e}")
+            raise HTTPException(status_code=500, detail="Failed to update reservation status")
+
+        if not updated:
+            # Already confirmed or discarded by an earlier tap or another admin,
+            # or not a reservation of this admin's restaurant
+            logger.info(f"Reservation {reservation_id} is not pending in restaurant {admin.restaurant_id}; skipping {action}")
+            await _alert(
+                chat["id"],
+                callback_id,
+                telegram_i18n.get_text("reservation_not_actionable", language, reservation_id=reservation_id),
+            )
+            return {"ok": True}
+
+        # A joined-table booking transitions all its tables' rows together
+        for row in updated:
+            availability_cache.apply_reservation(
+                row["id"], row.get("table_id"), row.get("reservation_date"),
+                row.get("reservation_time"), row.get("status"),
+            )
+            dashboard_cache.apply_reservation(row)
+            event_bus.publish(
+                row.get("restaurant_id") or admin.restaurant_id,
+                "reservation.updated",
+                compact(row, RESERVATION_FIELDS),
             )
-            logger.info(f"Supabase patch response status: {resp.status_code}, text: {resp.text}")
-            if resp.status_code not in (200, 204):
-                logger.error(f"Failed to update reservation status for ID {reservation_id}. Status: {resp.status_code}, Response: {resp.text}")
-                raise HTTPException(status_code=500, detail="Failed to update reservation status")
+            reminder_engine.on_reservation_changed(row)
 
         if telegram_service:
             try:
-                language = await get_admin_language(chat["id"])
+                language = admin.language or "en"
                 status_text = "confirmed" if action == "confirm" else "discarded"
-                text = telegram_i18n.get_text("reservation_status_updated", language, 
-                                            reservation_id=reservation_id, status=status_text)
-                await telegram_service.bot.edit_message_text(
-                    chat_id=chat["id"],
-                    message_id=message_id,
-                    text=text,
-                    reply_markup=InlineKeyboardMarkup([])
-                )
+                rows = (message.get("reply_markup") or {}).get("inline_keyboard") or []
+                if len(rows) > 1:
+                    # A digest: only this reservation's row turns into its status
+                    label = telegram_i18n.get_text("reservation_digest.handled", language,
+                                                   reservation_id=reservation_id, status=status_text)
+                    await telegram_service.edit_message_reply_markup(
+                        chat_id=chat["id"],
+                        message_id=message_id,
+                        reply_markup=digest_keyboard_after(rows, reservation_id, label),
+                    )
+                else:
+                    text = telegram_i18n.get_text("reservation_status_updated", language, 
+                                                reservation_id=reservation_id, status=status_text)
+                    await telegram_service.edit_message_text(
+                        chat_id=chat["id"],
+                        message_id=message_id,
+                        text=text,
+                        reply_markup=InlineKeyboardMarkup([])
+                    )
                 logger.info(f"Edited Telegram message for reservation {reservation_id}")
             except TelegramError as e:
                 if "Message is not modified" in str(e):
@@ -307,3 +390,25 @@ async def telegram_webhook(request: Request):
         return {"ok": True}
     
     return {"ok": True}
+
+
+def digest_keyboard_after(rows: List[List[Dict[str, Any]]], reservation_id: int, label: str) -> InlineKeyboardMarkup:
+    """
+    Rebuilds a digest's inline keyboard with the handled reservation's
+    Confirm/Discard row replaced by a single status button.
+    """
+    handled = (f"confirm:{reservation_id}", f"discard:{reservation_id}")
+    keyboard = []
+    for row in rows:
+        if any(button.get("callback_data") in handled for button in row):
+            keyboard.append([InlineKeyboardButton(label, callback_data=f"done:{reservation_id}")])
+        else:
+            keyboard.append([InlineKeyboardButton(button["text"], callback_data=button.get("callback_data")) for button in row])
+    return InlineKeyboardMarkup(keyboard)
+
+
+update_queue = UpdateQueue(
+    process_update,
+    maxsize=settings.telegram_webhook_queue_size,
+    workers=settings.telegram_webhook_workers,
+)
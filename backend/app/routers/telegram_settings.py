@@ -1,7 +1,7 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from app.supabase_client import supabase_patch, supabase_get
-from app.services.telegram_service import get_admin_by_telegram_id
+from app.services.telegram_service import get_admin_by_telegram_id, invalidate_admin
 import logging
 
 router = APIRouter(prefix="/telegram", tags=["telegram-settings"])
@@ -32,6 +32,7 @@ async def set_language_preference(telegram_chat_id: int, preference: LanguagePre
             data={"language": preference.language},
             id_column="id"
         )
+        invalidate_admin(telegram_chat_id)
         
         logger.info(f"Updated language preference for admin {admin.id} to {preference.language}")
         return {"message": f"Language preference updated to {preference.language}"}
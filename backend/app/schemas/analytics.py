@@ -0,0 +1,51 @@
+from pydantic import BaseModel, Field
+from typing import List
+from datetime import date
+
+class DailyTotals(BaseModel):
+    date: date
+    total_reservations: int
+    confirmed_reservations: int
+    discarded_reservations: int
+    no_shows: int
+    completed_reservations: int
+    avg_party_size: float
+    total_confirmed_guests: int
+
+class HourlyHeatmap(BaseModel):
+    weekdays: List[str] = Field(..., example=["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"])
+    hours: List[int]
+    counts: List[List[int]] = Field(..., description="Confirmed and completed reservations, one row per weekday and one column per hour")
+    by_hour: List[int]
+    avg_party_size_by_hour: List[float]
+
+class TableUtilization(BaseModel):
+    table_id: int
+    capacity: int
+    total_reservations: int
+    confirmed_reservations: int
+    confirmation_rate: float = Field(..., description="Confirmed reservations as a percentage of all reservations")
+    seat_utilization: float = Field(..., description="Seat-minutes taken by seated parties as a percentage of seat-minutes open")
+
+class AnalyticsResponse(BaseModel):
+    restaurant_id: str
+    start: date
+    end: date
+    total_reservations: int
+    confirmation_rate: float
+    seat_utilization: float
+    daily: List[DailyTotals]
+    heatmap: HourlyHeatmap
+    tables: List[TableUtilization]
+
+class HourlyTotals(BaseModel):
+    hour: int
+    reservation_count: int = Field(..., description="Confirmed and completed reservations starting in this hour")
+    avg_party_size: float
+
+class RollupReportResponse(BaseModel):
+    restaurant_id: str
+    start: date
+    end: date
+    daily: List[DailyTotals]
+    hourly: List[HourlyTotals]
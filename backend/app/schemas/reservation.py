@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Optional, List, Union
 from datetime import date, time, datetime
 
 class ReservationBase(BaseModel):
@@ -22,7 +22,9 @@ class Reservation(ReservationBase):
     status: str
     reminder_sent: Optional[bool] = None
     telegram_message_id: Optional[int] = None
-    confirmed_by: Optional[int] = None
+    booking_group_id: Optional[str] = None
+    group_party_size: Optional[int] = None
+    confirmed_by: Optional[Union[int, str]] = None
     confirmed_at: Optional[datetime] = None
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
@@ -34,6 +36,7 @@ class ReservationResponse(BaseModel):
     reservation_id: int
     status: str
     table_id: Optional[int] = None
+    joined_table_ids: Optional[List[int]] = Field(None, description="All tables booked when the party was seated on joined tables")
     message: Optional[str] = None
 
 class ReservationErrorResponse(BaseModel):
@@ -41,11 +44,20 @@ class ReservationErrorResponse(BaseModel):
     status: Optional[str] = None
     error: str
 
+class AvailabilityResponse(BaseModel):
+    restaurant_id: str
+    date: date
+    party_size: int
+    slot_minutes: int
+    available_times: List[str] = Field(..., example=["19:00", "19:15", "21:30"])
+
 class ReservationSummary(BaseModel):
     id: int
     customer_name: str
     reservation_time: time
     party_size: int
+    status: Optional[str] = None
+    booking_group_id: Optional[str] = None
 
 class DashboardTable(BaseModel):
     id: int
@@ -54,6 +66,7 @@ class DashboardTable(BaseModel):
     location: Optional[str] = None
     status: str
     reservation: Optional[ReservationSummary] = None
+    reservations: List[ReservationSummary] = []
 
 class DashboardStatusResponse(BaseModel):
     date: str
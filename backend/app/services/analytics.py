@@ -0,0 +1,389 @@
+"""Columnar reservation history and vectorized occupancy analytics"""
+
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+import numpy as np
+from app.core.cache import SingleFlight, TTLCache
+from app.core.config import settings
+from app.services.booking import booking_party_size, is_group_member
+from app.services.reservation_service import reservation_service
+from app.supabase_client import supabase_pages
+
+logger = logging.getLogger(__name__)
+
+# Status codes stored in ReservationHistory.status
+STATUSES = ("pending", "confirmed", "discarded", "completed", "no_show")
+STATUS_CODES = {status: code for code, status in enumerate(STATUSES)}
+UNKNOWN_STATUS = len(STATUSES)
+PENDING, CONFIRMED, DISCARDED, COMPLETED, NO_SHOW = range(len(STATUSES))
+
+HISTORY_COLUMNS = "id,table_id,reservation_date,reservation_time,party_size,status,booking_group_id,group_party_size"
+
+WEEKDAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+_EPOCH = date(1970, 1, 1)
+
+
+def _day_number(day: date) -> int:
+    return (day - _EPOCH).days
+
+
+class ReservationHistory:
+    """
+    A restaurant's reservations as parallel NumPy arrays: day (days since
+    1970-01-01), slot (slot_minutes steps since midnight), table (index into
+    table_ids), party_size and status (index into STATUSES). A party seated
+    on joined tables has one row per table: counted is set only on its lead
+    row, whose guests is the whole party (members' guests are 0). Picklable,
+    so it can be shipped to a worker process as a few contiguous buffers.
+    """
+
+    def __init__(
+        self,
+        day: np.ndarray,
+        slot: np.ndarray,
+        table: np.ndarray,
+        party_size: np.ndarray,
+        status: np.ndarray,
+        table_ids: np.ndarray,
+        capacities: np.ndarray,
+        slot_minutes: int,
+        guests: Optional[np.ndarray] = None,
+        counted: Optional[np.ndarray] = None,
+    ):
+        self.day = day
+        self.slot = slot
+        self.table = table
+        self.party_size = party_size
+        self.status = status
+        self.table_ids = table_ids
+        self.capacities = capacities
+        self.slot_minutes = slot_minutes
+        self.guests = party_size if guests is None else guests
+        self.counted = np.ones(len(day), dtype=bool) if counted is None else counted
+
+    def __len__(self) -> int:
+        return len(self.day)
+
+    @classmethod
+    def from_rows(
+        cls,
+        rows: Sequence[Dict[str, Any]],
+        tables: Sequence[Dict[str, Any]],
+        slot_minutes: Optional[int] = None,
+    ) -> "ReservationHistory":
+        """
+        Builds the arrays from Supabase rows. Reservations on tables not in
+        tables are dropped.
+        """
+        slot_minutes = slot_minutes or settings.availability_slot_minutes
+        table_ids = np.array([table["id"] for table in tables], dtype=np.int64)
+        capacities = np.array([table.get("capacity") or 0 for table in tables], dtype=np.int32)
+        table_index = {table_id: i for i, table_id in enumerate(table_ids.tolist())}
+
+        rows = [row for row in rows if row.get("table_id") in table_index]
+        day = np.array([row["reservation_date"] for row in rows], dtype="datetime64[D]").astype(np.int32)
+        times = [str(row["reservation_time"]) for row in rows]
+        minutes = np.fromiter((int(t[:2]) * 60 + int(t[3:5]) for t in times), dtype=np.int16, count=len(times))
+        return cls(
+            day=day,
+            slot=(minutes // slot_minutes).astype(np.int16),
+            table=np.fromiter((table_index[row["table_id"]] for row in rows), dtype=np.int32, count=len(rows)),
+            party_size=np.fromiter((row.get("party_size") or 0 for row in rows), dtype=np.int16, count=len(rows)),
+            status=np.fromiter((STATUS_CODES.get(row.get("status"), UNKNOWN_STATUS) for row in rows), dtype=np.int8, count=len(rows)),
+            table_ids=table_ids,
+            capacities=capacities,
+            slot_minutes=slot_minutes,
+            guests=np.fromiter((booking_party_size(row) if not is_group_member(row) else 0 for row in rows), dtype=np.int16, count=len(rows)),
+            counted=np.fromiter((not is_group_member(row) for row in rows), dtype=bool, count=len(rows)),
+        )
+
+
+def _rate(numerator, denominator):
+    """Percentage rounded to two decimals; 0 where the denominator is 0."""
+    numerator = np.asarray(numerator, dtype=np.float64)
+    denominator = np.asarray(denominator, dtype=np.float64)
+    rate = np.divide(numerator * 100, denominator, out=np.zeros_like(numerator), where=denominator > 0)
+    return np.round(rate, 2)
+
+
+N_CODES = UNKNOWN_STATUS + 1
+SEATED = [CONFIRMED, COMPLETED]
+
+
+class DayCube:
+    """
+    Reservation counts and guests per (day, slot, status), aggregated with
+    two bincounts over the whole history. Every per-day and per-hour
+    analytic is then a reduction over this small array instead of another
+    pass over the rows. Joined-table parties count once, with all their guests.
+    """
+
+    def __init__(self, history: ReservationHistory, first_day: date, days: int):
+        self.first_day = first_day
+        self.days = days
+        self.slot_minutes = history.slot_minutes
+        self.slots = 24 * 60 // history.slot_minutes
+        if not history.counted.all():
+            history = _subset(history, history.counted)
+        offset = history.day - np.int32(_day_number(first_day))
+        if len(offset) and (offset.min() < 0 or offset.max() >= days):
+            keep = (offset >= 0) & (offset < days)
+            history = _subset(history, keep)
+            offset = offset[keep]
+        key = (offset * self.slots + history.slot) * N_CODES + history.status
+        size = days * self.slots * N_CODES
+        shape = (days, self.slots, N_CODES)
+        self.counts = np.bincount(key, minlength=size).reshape(shape)
+        self.guests = np.bincount(key, weights=history.guests, minlength=size).reshape(shape)
+
+
+def _subset(history: ReservationHistory, mask: np.ndarray) -> ReservationHistory:
+    return ReservationHistory(
+        history.day[mask], history.slot[mask], history.table[mask],
+        history.party_size[mask], history.status[mask],
+        history.table_ids, history.capacities, history.slot_minutes,
+        history.guests[mask], history.counted[mask],
+    )
+
+
+def daily_totals(history: ReservationHistory, first_day: date, days: int, cube: Optional[DayCube] = None) -> List[Dict[str, Any]]:
+    """
+    Per-day counts by status, average party size and confirmed guests, like
+    the reservation_analytics view.
+    """
+    cube = cube or DayCube(history, first_day, days)
+    by_status = cube.counts.sum(axis=1)
+    guests_by_status = cube.guests.sum(axis=1)
+    total = by_status.sum(axis=1)
+    guests = guests_by_status.sum(axis=1)
+    avg_party = np.round(np.divide(guests, total, out=np.zeros(days), where=total > 0), 2)
+
+    return [
+        {
+            "date": (first_day + timedelta(days=i)).isoformat(),
+            "total_reservations": int(total[i]),
+            "confirmed_reservations": int(by_status[i, CONFIRMED]),
+            "discarded_reservations": int(by_status[i, DISCARDED]),
+            "no_shows": int(by_status[i, NO_SHOW]),
+            "completed_reservations": int(by_status[i, COMPLETED]),
+            "avg_party_size": float(avg_party[i]),
+            "total_confirmed_guests": int(guests_by_status[i, CONFIRMED]),
+        }
+        for i in np.flatnonzero(total).tolist()
+    ]
+
+
+def hourly_heatmap(history: ReservationHistory, first_day: date, days: int, cube: Optional[DayCube] = None) -> Dict[str, Any]:
+    """
+    Confirmed and completed reservations per weekday and hour, the
+    peak_hours_analytics view split by day of the week.
+    """
+    cube = cube or DayCube(history, first_day, days)
+    seated = cube.counts[:, :, SEATED].sum(axis=2)
+    seated_guests = cube.guests[:, :, SEATED].sum(axis=2)
+    hour_of_slot = np.arange(cube.slots) * cube.slot_minutes // 60
+    weekday_of_day = (np.arange(days) + first_day.weekday()) % 7
+
+    counts = np.zeros((7, 24), dtype=np.int64)
+    np.add.at(counts, (weekday_of_day[:, None], hour_of_slot[None, :]), seated)
+    by_hour = counts.sum(axis=0)
+    guests_by_hour = np.bincount(hour_of_slot, weights=seated_guests.sum(axis=0), minlength=24)
+    return {
+        "weekdays": list(WEEKDAYS),
+        "hours": list(range(24)),
+        "counts": counts.tolist(),
+        "by_hour": by_hour.tolist(),
+        "avg_party_size_by_hour": np.round(np.divide(guests_by_hour, by_hour, out=np.zeros(24), where=by_hour > 0), 2).tolist(),
+    }
+
+
+def table_utilization(history: ReservationHistory, days: int, open_minutes: int, duration_minutes: int) -> Dict[str, Any]:
+    """
+    Per-table reservation counts, confirmation rates (as in the
+    table_utilization view) and seat utilization: seat-minutes taken by
+    confirmed and completed parties over capacity x open_minutes x days.
+    Tables count every reservation on them; the overall confirmation rate
+    counts a joined-table party once.
+    """
+    n_tables = len(history.table_ids)
+    key = history.table * N_CODES + history.status
+    # A party never fills more seats than its table has
+    seats = np.minimum(history.party_size, history.capacities[history.table])
+    by_status = np.bincount(key, minlength=n_tables * N_CODES).reshape(n_tables, N_CODES)
+    seats_by_status = np.bincount(key, weights=seats, minlength=n_tables * N_CODES).reshape(n_tables, N_CODES)
+
+    total = by_status.sum(axis=1)
+    confirmed = by_status[:, CONFIRMED]
+    seat_minutes = seats_by_status[:, SEATED].sum(axis=1) * duration_minutes
+    available = history.capacities.astype(np.float64) * open_minutes * days
+    utilization = _rate(seat_minutes, available)
+    rates = _rate(confirmed, total)
+    tables = [
+        {
+            "table_id": int(history.table_ids[i]),
+            "capacity": int(history.capacities[i]),
+            "total_reservations": int(total[i]),
+            "confirmed_reservations": int(confirmed[i]),
+            "confirmation_rate": float(rates[i]),
+            "seat_utilization": float(utilization[i]),
+        }
+        for i in range(n_tables)
+    ]
+    return {
+        "tables": tables,
+        "confirmation_rate": float(_rate(
+            np.count_nonzero(history.counted & (history.status == CONFIRMED)), np.count_nonzero(history.counted),
+        )),
+        "seat_utilization": float(_rate(seat_minutes.sum(), available.sum())),
+    }
+
+
+def compute_report(
+    history: ReservationHistory,
+    first_day: date,
+    last_day: date,
+    open_minutes: int,
+    duration_minutes: int,
+) -> Dict[str, Any]:
+    """
+    Every analytic over the history between first_day and last_day
+    (inclusive). A pure function of its arguments, so it can run in a worker
+    process.
+    """
+    days = (last_day - first_day).days + 1
+    start, end = _day_number(first_day), _day_number(last_day)
+    if len(history) and (history.day.min() < start or history.day.max() > end):
+        history = _subset(history, (history.day >= start) & (history.day <= end))
+    cube = DayCube(history, first_day, days)
+    utilization = table_utilization(history, days, open_minutes, duration_minutes)
+    return {
+        "total_reservations": int(np.count_nonzero(history.counted)),
+        "confirmation_rate": utilization["confirmation_rate"],
+        "seat_utilization": utilization["seat_utilization"],
+        "daily": daily_totals(history, first_day, days, cube),
+        "heatmap": hourly_heatmap(history, first_day, days, cube),
+        "tables": utilization["tables"],
+    }
+
+
+def hourly_rollups(history: ReservationHistory, first_day: date, days: int) -> List[Dict[str, Any]]:
+    """
+    The history as reservation_rollups rows: reservations and guests per
+    day, hour and status, for the rows that are not zero.
+    """
+    cube = DayCube(history, first_day, days)
+    hour_of_slot = np.arange(cube.slots) * cube.slot_minutes // 60
+    counts = np.zeros((days, 24, N_CODES), dtype=np.int64)
+    guests = np.zeros((days, 24, N_CODES), dtype=np.float64)
+    for slot, hour in enumerate(hour_of_slot.tolist()):
+        counts[:, hour] += cube.counts[:, slot]
+        guests[:, hour] += cube.guests[:, slot]
+    names = STATUSES + ("unknown",)
+    day_index, hour_index, status_index = np.nonzero(counts)
+    return [
+        {
+            "day": (first_day + timedelta(days=d)).isoformat(),
+            "hour": h,
+            "status": names[c],
+            "reservations": int(counts[d, h, c]),
+            "guests": int(guests[d, h, c]),
+        }
+        for d, h, c in zip(day_index.tolist(), hour_index.tolist(), status_index.tolist())
+    ]
+
+
+def _minutes(hhmm: str) -> int:
+    hours, minutes = hhmm.split(":")[:2]
+    return int(hours) * 60 + int(minutes)
+
+
+class AnalyticsEngine:
+    """
+    Loads reservation history into ReservationHistory arrays (cached per
+    restaurant and range) and computes reports. Histories larger than
+    inline_rows are computed in a process pool so the event loop never
+    runs the heavy number crunching.
+    """
+
+    def __init__(self, workers: int = 2, inline_rows: int = 100_000):
+        self.workers = workers
+        self.inline_rows = inline_rows
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._histories = TTLCache(max_entries=64)
+        self._loads = SingleFlight()
+        self.inline_reports = 0
+        self.pool_reports = 0
+
+    async def load_history(self, restaurant_id: str, first_day: date, last_day: date) -> ReservationHistory:
+        key = (restaurant_id, first_day, last_day)
+        history = self._histories.get(key)
+        if history is None:
+            history = await self._loads.do(key, lambda: self.fetch_history(restaurant_id, first_day, last_day))
+            self._histories.set(key, history, settings.analytics_cache_ttl)
+        return history
+
+    async def fetch_history(self, restaurant_id: str, first_day: date, last_day: date) -> ReservationHistory:
+        """
+        Reads a restaurant's reservations in the range straight from the database.
+        """
+        tables = await reservation_service.get_restaurant_tables(restaurant_id)
+        rows = await self._fetch_rows([table["id"] for table in tables], first_day, last_day)
+        return await asyncio.to_thread(ReservationHistory.from_rows, rows, tables)
+
+    async def _fetch_rows(self, table_ids: Iterable[int], first_day: date, last_day: date) -> List[Dict[str, Any]]:
+        """
+        Reads the history in id order, one page after another (keyset
+        pagination).
+        """
+        table_ids = list(table_ids)
+        if not table_ids:
+            return []
+        params = {
+            "select": HISTORY_COLUMNS,
+            "table_id": f"in.({','.join(map(str, table_ids))})",
+            "and": f"(reservation_date.gte.{first_day.isoformat()},reservation_date.lte.{last_day.isoformat()})",
+        }
+        rows: List[Dict[str, Any]] = []
+        async for page in supabase_pages("reservations", params, settings.analytics_page_size):
+            rows.extend(page)
+        return rows
+
+    async def report(self, restaurant_id: str, first_day: date, last_day: date) -> Dict[str, Any]:
+        history = await self.load_history(restaurant_id, first_day, last_day)
+        args = (
+            history,
+            first_day,
+            last_day,
+            _minutes(settings.business_hours_end) - _minutes(settings.business_hours_start),
+            settings.reservation_duration_minutes,
+        )
+        if len(history) <= self.inline_rows:
+            self.inline_reports += 1
+            return compute_report(*args)
+        self.pool_reports += 1
+        return await asyncio.get_running_loop().run_in_executor(self._get_pool(), compute_report, *args)
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "inline_reports": self.inline_reports,
+            "pool_reports": self.pool_reports,
+            "pool_started": self._pool is not None,
+            "histories": self._histories.stats(),
+        }
+
+
+# Singleton instance for use in app
+analytics_engine = AnalyticsEngine(workers=settings.analytics_workers, inline_rows=settings.analytics_inline_rows)
@@ -0,0 +1,284 @@
+"""Table availability engine used by every code path that checks reservation slots"""
+
+import logging
+from bisect import bisect_left, bisect_right, insort
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from app.core.config import settings
+from app.services.seating import SeatingPlan
+
+logger = logging.getLogger(__name__)
+
+MINUTES_PER_DAY = 24 * 60
+
+
+def to_minutes(value: datetime) -> int:
+    """
+    Converts a naive datetime to an absolute minute number, so interval checks
+    are plain integer comparisons.
+    """
+    return value.toordinal() * MINUTES_PER_DAY + value.hour * 60 + value.minute
+
+
+def reservation_start(
+    reservation_date: Union[str, date],
+    reservation_time: Union[str, time],
+) -> int:
+    """
+    Parses a reservation's date and time (as stored in Supabase or as Python
+    objects) into an absolute minute number. Timezone offsets are dropped,
+    matching how reservation times are compared everywhere else.
+    """
+    start = datetime.fromisoformat(f"{reservation_date}T{reservation_time}")
+    if start.tzinfo is not None:
+        start = start.replace(tzinfo=None)
+    return to_minutes(start)
+
+
+class AvailabilityIndex:
+    """
+    Per-table sorted reservation start times for a restaurant and date window.
+
+    Every reservation occupies its table for the same duration, so two slots on
+    a table overlap exactly when their starts are less than one duration apart.
+    Keeping pre-parsed starts sorted turns each per-table conflict check into a
+    single binary search. Tables are kept sorted by capacity so the smallest
+    table that fits a party is tried first.
+    """
+
+    def __init__(self, duration_minutes: Optional[int] = None):
+        self.duration = duration_minutes or settings.reservation_duration_minutes
+        self._tables: List[Tuple[int, Any]] = []
+        self._capacities: List[int] = []
+        self._starts: Dict[Any, List[int]] = {}
+
+    @classmethod
+    def build(
+        cls,
+        tables: Iterable[Dict[str, Any]],
+        reservations: Iterable[Dict[str, Any]],
+        window_start: Optional[datetime] = None,
+        window_end: Optional[datetime] = None,
+        duration_minutes: Optional[int] = None,
+    ) -> "AvailabilityIndex":
+        """
+        Builds an index from Supabase table and reservation rows. Only
+        reservations on the given tables that overlap [window_start, window_end)
+        are kept, so the index stays small however long the history is.
+        """
+        index = cls(duration_minutes)
+        for table in tables:
+            index.add_table(table["id"], table.get("capacity", 0))
+
+        low = to_minutes(window_start) - index.duration if window_start else None
+        high = to_minutes(window_end) if window_end else None
+        for reservation in reservations:
+            starts = index._starts.get(reservation.get("table_id"))
+            if starts is None:
+                continue
+            try:
+                start = reservation_start(reservation["reservation_date"], reservation["reservation_time"])
+            except (KeyError, TypeError, ValueError):
+                logger.warning(f"Skipping reservation {reservation.get('id')} with unparseable date/time")
+                continue
+            if (low is not None and start <= low) or (high is not None and start >= high):
+                continue
+            starts.append(start)
+
+        for starts in index._starts.values():
+            starts.sort()
+        return index
+
+    def add_table(self, table_id: Any, capacity: int):
+        if table_id in self._starts:
+            return
+        position = bisect_right(self._capacities, capacity)
+        self._capacities.insert(position, capacity)
+        self._tables.insert(position, (capacity, table_id))
+        self._starts[table_id] = []
+
+    def add_reservation(self, table_id: Any, start: int):
+        starts = self._starts.get(table_id)
+        if starts is not None:
+            insort(starts, start)
+
+    def remove_reservation(self, table_id: Any, start: int):
+        starts = self._starts.get(table_id)
+        if not starts:
+            return
+        position = bisect_left(starts, start)
+        if position < len(starts) and starts[position] == start:
+            del starts[position]
+
+    def is_free(self, table_id: Any, start: int) -> bool:
+        """
+        Whether the table has no reservation overlapping [start, start + duration).
+        """
+        starts = self._starts.get(table_id)
+        if starts is None:
+            return False
+        position = bisect_right(starts, start - self.duration)
+        return position == len(starts) or starts[position] >= start + self.duration
+
+    def free_tables(self, party_size: int, start: int) -> Iterator[Any]:
+        """
+        Yields ids of tables that seat the party and are free at start,
+        smallest capacity first.
+        """
+        for _, table_id in self._tables[bisect_left(self._capacities, party_size):]:
+            if self.is_free(table_id, start):
+                yield table_id
+
+    def first_free_table(self, party_size: int, start: int) -> Optional[Any]:
+        return next(self.free_tables(party_size, start), None)
+
+
+def slot_bounds(requested: datetime, duration_minutes: Optional[int] = None) -> Tuple[datetime, datetime]:
+    """
+    Returns the [start, end) range a reservation at the requested time occupies.
+    """
+    duration = duration_minutes or settings.reservation_duration_minutes
+    return requested, requested + timedelta(minutes=duration)
+
+
+class DayAvailability:
+    """
+    Per-table occupancy bitmaps for one restaurant and day.
+
+    Bit i of a table's bitmap is set when a reservation overlaps the i-th slot
+    of the day. The bitmap extends one reservation duration past midnight so
+    late starts can be checked against the next morning too. A start slot is
+    bookable on a table when none of the slots the reservation would cover are
+    set, which is computed for the whole day at once with a few shifts.
+    """
+
+    def __init__(
+        self,
+        day: date,
+        duration_minutes: Optional[int] = None,
+        slot_minutes: Optional[int] = None,
+    ):
+        self.day = day
+        self.duration = duration_minutes or settings.reservation_duration_minutes
+        self.slot_minutes = slot_minutes or settings.availability_slot_minutes
+        self.day_start = day.toordinal() * MINUTES_PER_DAY
+        self.day_slots = MINUTES_PER_DAY // self.slot_minutes
+        self.duration_slots = -(-self.duration // self.slot_minutes)
+        self.total_slots = self.day_slots + self.duration_slots
+        self._capacities: Dict[Any, int] = {}
+        self._starts: Dict[Any, Dict[Any, int]] = {}
+        self._occupied: Dict[Any, int] = {}
+
+    @classmethod
+    def build(
+        cls,
+        day: date,
+        tables: Iterable[Dict[str, Any]],
+        reservations: Iterable[Dict[str, Any]],
+        duration_minutes: Optional[int] = None,
+        slot_minutes: Optional[int] = None,
+    ) -> "DayAvailability":
+        availability = cls(day, duration_minutes, slot_minutes)
+        for table in tables:
+            availability.add_table(table["id"], table.get("capacity", 0))
+        for reservation in reservations:
+            try:
+                start = reservation_start(reservation["reservation_date"], reservation["reservation_time"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            availability.add_reservation(reservation.get("table_id"), reservation.get("id"), start)
+        return availability
+
+    def add_table(self, table_id: Any, capacity: int):
+        self._capacities[table_id] = capacity
+        self._starts.setdefault(table_id, {})
+        self._occupied.setdefault(table_id, 0)
+
+    def has_table(self, table_id: Any) -> bool:
+        return table_id in self._capacities
+
+    def overlaps(self, start: int) -> bool:
+        """
+        Whether a reservation starting at this absolute minute touches the bitmap.
+        """
+        offset = start - self.day_start
+        return offset + self.duration > 0 and offset < self.total_slots * self.slot_minutes
+
+    def add_reservation(self, table_id: Any, reservation_id: Any, start: int):
+        starts = self._starts.get(table_id)
+        if starts is None or not self.overlaps(start):
+            return
+        starts[reservation_id] = start
+        self._occupied[table_id] |= self._mask(start)
+
+    def remove_reservation(self, table_id: Any, reservation_id: Any):
+        starts = self._starts.get(table_id)
+        if not starts or starts.pop(reservation_id, None) is None:
+            return
+        # Overlapping reservations may share slots, so rebuild this table's bits
+        occupied = 0
+        for start in starts.values():
+            occupied |= self._mask(start)
+        self._occupied[table_id] = occupied
+
+    def _mask(self, start: int) -> int:
+        offset = start - self.day_start
+        first = max(offset // self.slot_minutes, 0)
+        last = min(-(-(offset + self.duration) // self.slot_minutes), self.total_slots)
+        if last <= first:
+            return 0
+        return ((1 << (last - first)) - 1) << first
+
+    def free_starts(self, table_id: Any) -> int:
+        """
+        Returns a bitmap of the day's slots at which the table can take a new reservation.
+        """
+        occupied = self._occupied[table_id]
+        blocked = 0
+        for shift in range(self.duration_slots):
+            blocked |= occupied >> shift
+        return ~blocked & ((1 << self.day_slots) - 1)
+
+    def bookable_starts(self, party_size: int, seating: Optional[SeatingPlan] = None) -> int:
+        """
+        Returns a bitmap of the day's slots at which any table seating the party
+        is free. With a seating plan, slots no single table can take are also
+        bookable when a set of adjacent free tables seats the party, as when
+        booking.
+        """
+        bookable = 0
+        free: Dict[Any, int] = {}
+        for table_id, capacity in self._capacities.items():
+            free[table_id] = self.free_starts(table_id)
+            if capacity >= party_size:
+                bookable |= free[table_id]
+        if seating is None:
+            return bookable
+        for slot in range(self.day_slots):
+            if bookable >> slot & 1:
+                continue
+            free_mask = seating.free_mask(lambda table_id: free.get(table_id, 0) >> slot & 1)
+            if seating.best(party_size, free_mask) is not None:
+                bookable |= 1 << slot
+        return bookable
+
+    def bookable_times(
+        self,
+        party_size: int,
+        opens: time,
+        closes: time,
+        seating: Optional[SeatingPlan] = None,
+    ) -> List[str]:
+        """
+        Returns the bookable start times between opens (inclusive) and closes
+        (exclusive) as HH:MM strings.
+        """
+        bookable = self.bookable_starts(party_size, seating)
+        first = -(-(opens.hour * 60 + opens.minute) // self.slot_minutes)
+        last = -(-(closes.hour * 60 + closes.minute) // self.slot_minutes)
+        times = []
+        for slot in range(first, min(last, self.day_slots)):
+            if bookable >> slot & 1:
+                minute = slot * self.slot_minutes
+                times.append(f"{minute // 60:02d}:{minute % 60:02d}")
+        return times
@@ -0,0 +1,90 @@
+"""Per-restaurant, per-day cache of availability bitmaps, patched on reservation writes"""
+
+import logging
+from datetime import date, timedelta
+from typing import Any, Optional, Union
+from app.core.cache import SingleFlight, TTLCache
+from app.core.config import settings
+from app.services.availability import DayAvailability, reservation_start
+from app.services.reservation_service import ACTIVE_STATUSES, reservation_service
+
+logger = logging.getLogger(__name__)
+
+
+class AvailabilityCache:
+    """
+    Caches a DayAvailability per (restaurant_id, day).
+
+    Entries are built from one tables query and one windowed reservations
+    query, then kept current by applying reservation writes made in this
+    process. The TTL bounds staleness from writes made by other processes.
+    """
+
+    def __init__(self, max_entries: int = 512):
+        self._entries = TTLCache(max_entries=max_entries)
+        self._builds = SingleFlight()
+        # Bumped on every patch so a build that raced a write is not cached
+        self._generation = 0
+
+    async def get(self, restaurant_id: str, day: date) -> DayAvailability:
+        key = (restaurant_id, day)
+        availability = self._entries.get(key)
+        if availability is not None:
+            return availability
+        generation = self._generation
+        availability = await self._builds.do(key, lambda: self._build(restaurant_id, day))
+        if generation == self._generation:
+            self._entries.set(key, availability, settings.availability_cache_ttl)
+        return availability
+
+    async def _build(self, restaurant_id: str, day: date) -> DayAvailability:
+        tables = await reservation_service.get_restaurant_tables(restaurant_id)
+        # Reservations from the previous evening can spill past midnight and the
+        # bitmap itself runs into the next morning
+        reservations = await reservation_service.get_active_reservations(
+            [table["id"] for table in tables],
+            first_day=day - timedelta(days=1),
+            last_day=day + timedelta(days=1),
+        )
+        return DayAvailability.build(day, tables, reservations)
+
+    def apply_reservation(
+        self,
+        reservation_id: Any,
+        table_id: Any,
+        reservation_date: Union[str, date],
+        reservation_time: Any,
+        status: Optional[str],
+    ):
+        """
+        Patches cached bitmaps after a reservation is created or changes status.
+        Active reservations are (re)marked on their table, others are cleared.
+        """
+        try:
+            start = reservation_start(reservation_date, reservation_time)
+        except (TypeError, ValueError):
+            logger.warning(f"Could not apply reservation {reservation_id} to availability cache")
+            return
+        self._generation += 1
+        for _, availability in self._entries.items():
+            if not availability.has_table(table_id):
+                continue
+            availability.remove_reservation(table_id, reservation_id)
+            if status in ACTIVE_STATUSES:
+                availability.add_reservation(table_id, reservation_id, start)
+
+    def invalidate_restaurant(self, restaurant_id: str):
+        self._generation += 1
+        self._entries.delete_where(lambda key: key[0] == restaurant_id)
+
+    def invalidate_table(self, table_id: Any):
+        self._generation += 1
+        stale = {key for key, availability in self._entries.items() if availability.has_table(table_id)}
+        self._entries.delete_where(lambda key: key in stale)
+
+    def stats(self):
+        return self._entries.stats()
+
+
+# Singleton instance for use in app
+availability_cache = AvailabilityCache()
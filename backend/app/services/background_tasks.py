@@ -1,75 +1,222 @@
 import logging
 import asyncio
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+from app.core.config import settings
 from app.services.reservation_service import reservation_service
 from app.services.telegram_service import telegram_service
-from app.supabase_client import supabase_patch, supabase_get
-from app.i18n.telegram_i18n import telegram_i18n, get_admin_language
+from app.supabase_client import supabase_get, supabase_post
+from app.i18n.telegram_i18n import telegram_i18n
+from app.services.scheduler import scheduler
+from app.services.reminders import reminder_engine
+from app.services.outbox import DigestPolicy, OutboxEntry, outbox
+from app.schemas.reservation import Reservation
 
 logger = logging.getLogger(__name__)
 
+PENDING_NOTIFICATIONS_JOB = "pending_notifications"
+REMINDER_REFRESH_JOB = "reminder_refresh"
+RESERVATION_NOTIFICATION = "reservation_notification"
+
+
+def format_reservation_info(reservation: Reservation, language: str) -> str:
+    """
+    Builds the HTML body of a new-reservation notification.
+    """
+    fields = telegram_i18n.get_reservation_info_template(language)
+    return (
+        f"<b>{fields['reservation_id']}:</b> {reservation.id}\n"
+        f"<b>{fields['client_name']}:</b> {reservation.client_name}\n"
+        f"<b>{fields['contact']}:</b> {reservation.client_contact}\n"
+        f"<b>{fields['time']}:</b> {reservation.reservation_date} {reservation.reservation_time}\n"
+        f"<b>{fields['party_size']}:</b> {reservation.group_party_size or reservation.party_size}"
+    )
+
+
+async def get_admins_by_restaurant(restaurant_ids) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Fetches the Telegram-linked admins of all given restaurants in one query.
+    """
+    restaurant_ids = sorted(set(restaurant_ids))
+    if not restaurant_ids:
+        return {}
+    admins = await supabase_get("admins", params={
+        "select": "id,telegram_chat_id,restaurant_id,language",
+        "restaurant_id": f"in.({','.join(restaurant_ids)})",
+        "telegram_chat_id": "not.is.null",
+    })
+    by_restaurant = defaultdict(list)
+    for admin in admins:
+        by_restaurant[admin["restaurant_id"]].append(admin)
+    return by_restaurant
+
+
+async def notify_admins(pending: List[Tuple[Reservation, str]]) -> int:
+    """
+    Queues a notification to each restaurant's Telegram admins for every
+    (reservation, restaurant_id) pair in the durable outbox, then marks all
+    of them as notified. Reservations of restaurants without Telegram-linked
+    admins are marked too, since nobody can receive them; left unmarked they
+    would fill every later batch. Returns the number of reservations queued.
+
+    Costs a fixed number of round trips however many reservations there are:
+    one admins read and one bulk update. Delivery happens in the outbox
+    dispatcher, which retries until Telegram accepts the message.
+    """
+    admins_by_restaurant = await get_admins_by_restaurant(restaurant_id for _, restaurant_id in pending)
+
+    entries = []
+    queued = set()
+    for reservation, restaurant_id in pending:
+        for admin in admins_by_restaurant.get(restaurant_id, []):
+            language = admin.get("language") or "en"
+            entries.append(OutboxEntry(
+                kind=RESERVATION_NOTIFICATION,
+                dedupe_key=f"{RESERVATION_NOTIFICATION}:{reservation.id}:{admin['telegram_chat_id']}",
+                chat_id=admin["telegram_chat_id"],
+                reservation_id=reservation.id,
+                admin_id=admin.get("id"),
+                payload={
+                    "text": format_reservation_info(reservation, language),
+                    "language": language,
+                    "restaurant_id": restaurant_id,
+                },
+                group_key=f"{restaurant_id}:{admin['telegram_chat_id']}",
+            ))
+            queued.add(reservation.id)
+
+    unreachable = sorted({reservation.id for reservation, _ in pending} - queued)
+    if unreachable:
+        logger.warning(f"No Telegram-linked admins for reservations {unreachable}; marking them notified")
+    if entries:
+        await outbox.enqueue(entries)
+    # Safe once the entries are durable: the outbox owns delivery from here on
+    await reservation_service.mark_notified(sorted(queued) + unreachable)
+    return len(queued)
+
+
+async def deliver_reservation_notification(entry: OutboxEntry) -> Optional[int]:
+    """
+    Outbox handler: sends one queued notification and returns its message id.
+    """
+    if not telegram_service:
+        raise RuntimeError("Telegram bot is not configured")
+    message = await telegram_service.send_reservation_notification(
+        chat_id=int(entry.chat_id),
+        reservation_id=str(entry.reservation_id),
+        reservation_info=entry.payload["text"],
+        language=entry.payload.get("language"),
+    )
+    if message is None:
+        raise RuntimeError(f"Telegram rejected the notification for reservation {entry.reservation_id}")
+    return message.message_id
+
+
+async def deliver_reservation_digest(entries: List[OutboxEntry]) -> List[Any]:
+    """
+    Outbox digest handler: sends one admin's held notifications as a digest and
+    returns the message id (or error) for each entry.
+    """
+    if not telegram_service:
+        raise RuntimeError("Telegram bot is not configured")
+    results = await telegram_service.send_reservation_digest(
+        chat_id=int(entries[0].chat_id),
+        reservations=[(str(entry.reservation_id), entry.payload["text"]) for entry in entries],
+        language=entries[0].payload.get("language"),
+    )
+    return [result if isinstance(result, Exception) else result.message_id for result in results]
+
+
+def digest_threshold(entry: OutboxEntry) -> int:
+    """
+    The digest cutoff for the entry's restaurant, falling back to the global default.
+    """
+    restaurant_id = entry.payload.get("restaurant_id")
+    return settings.digest_thresholds.get(str(restaurant_id), settings.digest_threshold)
+
+
+async def record_telegram_messages(entries: List[OutboxEntry]):
+    """
+    Stores the Telegram message ids of delivered notifications with one bulk insert.
+    """
+    rows = [
+        {
+            "reservation_id": entry.reservation_id,
+            "admin_id": entry.admin_id,
+            "telegram_message_id": entry.telegram_message_id,
+            "telegram_chat_id": int(entry.chat_id),
+            "message_type": entry.kind,
+        }
+        for entry in entries
+        if entry.telegram_message_id is not None and entry.reservation_id is not None
+    ]
+    if rows and settings.outbox_record_messages:
+        await supabase_post("telegram_messages", data=rows)
+
+
+outbox.register_handler(
+    RESERVATION_NOTIFICATION,
+    deliver_reservation_notification,
+    digest_handler=deliver_reservation_digest,
+    digest_policy=DigestPolicy(settings.digest_window_seconds, digest_threshold),
+)
+outbox.on_sent(record_telegram_messages)
+
+
 async def check_and_send_pending_reservations():
     """
     Checks for pending reservations and sends notifications to admins.
+    One reservations read (embedding each table's restaurant) plus notify_admins.
     """
     logger.info("Checking for pending reservations...")
+    if not telegram_service:
+        return
     try:
-        pending_reservations = await reservation_service.get_pending_reservations()
-        if not pending_reservations:
+        pending = await reservation_service.get_unnotified_reservations(limit=settings.notification_batch_size)
+        if not pending:
             logger.info("No pending reservations to notify.")
             return
 
-        for reservation in pending_reservations:
-            if not reservation.table_id:
-                continue
-
-            tables_data = await supabase_get("tables", params={"id": f"eq.{reservation.table_id}"})
-            if not tables_data:
-                continue
-
-            restaurant_id = tables_data[0].get("restaurant_id")
-            if not restaurant_id:
-                continue
-
-            admins_data = await supabase_get("admins", params={"restaurant_id": f"eq.{restaurant_id}"})
-            if not admins_data:
-                continue
-
-            for admin in admins_data:
-                if admin.get("telegram_chat_id") and telegram_service:
-                    # Get admin's preferred language
-                    language = await get_admin_language(admin["telegram_chat_id"])
-                    
-                    # Get field labels in appropriate language
-                    fields = telegram_i18n.get_reservation_info_template(language)
-                    
-                    reservation_info = (
-                        f"<b>{fields['reservation_id']}:</b> {reservation.id}\n"
-                        f"<b>{fields['client_name']}:</b> {reservation.client_name}\n"
-                        f"<b>{fields['contact']}:</b> {reservation.client_contact}\n"
-                        f"<b>{fields['time']}:</b> {reservation.reservation_date} {reservation.reservation_time}\n"
-                        f"<b>{fields['party_size']}:</b> {reservation.party_size}"
-                    )
-                    await telegram_service.send_reservation_notification(
-                        chat_id=admin["telegram_chat_id"],
-                        reservation_id=str(reservation.id),
-                        reservation_info=reservation_info,
-                    )
-
-            await supabase_patch(
-                "reservations",
-                row_id=reservation.id,
-                data={"reminder_sent": True},
-                id_column="id",
-            )
-            logger.info(f"Notification sent for reservation {reservation.id}")
+        notified = await notify_admins(pending)
+        logger.info(f"Notifications sent for {notified} of {len(pending)} pending reservations")
 
     except Exception as e:
         logger.error(f"Error in background task: {e}", exc_info=True)
 
+
+async def notify_new_reservation(reservation: Reservation):
+    """
+    Notifies admins about one just-created reservation without waiting for a sweep.
+    """
+    try:
+        await notify_admins([(reservation, reservation.restaurant_id)])
+    except Exception as e:
+        logger.error(f"Failed to send Telegram notification to admins for restaurant {reservation.restaurant_id}: {e}")
+
+
+def request_pending_notifications() -> bool:
+    """
+    Wakes the notification job so new reservations reach admins right away.
+    Returns False when the scheduler doesn't run in this process.
+    """
+    return scheduler.wake(PENDING_NOTIFICATIONS_JOB, delay=settings.notification_wake_delay)
+
+
 async def main_task():
     """
-    Main background task that runs periodically.
+    Main background task: runs the scheduled jobs until cancelled.
     """
-    while True:
-        await check_and_send_pending_reservations()
-        await asyncio.sleep(60)  # Check every 60 seconds
+    scheduler.add_job(
+        PENDING_NOTIFICATIONS_JOB,
+        check_and_send_pending_reservations,
+        interval=settings.notification_sweep_interval,
+    )
+    if not settings.reminders_enabled:
+        await scheduler.run()
+        return
+    scheduler.add_job(
+        REMINDER_REFRESH_JOB,
+        reminder_engine.refresh,
+        interval=settings.reminder_refresh_interval,
+    )
+    await asyncio.gather(scheduler.run(), reminder_engine.run())
@@ -0,0 +1,184 @@
+"""Contention-safe table claiming for concurrent bookings"""
+
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, TypeVar
+from app.services.availability import MINUTES_PER_DAY
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class ReservationConflictError(Exception):
+    """Raised when the database rejects a booking because its slot was taken concurrently."""
+
+
+def is_group_member(reservation: Dict[str, Any]) -> bool:
+    """
+    Whether a reservation row is a non-lead table of a party seated on joined
+    tables. Such rows hold their table but are notified, confirmed, reminded
+    and counted through their group's lead row.
+    """
+    return bool(reservation.get("booking_group_id")) and not reservation.get("group_party_size")
+
+
+def booking_party_size(reservation: Dict[str, Any]) -> int:
+    """
+    The size of the whole party a reservation row books: the group's size on
+    a lead row, the row's own party size otherwise.
+    """
+    return reservation.get("group_party_size") or reservation.get("party_size") or 0
+
+
+class BookingCoordinator:
+    """
+    Claims tables for new reservations without serializing unrelated bookings.
+
+    Each attempt locks only the (table, day) pairs its slot touches, so bookings
+    for different tables run in parallel. Under the lock the slot is re-checked
+    against claims made by this process since the caller read availability;
+    a taken table, or a unique-constraint conflict from the database, moves on
+    to the next candidate instead of failing the booking.
+
+    Locks and claims are per process. Across processes the database unique
+    index on (table_id, reservation_date, reservation_time) is the backstop.
+    """
+
+    def __init__(self, claim_ttl: float = 60.0, clock: Callable[[], float] = time.monotonic):
+        self.claim_ttl = claim_ttl
+        self._clock = clock
+        self._locks: Dict[Tuple[Any, int], asyncio.Lock] = {}
+        self._lock_users: Dict[Tuple[Any, int], int] = {}
+        self._claims: Dict[Any, List[Tuple[int, float]]] = {}
+        self.bookings = 0
+        self.retries = 0
+        self.conflicts = 0
+
+    async def book(
+        self,
+        candidates: Iterable[Any],
+        start: int,
+        duration: int,
+        insert: Callable[[Any], Awaitable[T]],
+    ) -> Optional[T]:
+        """
+        Tries candidate tables in order and returns the result of the first
+        successful insert, or None when every candidate was taken.
+
+        start and duration are absolute minutes as produced by
+        availability.to_minutes. insert(table_id) must raise
+        ReservationConflictError when the database reports the slot as taken;
+        any other exception aborts the booking.
+        """
+        for table_id in candidates:
+            # Cheap pre-check so tables already claimed are skipped without locking
+            if not self._unclaimed(table_id, start, duration):
+                self.retries += 1
+                continue
+            async with self._table_days([table_id], start, duration):
+                if not self._unclaimed(table_id, start, duration):
+                    self.retries += 1
+                    continue
+                try:
+                    result = await insert(table_id)
+                except ReservationConflictError:
+                    self.conflicts += 1
+                    self.retries += 1
+                    logger.info(f"Table {table_id} was taken concurrently, trying next candidate")
+                    continue
+                self._claim(table_id, start)
+                self.bookings += 1
+                return result
+        return None
+
+    async def book_group(
+        self,
+        candidates: Iterable[Sequence[Any]],
+        start: int,
+        duration: int,
+        insert: Callable[[Sequence[Any]], Awaitable[T]],
+    ) -> Optional[T]:
+        """
+        Like book, for parties seated on several joined tables: tries candidate
+        table sets in order, locking every table of a set before inserting,
+        and returns the result of the first successful insert(table_ids).
+        """
+        for table_ids in candidates:
+            if not all(self._unclaimed(table_id, start, duration) for table_id in table_ids):
+                self.retries += 1
+                continue
+            async with self._table_days(table_ids, start, duration):
+                if not all(self._unclaimed(table_id, start, duration) for table_id in table_ids):
+                    self.retries += 1
+                    continue
+                try:
+                    result = await insert(table_ids)
+                except ReservationConflictError:
+                    self.conflicts += 1
+                    self.retries += 1
+                    logger.info(f"Tables {list(table_ids)} were taken concurrently, trying next candidate")
+                    continue
+                for table_id in table_ids:
+                    self._claim(table_id, start)
+                self.bookings += 1
+                return result
+        return None
+
+    @asynccontextmanager
+    async def _table_days(self, table_ids: Sequence[Any], start: int, duration: int):
+        # A slot near midnight can conflict with the neighbouring day, so lock
+        # every day it can touch, always in the same order to avoid deadlocks
+        first_day = (start - duration) // MINUTES_PER_DAY
+        last_day = (start + duration) // MINUTES_PER_DAY
+        keys = sorted(
+            ((table_id, day) for table_id in set(table_ids) for day in range(first_day, last_day + 1)),
+            key=lambda key: (str(key[0]), key[1]),
+        )
+        locks = []
+        for key in keys:
+            self._lock_users[key] = self._lock_users.get(key, 0) + 1
+            locks.append(self._locks.setdefault(key, asyncio.Lock()))
+        acquired = []
+        try:
+            for lock in locks:
+                await lock.acquire()
+                acquired.append(lock)
+            yield
+        finally:
+            for lock in reversed(acquired):
+                lock.release()
+            for key in keys:
+                self._lock_users[key] -= 1
+                if not self._lock_users[key]:
+                    del self._lock_users[key]
+                    del self._locks[key]
+
+    def _unclaimed(self, table_id: Any, start: int, duration: int) -> bool:
+        claims = self._claims.get(table_id)
+        if not claims:
+            return True
+        now = self._clock()
+        claims[:] = [(claimed, expires_at) for claimed, expires_at in claims if expires_at > now]
+        if not claims:
+            del self._claims[table_id]
+            return True
+        return all(abs(claimed - start) >= duration for claimed, _ in claims)
+
+    def _claim(self, table_id: Any, start: int):
+        self._claims.setdefault(table_id, []).append((start, self._clock() + self.claim_ttl))
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "bookings": self.bookings,
+            "retries": self.retries,
+            "conflicts": self.conflicts,
+            "locked_table_days": len(self._locks),
+            "claimed_tables": len(self._claims),
+        }
+
+
+# Singleton instance for use in app
+booking_coordinator = BookingCoordinator()
@@ -0,0 +1,258 @@
+"""Per-restaurant, per-day dashboard snapshots, patched in place on table and reservation writes"""
+
+import asyncio
+import hashlib
+import logging
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+from app.core.cache import SingleFlight, TTLCache
+from app.core.config import settings
+from app.schemas.reservation import DashboardStatusResponse
+from app.services.booking import booking_party_size
+from app.services.reservation_service import ACTIVE_STATUSES, reservation_service
+from app.supabase_client import supabase_get
+
+logger = logging.getLogger(__name__)
+
+TABLE_COLUMNS = "id,name,capacity,location,status,restaurant_id"
+
+
+def _sort_key(reservation: Dict[str, Any]) -> Tuple[str, Any]:
+    return (str(reservation.get("reservation_time") or ""), reservation.get("id") or 0)
+
+
+def _summary(reservation: Dict[str, Any], group_sizes: Dict[str, int]) -> Dict[str, Any]:
+    group_id = reservation.get("booking_group_id")
+    return {
+        "id": reservation["id"],
+        "customer_name": reservation.get("customer_name") or reservation.get("client_name") or "",
+        "reservation_time": reservation["reservation_time"],
+        # Every table of a joined booking shows the whole party
+        "party_size": group_sizes.get(group_id) or booking_party_size(reservation),
+        "status": reservation.get("status"),
+        "booking_group_id": group_id,
+    }
+
+
+class DashboardSnapshot:
+    """
+    The dashboard of one restaurant on one day: its tables and every
+    reservation on them, kept in time order per table. Each patch bumps
+    version; the rendered body and its ETag are computed once per version.
+    """
+
+    def __init__(self, restaurant_id: str, day: date, tables: List[Dict[str, Any]], reservations: List[Dict[str, Any]]):
+        self.restaurant_id = restaurant_id
+        self.day = day
+        self.tables: Dict[Any, Dict[str, Any]] = {table["id"]: table for table in tables}
+        self.by_table: Dict[Any, List[Dict[str, Any]]] = {table_id: [] for table_id in self.tables}
+        self.reservations: Dict[Any, Dict[str, Any]] = {}
+        self.version = 0
+        self._rendered: Optional[Tuple[bytes, str]] = None
+        for reservation in reservations:
+            self._add(reservation)
+        for reservations_on_table in self.by_table.values():
+            reservations_on_table.sort(key=_sort_key)
+
+    def has_table(self, table_id: Any) -> bool:
+        return table_id in self.tables
+
+    def _add(self, reservation: Dict[str, Any]):
+        reservation = {**reservation, "restaurant_id": self.restaurant_id}
+        self.reservations[reservation["id"]] = reservation
+        self.by_table[reservation["table_id"]].append(reservation)
+
+    def _remove(self, reservation_id: Any):
+        old = self.reservations.pop(reservation_id, None)
+        if old is not None:
+            self.by_table[old["table_id"]] = [r for r in self.by_table[old["table_id"]] if r["id"] != reservation_id]
+
+    def _changed(self):
+        self.version += 1
+        self._rendered = None
+
+    def apply_reservation(self, reservation: Dict[str, Any]):
+        """
+        Inserts, moves or removes a reservation after a write. Reservations on
+        other days or on tables outside this restaurant are dropped.
+        """
+        self._remove(reservation["id"])
+        if str(reservation.get("reservation_date")) == self.day.isoformat() and reservation.get("table_id") in self.tables:
+            self._add(reservation)
+            self.by_table[reservation["table_id"]].sort(key=_sort_key)
+        self._changed()
+
+    def apply_table(self, table: Dict[str, Any]):
+        """
+        Inserts or updates a table, or removes it if it moved to another restaurant.
+        """
+        if str(table.get("restaurant_id")) != str(self.restaurant_id):
+            self.remove_table(table["id"])
+            return
+        current = self.tables.get(table["id"], {})
+        self.tables[table["id"]] = {**current, **table}
+        self.by_table.setdefault(table["id"], [])
+        self._changed()
+
+    def remove_table(self, table_id: Any):
+        if table_id not in self.tables:
+            return
+        del self.tables[table_id]
+        for reservation in self.by_table.pop(table_id, []):
+            self.reservations.pop(reservation["id"], None)
+        self._changed()
+
+    def to_response(self) -> DashboardStatusResponse:
+        group_sizes = {
+            r["booking_group_id"]: r["group_party_size"]
+            for r in self.reservations.values() if r.get("booking_group_id") and r.get("group_party_size")
+        }
+        tables = []
+        for table in self.tables.values():
+            reservations = self.by_table[table["id"]]
+            # The table shows the state of its earliest active reservation
+            current = next((r for r in reservations if r.get("status") in ACTIVE_STATUSES), None)
+            if table.get("status") not in (None, "available"):
+                status = table["status"]
+            else:
+                status = current["status"] if current else "available"
+            tables.append({
+                "id": table["id"],
+                "name": table["name"],
+                "capacity": table["capacity"],
+                "location": table.get("location"),
+                "status": status,
+                "reservation": _summary(current, group_sizes) if current else None,
+                "reservations": [_summary(r, group_sizes) for r in reservations],
+            })
+        return DashboardStatusResponse(
+            date=self.day.isoformat(),
+            tables=tables,
+            reservations=sorted(self.reservations.values(), key=_sort_key),
+        )
+
+    def render(self) -> Tuple[bytes, str]:
+        """
+        Returns the JSON body and its ETag, serialized at most once per version.
+        The ETag is a hash of the body, so every process agrees on it.
+        """
+        if self._rendered is None:
+            self._rendered = _with_etag(self.to_response())
+        return self._rendered
+
+
+def _with_etag(response: DashboardStatusResponse) -> Tuple[bytes, str]:
+    body = response.model_dump_json().encode()
+    return body, f'"{hashlib.sha1(body).hexdigest()[:20]}"'
+
+
+def render_combined(day: date, snapshots: List[DashboardSnapshot]) -> Tuple[bytes, str]:
+    """
+    One dashboard over several restaurants' snapshots of the same day,
+    for callers that do not pick a restaurant.
+    """
+    responses = [snapshot.to_response() for snapshot in snapshots]
+    return _with_etag(DashboardStatusResponse(
+        date=day.isoformat(),
+        tables=[table for response in responses for table in response.tables],
+        reservations=sorted(
+            (reservation for response in responses for reservation in response.reservations),
+            key=lambda reservation: (str(reservation.reservation_time), reservation.id),
+        ),
+    ))
+
+
+async def build_all_snapshots(day: date) -> List[DashboardSnapshot]:
+    """
+    Every restaurant's snapshot for a day from one tables query and one
+    reservations query. Not cached: only callers that do not pick a
+    restaurant need these, and caching one snapshot per restaurant would
+    crowd the scoped dashboards out of DashboardCache.
+    """
+    tables, reservations = await asyncio.gather(
+        supabase_get("tables", params={"select": TABLE_COLUMNS}),
+        supabase_get("reservations", params={
+            "select": "*",
+            "reservation_date": f"eq.{day.isoformat()}",
+            "order": "reservation_time.asc,id.asc",
+        }),
+    )
+    tables_by_restaurant: Dict[str, List[Dict[str, Any]]] = {}
+    restaurant_of_table = {}
+    for table in tables:
+        restaurant_id = str(table.get("restaurant_id"))
+        tables_by_restaurant.setdefault(restaurant_id, []).append(table)
+        restaurant_of_table[table["id"]] = restaurant_id
+    reservations_by_restaurant: Dict[str, List[Dict[str, Any]]] = {}
+    for reservation in reservations:
+        restaurant_id = restaurant_of_table.get(reservation.get("table_id"))
+        if restaurant_id is not None:
+            reservations_by_restaurant.setdefault(restaurant_id, []).append(reservation)
+    return [
+        DashboardSnapshot(restaurant_id, day, restaurant_tables, reservations_by_restaurant.get(restaurant_id, []))
+        for restaurant_id, restaurant_tables in tables_by_restaurant.items()
+    ]
+
+
+class DashboardCache:
+    """
+    Caches a DashboardSnapshot per (restaurant_id, day).
+
+    Snapshots are built from one tables query and one reservations query,
+    then patched in place by writes made in this process. The TTL bounds
+    staleness from writes made by other processes.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self._entries = TTLCache(max_entries=max_entries)
+        self._builds = SingleFlight()
+        # Bumped on every patch so a build that raced a write is not cached
+        self._generation = 0
+
+    async def get(self, restaurant_id: str, day: date) -> DashboardSnapshot:
+        key = (restaurant_id, day)
+        snapshot = self._entries.get(key)
+        if snapshot is not None:
+            return snapshot
+        generation = self._generation
+        snapshot = await self._builds.do(key, lambda: self._build(restaurant_id, day))
+        if generation == self._generation:
+            self._entries.set(key, snapshot, settings.dashboard_cache_ttl)
+        return snapshot
+
+    async def _build(self, restaurant_id: str, day: date) -> DashboardSnapshot:
+        tables = await reservation_service.get_restaurant_tables(restaurant_id, columns=TABLE_COLUMNS)
+        reservations = await reservation_service.get_day_reservations([table["id"] for table in tables], day)
+        return DashboardSnapshot(restaurant_id, day, tables, reservations)
+
+    def apply_reservation(self, reservation: Dict[str, Any]):
+        """
+        Patches cached snapshots after a reservation is created or changes.
+        """
+        if reservation.get("id") is None:
+            return
+        self._generation += 1
+        for _, snapshot in self._entries.items():
+            if snapshot.has_table(reservation.get("table_id")) or reservation["id"] in snapshot.reservations:
+                snapshot.apply_reservation(reservation)
+
+    def apply_table(self, table: Dict[str, Any]):
+        """
+        Patches cached snapshots after a table is created or updated.
+        """
+        self._generation += 1
+        for (restaurant_id, _), snapshot in self._entries.items():
+            if snapshot.has_table(table["id"]) or str(restaurant_id) == str(table.get("restaurant_id")):
+                snapshot.apply_table(table)
+
+    def remove_table(self, table_id: Any):
+        self._generation += 1
+        for _, snapshot in self._entries.items():
+            snapshot.remove_table(table_id)
+
+    def stats(self):
+        return self._entries.stats()
+
+
+# Singleton instance for use in app
+dashboard_cache = DashboardCache(max_entries=settings.dashboard_cache_max_entries)
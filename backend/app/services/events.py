@@ -0,0 +1,182 @@
+"""Per-restaurant change events for live dashboards, with replay from a sequence number"""
+
+import asyncio
+import json
+import logging
+import uuid
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, Optional, Set, Tuple
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+RESERVATION_FIELDS = (
+    "id", "table_id", "reservation_date", "reservation_time", "status", "party_size", "client_name",
+    "booking_group_id", "group_party_size",
+)
+TABLE_FIELDS = ("id", "name", "capacity", "location", "status", "is_joined", "joined_group_id")
+
+
+def compact(row: Any, fields: Iterable[str]) -> Dict[str, Any]:
+    """
+    Keeps only the fields a dashboard needs from a row or pydantic model.
+    """
+    if hasattr(row, "model_dump"):
+        row = row.model_dump(mode="json")
+    return {field: row[field] for field in fields if field in row}
+
+
+class SubscriberLimitError(Exception):
+    """Raised when a restaurant already has the maximum number of stream clients."""
+
+
+class Subscription:
+    """
+    One client's view of a restaurant's stream: a bounded queue of encoded
+    events. A client that falls more than max_buffer events behind is dropped
+    rather than letting its backlog grow.
+    """
+
+    def __init__(self, restaurant_id: str, max_buffer: int):
+        self.restaurant_id = restaurant_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_buffer)
+        self.dropped = False
+
+    def offer(self, message: str) -> bool:
+        if self.dropped:
+            return False
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            self.dropped = True
+            return False
+
+    async def next(self, timeout: float) -> Optional[str]:
+        """
+        The next encoded event, "" on timeout, or None once dropped.
+        """
+        if self.dropped:
+            return None
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None if self.dropped else ""
+
+
+class _Stream:
+    __slots__ = ("seq", "history", "subscribers")
+
+    def __init__(self, history_size: int):
+        self.seq = 0
+        self.history: Deque[Tuple[int, str]] = deque(maxlen=history_size)
+        self.subscribers: Set[Subscription] = set()
+
+
+class EventBus:
+    """
+    Fans compact change events out to the dashboards of one restaurant.
+
+    Each restaurant's events carry increasing sequence numbers and the last
+    history_size of them are kept, so a reconnecting client that sends
+    Last-Event-ID gets what it missed. Ids are prefixed with a per-process
+    epoch; a client resuming from another epoch, or from further back than
+    the history reaches, gets a "reset" event telling it to reload the
+    dashboard snapshot. Events reach clients connected to this process only,
+    at most max_subscribers per restaurant.
+    """
+
+    def __init__(self, history_size: int = 1000, max_buffer: int = 256, max_subscribers: int = 50):
+        self.history_size = history_size
+        self.max_buffer = max_buffer
+        self.max_subscribers = max_subscribers
+        self.epoch = uuid.uuid4().hex[:8]
+        self._streams: Dict[str, _Stream] = {}
+        self.published = 0
+        self.dropped = 0
+        self.resets = 0
+        self.rejected = 0
+
+    def _stream(self, restaurant_id: str) -> _Stream:
+        stream = self._streams.get(restaurant_id)
+        if stream is None:
+            stream = self._streams[restaurant_id] = _Stream(self.history_size)
+        return stream
+
+    def _encode(self, seq: Optional[int], event: str, data: Dict[str, Any]) -> str:
+        lines = []
+        if seq is not None:
+            lines.append(f"id: {self.epoch}-{seq}")
+        lines.append(f"event: {event}")
+        lines.append(f"data: {json.dumps(data, default=str, separators=(',', ':'))}")
+        return "\n".join(lines) + "\n\n"
+
+    def publish(self, restaurant_id: Any, event: str, data: Dict[str, Any]):
+        """
+        Records an event for a restaurant and offers it to every subscriber.
+        Never blocks: slow subscribers are dropped instead.
+        """
+        if restaurant_id is None:
+            return
+        stream = self._stream(str(restaurant_id))
+        stream.seq += 1
+        message = self._encode(stream.seq, event, {"seq": stream.seq, **data})
+        stream.history.append((stream.seq, message))
+        self.published += 1
+        for subscription in list(stream.subscribers):
+            if not subscription.offer(message):
+                stream.subscribers.discard(subscription)
+                self.dropped += 1
+                logger.warning(f"Dropped a slow event subscriber for restaurant {restaurant_id}")
+
+    def subscribe(self, restaurant_id: str, last_event_id: Optional[str] = None) -> Subscription:
+        """
+        Registers a subscriber, first queueing the events it missed after
+        last_event_id, or a reset event when they are no longer available.
+        Raises SubscriberLimitError when the restaurant has max_subscribers already.
+        """
+        stream = self._stream(str(restaurant_id))
+        if len(stream.subscribers) >= self.max_subscribers:
+            self.rejected += 1
+            raise SubscriberLimitError(f"Restaurant {restaurant_id} has {len(stream.subscribers)} event subscribers already")
+        subscription = Subscription(str(restaurant_id), self.max_buffer)
+        if last_event_id:
+            for message in self._replay(stream, last_event_id):
+                subscription.offer(message)
+        stream.subscribers.add(subscription)
+        return subscription
+
+    def _replay(self, stream: _Stream, last_event_id: str):
+        epoch, _, seq = last_event_id.strip().rpartition("-")
+        try:
+            seq = int(seq)
+        except ValueError:
+            seq = -1
+        oldest = stream.history[0][0] if stream.history else stream.seq + 1
+        if epoch != self.epoch or seq < oldest - 1 or seq > stream.seq or stream.seq - seq > self.max_buffer:
+            self.resets += 1
+            return [self._encode(None, "reset", {"seq": stream.seq})]
+        return [message for event_seq, message in stream.history if event_seq > seq]
+
+    def unsubscribe(self, subscription: Subscription):
+        stream = self._streams.get(subscription.restaurant_id)
+        if stream is not None:
+            stream.subscribers.discard(subscription)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "restaurants": len(self._streams),
+            "subscribers": sum(len(stream.subscribers) for stream in self._streams.values()),
+            "published": self.published,
+            "dropped": self.dropped,
+            "resets": self.resets,
+            "rejected": self.rejected,
+        }
+
+
+# Singleton instance for use in app
+event_bus = EventBus(
+    history_size=settings.events_history_size,
+    max_buffer=settings.events_client_buffer,
+    max_subscribers=settings.events_max_subscribers,
+)
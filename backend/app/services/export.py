@@ -0,0 +1,110 @@
+"""Streams a restaurant's reservation history as CSV or NDJSON, page by page"""
+
+import csv
+import io
+import json
+import logging
+from datetime import date
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional
+from app.core.config import settings
+from app.services.reservation_service import reservation_service
+from app.supabase_client import supabase_pages
+
+logger = logging.getLogger(__name__)
+
+EXPORT_COLUMNS = (
+    "id",
+    "table_id",
+    "reservation_date",
+    "reservation_time",
+    "party_size",
+    "booking_group_id",
+    "group_party_size",
+    "status",
+    "client_name",
+    "client_contact",
+    "customer_id",
+    "special_requests",
+    "confirmed_by",
+    "confirmed_at",
+    "created_at",
+    "updated_at",
+)
+
+EXPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+
+async def export_pages(
+    restaurant_id: str,
+    first_day: Optional[date] = None,
+    last_day: Optional[date] = None,
+    status: Optional[str] = None,
+    cursor: Optional[int] = None,
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    Yields a restaurant's reservations in id order, one page at a time,
+    starting after the reservation id given as cursor.
+    """
+    tables = await reservation_service.get_restaurant_tables(restaurant_id)
+    if not tables:
+        return
+    params: Dict[str, Any] = {
+        "select": ",".join(EXPORT_COLUMNS),
+        "table_id": f"in.({','.join(str(table['id']) for table in tables)})",
+    }
+    dates = []
+    if first_day:
+        dates.append(f"reservation_date.gte.{first_day.isoformat()}")
+    if last_day:
+        dates.append(f"reservation_date.lte.{last_day.isoformat()}")
+    if dates:
+        params["and"] = f"({','.join(dates)})"
+    if status:
+        params["status"] = f"eq.{status}"
+
+    async for page in supabase_pages("reservations", params, settings.export_page_size, after=cursor):
+        yield page
+
+
+def csv_chunk(rows: Iterable[Dict[str, Any]], header: bool = False) -> str:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS, extrasaction="ignore")
+    if header:
+        writer.writeheader()
+    writer.writerows(rows)
+    return buffer.getvalue()
+
+
+def ndjson_chunk(rows: Iterable[Dict[str, Any]]) -> str:
+    return "".join(
+        json.dumps({column: row.get(column) for column in EXPORT_COLUMNS}, default=str, separators=(",", ":")) + "\n"
+        for row in rows
+    )
+
+
+async def stream_export(
+    pages: AsyncIterator[List[Dict[str, Any]]],
+    export_format: str,
+    header: bool = True,
+) -> AsyncIterator[str]:
+    """
+    Encodes pages as they arrive, one chunk per page. A failure part way
+    through aborts the response, so the client sees an incomplete transfer
+    rather than a short file, and can resume with the id of the last row it
+    received as cursor. Resumed CSV exports pass header=False so the parts
+    concatenate into one file.
+    """
+    if export_format == "csv" and header:
+        yield csv_chunk((), header=True)
+    exported = 0
+    try:
+        async for page in pages:
+            yield csv_chunk(page) if export_format == "csv" else ndjson_chunk(page)
+            exported += len(page)
+    except Exception as e:
+        logger.error(f"Reservation export aborted after {exported} rows: {e}", exc_info=True)
+        raise
+    logger.info(f"Exported {exported} reservations")
@@ -0,0 +1,531 @@
+"""Durable local outbox for outbound notifications"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.core.metrics import TimingStats
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxEntry:
+    """
+    One message to deliver. dedupe_key makes enqueueing idempotent: a second
+    entry with the same key is ignored while the first is kept.
+    """
+
+    def __init__(
+        self,
+        kind: str,
+        dedupe_key: str,
+        chat_id: Any,
+        payload: Dict[str, Any],
+        reservation_id: Optional[int] = None,
+        admin_id: Optional[Any] = None,
+        group_key: Optional[str] = None,
+        id: Optional[int] = None,
+        attempts: int = 0,
+        held: bool = False,
+    ):
+        self.kind = kind
+        self.dedupe_key = dedupe_key
+        self.chat_id = chat_id
+        self.payload = payload
+        self.reservation_id = reservation_id
+        self.admin_id = admin_id
+        self.group_key = group_key
+        self.id = id
+        self.attempts = attempts
+        self.held = held
+        self.telegram_message_id: Optional[int] = None
+
+
+# A handler delivers one entry and returns the Telegram message id it produced
+# (or None when there is none); raising marks the attempt as failed.
+OutboxHandler = Callable[[OutboxEntry], Awaitable[Optional[int]]]
+
+# A digest handler delivers several entries of one group together and returns
+# the message id each entry ended up in, or the exception that kept it unsent.
+DigestHandler = Callable[[List[OutboxEntry]], Awaitable[List[Any]]]
+
+
+class _Window:
+    __slots__ = ("ends_at", "individual_sent")
+
+    def __init__(self, ends_at: float, individual_sent: int):
+        self.ends_at = ends_at
+        self.individual_sent = individual_sent
+
+
+class DigestPolicy:
+    """
+    Coalesces bursts per group (e.g. restaurant and admin). Within a window
+    of window seconds the first threshold - 1 entries go out one by one; the
+    rest are held until the window closes and delivered as one digest, after
+    which the group stays in digest mode for as long as entries keep arriving.
+    A threshold of 0 disables coalescing for the group.
+    """
+
+    def __init__(
+        self,
+        window: float,
+        threshold_for: Callable[[OutboxEntry], int],
+        clock: Callable[[], float] = time.time,
+    ):
+        self.window = window
+        self.threshold_for = threshold_for
+        self._clock = clock
+        self._windows: Dict[str, _Window] = {}
+        self.digests = 0
+
+    def plan(self, group_key: str, entries: List[OutboxEntry]) -> Tuple[List[OutboxEntry], List[OutboxEntry], List[OutboxEntry], float]:
+        """
+        Splits one group's due entries into (individual, digest, held, held_until).
+        """
+        now = self._clock()
+        threshold = self.threshold_for(entries[0])
+        if threshold <= 0:
+            return entries, [], [], now
+
+        if any(entry.held for entry in entries):
+            # The window closed: everything waiting goes out together, and
+            # anything arriving during the next window is held again
+            self._windows[group_key] = _Window(now + self.window, threshold - 1)
+            if len(entries) == 1:
+                return entries, [], [], now
+            self.digests += 1
+            return [], entries, [], now
+
+        window = self._windows.get(group_key)
+        if window is None or now >= window.ends_at:
+            window = self._windows[group_key] = _Window(now + self.window, 0)
+            self._prune(now)
+        allowed = max(0, threshold - 1 - window.individual_sent)
+        individual, held = entries[:allowed], entries[allowed:]
+        window.individual_sent += len(individual)
+        return individual, [], held, window.ends_at
+
+    def _prune(self, now: float):
+        if len(self._windows) > 10000:
+            self._windows = {key: window for key, window in self._windows.items() if window.ends_at > now}
+
+
+class OutboxStore:
+    """
+    SQLite (WAL) table of outbox entries. Rows are claimed with a lease, so
+    several processes on one host can share the file and a crashed process's
+    claims are picked up again once the lease runs out.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS outbox ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "dedupe_key TEXT NOT NULL UNIQUE, "
+                "kind TEXT NOT NULL, "
+                "chat_id TEXT NOT NULL, "
+                "reservation_id INTEGER, "
+                "admin_id TEXT, "
+                "payload TEXT NOT NULL, "
+                "status TEXT NOT NULL DEFAULT 'pending', "
+                "attempts INTEGER NOT NULL DEFAULT 0, "
+                "next_attempt_at REAL NOT NULL, "
+                "lease_until REAL, "
+                "telegram_message_id INTEGER, "
+                "last_error TEXT, "
+                "created_at REAL NOT NULL, "
+                "sent_at REAL, "
+                "group_key TEXT, "
+                "held INTEGER NOT NULL DEFAULT 0)"
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(outbox)")}
+            if "group_key" not in columns:
+                conn.execute("ALTER TABLE outbox ADD COLUMN group_key TEXT")
+                conn.execute("ALTER TABLE outbox ADD COLUMN held INTEGER NOT NULL DEFAULT 0")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox(status, next_attempt_at)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def insert(self, groups: List[List[OutboxEntry]]) -> List[int]:
+        """
+        Inserts all groups in one transaction, skipping duplicate keys. Returns
+        the number of rows actually added per group.
+        """
+        now = time.time()
+        inserted = []
+        with self._lock:
+            conn = self._connect()
+            for entries in groups:
+                before = conn.total_changes
+                conn.executemany(
+                    "INSERT OR IGNORE INTO outbox "
+                    "(dedupe_key, kind, chat_id, reservation_id, admin_id, payload, group_key, next_attempt_at, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (
+                            entry.dedupe_key, entry.kind, str(entry.chat_id), entry.reservation_id,
+                            None if entry.admin_id is None else str(entry.admin_id),
+                            json.dumps(entry.payload), entry.group_key, now, now,
+                        )
+                        for entry in entries
+                    ],
+                )
+                inserted.append(conn.total_changes - before)
+            conn.commit()
+        return inserted
+
+    def claim(self, limit: int, lease: float) -> List[OutboxEntry]:
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            rows = conn.execute(
+                "UPDATE outbox SET status = 'sending', lease_until = ? WHERE id IN ("
+                "SELECT id FROM outbox WHERE (status = 'pending' AND next_attempt_at <= ?) "
+                "OR (status = 'sending' AND lease_until < ?) ORDER BY id LIMIT ?) "
+                "RETURNING id, kind, dedupe_key, chat_id, reservation_id, admin_id, payload, attempts, group_key, held",
+                (now + lease, now, now, limit),
+            ).fetchall()
+            conn.commit()
+        entries = [
+            OutboxEntry(
+                kind=kind, dedupe_key=dedupe_key, chat_id=chat_id, payload=json.loads(payload),
+                reservation_id=reservation_id, admin_id=admin_id, group_key=group_key,
+                id=row_id, attempts=attempts, held=bool(held),
+            )
+            for row_id, kind, dedupe_key, chat_id, reservation_id, admin_id, payload, attempts, group_key, held in rows
+        ]
+        entries.sort(key=lambda entry: entry.id)
+        return entries
+
+    def complete(
+        self,
+        sent: List[Tuple[int, Optional[int]]],
+        failed: List[Tuple[int, str, float]],
+        dead: List[Tuple[int, str]],
+        held: List[Tuple[int, float]] = (),
+    ):
+        """
+        Records a dispatch round in one transaction: sent (id, message_id),
+        failed (id, error, retry_at), dead (id, error) and held (id, until) rows.
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                "UPDATE outbox SET status = 'sent', attempts = attempts + 1, telegram_message_id = ?, "
+                "sent_at = ?, lease_until = NULL WHERE id = ?",
+                [(message_id, now, row_id) for row_id, message_id in sent],
+            )
+            conn.executemany(
+                "UPDATE outbox SET status = 'pending', attempts = attempts + 1, last_error = ?, "
+                "next_attempt_at = ?, lease_until = NULL WHERE id = ?",
+                [(error, retry_at, row_id) for row_id, error, retry_at in failed],
+            )
+            conn.executemany(
+                "UPDATE outbox SET status = 'failed', attempts = attempts + 1, last_error = ?, "
+                "lease_until = NULL WHERE id = ?",
+                [(error, row_id) for row_id, error in dead],
+            )
+            conn.executemany(
+                "UPDATE outbox SET status = 'pending', held = 1, next_attempt_at = ?, lease_until = NULL WHERE id = ?",
+                [(until, row_id) for row_id, until in held],
+            )
+            conn.commit()
+
+    def next_due(self) -> Optional[float]:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT MIN(CASE WHEN status = 'pending' THEN next_attempt_at ELSE lease_until END) "
+                "FROM outbox WHERE status IN ('pending', 'sending')"
+            ).fetchone()
+        return row[0] if row else None
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._connect().execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall()
+        return dict(rows)
+
+    def prune(self, older_than: float):
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "DELETE FROM outbox WHERE status IN ('sent', 'failed') AND created_at < ?", (older_than,)
+            )
+            conn.commit()
+
+
+class Outbox:
+    """
+    At-least-once delivery of notifications through a local SQLite outbox.
+
+    enqueue() returns once its entries are committed; concurrent calls are
+    grouped by a writer task into one transaction. A dispatcher claims due
+    entries in batches, delivers them concurrently through the handler
+    registered for their kind, retries failures with backoff and records the
+    resulting Telegram message ids in bulk.
+    """
+
+    def __init__(self, store: OutboxStore):
+        self.store = store
+        self._handlers: Dict[str, OutboxHandler] = {}
+        self._digests: Dict[str, Tuple[DigestHandler, DigestPolicy]] = {}
+        self._buffer: List[Tuple[List[OutboxEntry], asyncio.Future]] = []
+        self._buffered = 0
+        self._has_writes: Optional[asyncio.Event] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._writer: Optional[asyncio.Task] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._on_sent: List[Callable[[List[OutboxEntry]], Awaitable[None]]] = []
+        self._delivering = False
+        self.written = 0
+        self.deduplicated = 0
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.held = 0
+        self.flush_time = TimingStats()
+        self.delivery_time = TimingStats()
+
+    def register_handler(
+        self,
+        kind: str,
+        handler: OutboxHandler,
+        digest_handler: Optional[DigestHandler] = None,
+        digest_policy: Optional[DigestPolicy] = None,
+    ):
+        """
+        Registers how entries of a kind are delivered. With a digest handler and
+        policy, entries sharing a group_key are coalesced as the policy decides.
+        """
+        self._handlers[kind] = handler
+        if digest_handler and digest_policy:
+            self._digests[kind] = (digest_handler, digest_policy)
+
+    def on_sent(self, callback: Callable[[List[OutboxEntry]], Awaitable[None]]):
+        """
+        Registers a callback receiving each dispatch round's delivered entries.
+        """
+        self._on_sent.append(callback)
+
+    @property
+    def running(self) -> bool:
+        return self._dispatcher is not None and not self._dispatcher.done()
+
+    def start(self):
+        if self.running:
+            return
+        self._has_writes = asyncio.Event()
+        self._wake = asyncio.Event()
+        self._writer = asyncio.create_task(self._write_loop(), name="outbox-writer")
+        self._dispatcher = asyncio.create_task(self._dispatch_loop(), name="outbox-dispatcher")
+        logger.info(f"Started notification outbox ({self.store.path}, pid {os.getpid()})")
+
+    async def enqueue(self, entries: List[OutboxEntry]) -> int:
+        """
+        Durably stores entries and returns how many were new (the rest were
+        duplicates of entries already in the outbox).
+        """
+        if not entries:
+            return 0
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        self._buffer.append((entries, future))
+        self._buffered += len(entries)
+        self._has_writes.set()
+        return await future
+
+    async def stop(self, drain_timeout: Optional[float] = None):
+        """
+        Flushes pending writes and keeps dispatching until nothing is due or
+        drain_timeout passes. Whatever is left stays in the outbox for the
+        next start.
+        """
+        if not self.running:
+            return
+        drain_timeout = settings.outbox_drain_timeout if drain_timeout is None else drain_timeout
+        deadline = time.monotonic() + drain_timeout
+        while time.monotonic() < deadline:
+            if not self._buffer and not self._delivering:
+                next_due = await asyncio.to_thread(self.store.next_due)
+                if next_due is None or next_due > time.time():
+                    break
+            await asyncio.sleep(0.05)
+        else:
+            logger.warning("Outbox drain deadline reached; remaining notifications stay queued")
+        for task in (self._writer, self._dispatcher):
+            task.cancel()
+        await asyncio.gather(self._writer, self._dispatcher, return_exceptions=True)
+        self._dispatcher = None
+        self._writer = None
+
+    async def _write_loop(self):
+        while True:
+            await self._has_writes.wait()
+            if self._buffered < settings.outbox_batch_size:
+                # Give concurrent producers a moment to join this transaction
+                await asyncio.sleep(settings.outbox_flush_interval)
+            self._has_writes.clear()
+            batch, self._buffer, self._buffered = self._buffer, [], 0
+            started = time.monotonic()
+            try:
+                counts = await asyncio.to_thread(self.store.insert, [group for group, _ in batch])
+            except Exception as e:
+                logger.error(f"Failed to write {len(batch)} outbox batches: {e}", exc_info=True)
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.flush_time.observe(time.monotonic() - started)
+            for (group, future), inserted in zip(batch, counts):
+                self.written += inserted
+                self.deduplicated += len(group) - inserted
+                if not future.done():
+                    future.set_result(inserted)
+            self._wake.set()
+
+    async def _dispatch_loop(self):
+        try:
+            await asyncio.to_thread(self.store.prune, time.time() - settings.outbox_retention_days * 86400)
+        except Exception as e:
+            logger.warning(f"Failed to prune the outbox: {e}")
+        while True:
+            self._wake.clear()
+            try:
+                # Set before claiming, so stop() never cancels a claimed batch
+                # that has not been delivered yet
+                self._delivering = True
+                try:
+                    entries = await asyncio.to_thread(
+                        self.store.claim, settings.outbox_batch_size, settings.outbox_lease_seconds
+                    )
+                    if entries:
+                        await self._deliver(entries)
+                        continue
+                finally:
+                    self._delivering = False
+                next_due = await asyncio.to_thread(self.store.next_due)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Outbox dispatch failed: {e}", exc_info=True)
+                next_due = time.time() + 5
+            timeout = None if next_due is None else max(0.0, next_due - time.time())
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _plan(self, entries: List[OutboxEntry]) -> Tuple[List[OutboxEntry], List[List[OutboxEntry]], List[Tuple[int, float]]]:
+        """
+        Splits claimed entries into those sent one by one, digest groups and
+        held (id, until) pairs, according to each kind's digest policy.
+        """
+        individual, digests, held = [], [], []
+        groups: Dict[Tuple[str, str], List[OutboxEntry]] = {}
+        for entry in entries:
+            if entry.kind in self._digests and entry.group_key:
+                groups.setdefault((entry.kind, entry.group_key), []).append(entry)
+            else:
+                individual.append(entry)
+        for (kind, group_key), group in groups.items():
+            _, policy = self._digests[kind]
+            now_entries, digest, later, until = policy.plan(group_key, group)
+            individual.extend(now_entries)
+            if digest:
+                digests.append(digest)
+            held.extend((entry.id, until) for entry in later)
+        return individual, digests, held
+
+    async def _deliver(self, entries: List[OutboxEntry]):
+        semaphore = asyncio.Semaphore(settings.outbox_concurrency)
+        individual, digests, held = self._plan(entries)
+
+        async def deliver(entry: OutboxEntry) -> Optional[int]:
+            handler = self._handlers.get(entry.kind)
+            if handler is None:
+                raise LookupError(f"No outbox handler for {entry.kind}")
+            async with semaphore:
+                return await handler(entry)
+
+        async def deliver_digest(group: List[OutboxEntry]) -> List[Optional[int]]:
+            handler, _ = self._digests[group[0].kind]
+            async with semaphore:
+                return await handler(group)
+
+        started = time.monotonic()
+        results, digest_results = await asyncio.gather(
+            asyncio.gather(*(deliver(entry) for entry in individual), return_exceptions=True),
+            asyncio.gather(*(deliver_digest(group) for group in digests), return_exceptions=True),
+        )
+        self.delivery_time.observe(time.monotonic() - started)
+
+        outcomes = list(zip(individual, results))
+        for group, result in zip(digests, digest_results):
+            if isinstance(result, BaseException):
+                outcomes.extend((entry, result) for entry in group)
+            else:
+                outcomes.extend(zip(group, result))
+
+        sent, failed, dead, delivered = [], [], [], []
+        now = time.time()
+        for entry, result in outcomes:
+            if isinstance(result, asyncio.CancelledError):
+                raise result
+            if isinstance(result, Exception):
+                attempts = entry.attempts + 1
+                if attempts >= settings.outbox_max_attempts:
+                    dead.append((entry.id, str(result)))
+                    logger.error(f"Giving up on outbox entry {entry.dedupe_key} after {attempts} attempts: {result}")
+                else:
+                    failed.append((entry.id, str(result), now + min(2 ** attempts, 300)))
+                continue
+            entry.telegram_message_id = result
+            sent.append((entry.id, result))
+            delivered.append(entry)
+
+        await asyncio.to_thread(self.store.complete, sent, failed, dead, held)
+        self.sent += len(sent)
+        self.retried += len(failed)
+        self.failed += len(dead)
+        self.held += len(held)
+
+        for callback in self._on_sent:
+            try:
+                await callback(delivered)
+            except Exception as e:
+                logger.error(f"Outbox sent-callback failed: {e}", exc_info=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "buffered": self._buffered,
+            "written": self.written,
+            "deduplicated": self.deduplicated,
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+            "held": self.held,
+            "digests": {kind: policy.digests for kind, (_, policy) in self._digests.items()},
+            "flush_time": self.flush_time.stats(),
+            "delivery_time": self.delivery_time.stats(),
+        }
+
+
+# Singleton instance for use in app
+outbox = Outbox(OutboxStore(settings.outbox_path))
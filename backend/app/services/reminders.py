@@ -0,0 +1,550 @@
+"""Timed reminders to clients about their upcoming confirmed reservations"""
+
+import asyncio
+import heapq
+import json
+import logging
+import re
+import smtplib
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from app.core.config import settings
+from app.i18n.telegram_i18n import telegram_i18n
+from app.services.booking import booking_party_size, is_group_member
+from app.supabase_client import supabase_get
+
+logger = logging.getLogger(__name__)
+
+EMAIL_REGEX = re.compile(r"^[\w\.\+-]+@[\w\.-]+\.\w+$")
+TELEGRAM_CONTACT_PREFIX = "telegram:"
+
+# Columns needed to build a reminder
+REMINDER_COLUMNS = (
+    "id,client_name,client_contact,reservation_date,reservation_time,party_size,restaurant_id,"
+    "booking_group_id,group_party_size"
+)
+
+
+class Reminder:
+    def __init__(
+        self,
+        reservation_id: int,
+        contact: str,
+        client_name: str,
+        restaurant_name: str,
+        starts_at: datetime,
+        party_size: int,
+        fire_at: datetime,
+    ):
+        self.reservation_id = reservation_id
+        self.contact = contact
+        self.client_name = client_name
+        self.restaurant_name = restaurant_name
+        self.starts_at = starts_at
+        self.party_size = party_size
+        self.fire_at = fire_at
+
+    def subject(self, language: str) -> str:
+        return telegram_i18n.get_text("client_reminder.subject", language, restaurant_name=self.restaurant_name)
+
+    def body(self, language: str) -> str:
+        return telegram_i18n.get_text(
+            "client_reminder.body",
+            language,
+            client_name=self.client_name,
+            restaurant_name=self.restaurant_name,
+            date=self.starts_at.strftime("%Y-%m-%d"),
+            time=self.starts_at.strftime("%H:%M"),
+            party_size=self.party_size,
+        )
+
+
+class ReminderChannel(ABC):
+    """
+    A way of reaching clients. The engine hands each channel the due reminders
+    whose contact it accepts, one batch per second.
+    """
+
+    name = "channel"
+
+    @abstractmethod
+    def accepts(self, contact: str) -> bool:
+        ...
+
+    @abstractmethod
+    async def send_batch(self, reminders: List[Reminder]) -> List[int]:
+        """
+        Sends the reminders and returns the reservation ids that were delivered.
+        """
+
+
+class TelegramReminderChannel(ReminderChannel):
+    """
+    Sends to clients whose contact is "telegram:<chat_id>".
+    """
+
+    name = "telegram"
+
+    def __init__(self, concurrency: int = 20):
+        self.concurrency = concurrency
+
+    def accepts(self, contact: str) -> bool:
+        return contact.startswith(TELEGRAM_CONTACT_PREFIX)
+
+    async def send_batch(self, reminders: List[Reminder]) -> List[int]:
+        from app.services.telegram_sender import Priority
+        from app.services.telegram_service import telegram_service
+
+        if not telegram_service:
+            return []
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def send(reminder: Reminder) -> Optional[int]:
+            chat_id = reminder.contact[len(TELEGRAM_CONTACT_PREFIX):]
+            async with semaphore:
+                try:
+                    await telegram_service.send_message(
+                        chat_id=chat_id, text=reminder.body(settings.reminder_language), priority=Priority.REMINDER
+                    )
+                    return reminder.reservation_id
+                except Exception as e:
+                    logger.error(f"Failed to send Telegram reminder for reservation {reminder.reservation_id}: {e}")
+                    return None
+
+        results = await asyncio.gather(*(send(reminder) for reminder in reminders))
+        return [reservation_id for reservation_id in results if reservation_id is not None]
+
+
+class EmailReminderChannel(ReminderChannel):
+    """
+    Sends to clients whose contact is an email address, over one SMTP
+    connection per batch.
+    """
+
+    name = "email"
+
+    def __init__(
+        self,
+        host: str,
+        port: int = 587,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        sender: Optional[str] = None,
+        use_tls: bool = True,
+    ):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.sender = sender or username
+        self.use_tls = use_tls
+
+    def accepts(self, contact: str) -> bool:
+        return bool(EMAIL_REGEX.match(contact))
+
+    async def send_batch(self, reminders: List[Reminder]) -> List[int]:
+        # smtplib is blocking, so the whole batch runs in a worker thread
+        return await asyncio.to_thread(self._send_all, reminders)
+
+    def _send_all(self, reminders: List[Reminder]) -> List[int]:
+        sent = []
+        try:
+            with smtplib.SMTP(self.host, self.port, timeout=30) as smtp:
+                if self.use_tls:
+                    smtp.starttls()
+                if self.username:
+                    smtp.login(self.username, self.password or "")
+                for reminder in reminders:
+                    message = EmailMessage()
+                    message["From"] = self.sender
+                    message["To"] = reminder.contact
+                    message["Subject"] = reminder.subject(settings.reminder_language)
+                    message.set_content(reminder.body(settings.reminder_language))
+                    try:
+                        smtp.send_message(message)
+                        sent.append(reminder.reservation_id)
+                    except smtplib.SMTPException as e:
+                        logger.error(f"Failed to email reminder for reservation {reminder.reservation_id}: {e}")
+        except (OSError, smtplib.SMTPException) as e:
+            logger.error(f"SMTP connection to {self.host}:{self.port} failed: {e}")
+        return sent
+
+
+class FileReminderChannel(ReminderChannel):
+    """
+    Local stand-in for development and tests: accepts every contact and
+    appends each reminder to a JSON-lines file instead of sending it.
+    """
+
+    name = "file"
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def accepts(self, contact: str) -> bool:
+        return True
+
+    async def send_batch(self, reminders: List[Reminder]) -> List[int]:
+        lines = [
+            json.dumps({
+                "reservation_id": reminder.reservation_id,
+                "contact": reminder.contact,
+                "fire_at": reminder.fire_at.isoformat(),
+                "subject": reminder.subject(settings.reminder_language),
+                "body": reminder.body(settings.reminder_language),
+            })
+            for reminder in reminders
+        ]
+        await asyncio.to_thread(self._append, lines)
+        return [reminder.reservation_id for reminder in reminders]
+
+    def _append(self, lines: List[str]):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+
+class ReminderProgress:
+    """
+    Reservation ids whose reminder went out, kept in a local SQLite file so a
+    restarted worker doesn't send them again.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Opened on first use so API processes that never send reminders don't create the file
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sent_reminders ("
+                "reservation_id INTEGER PRIMARY KEY, starts_at TEXT NOT NULL, sent_at TEXT NOT NULL)"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    async def sent_ids(self, reservation_ids: Iterable[int]) -> Set[int]:
+        return await asyncio.to_thread(self._sent_ids, list(reservation_ids))
+
+    async def mark_sent(self, reminders: List[Reminder]):
+        await asyncio.to_thread(self._mark_sent, reminders)
+
+    async def prune(self, before: datetime):
+        await asyncio.to_thread(self._prune, before)
+
+    def _sent_ids(self, reservation_ids: List[int]) -> Set[int]:
+        sent = set()
+        with self._lock:
+            # Stay under SQLite's bound-parameter limit
+            for i in range(0, len(reservation_ids), 500):
+                chunk = reservation_ids[i:i + 500]
+                rows = self._connect().execute(
+                    f"SELECT reservation_id FROM sent_reminders WHERE reservation_id IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                )
+                sent.update(row[0] for row in rows)
+        return sent
+
+    def _mark_sent(self, reminders: List[Reminder]):
+        now = datetime.now().isoformat()
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                "INSERT OR REPLACE INTO sent_reminders (reservation_id, starts_at, sent_at) VALUES (?, ?, ?)",
+                [(reminder.reservation_id, reminder.starts_at.isoformat(), now) for reminder in reminders],
+            )
+            conn.commit()
+
+    def _prune(self, before: datetime):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM sent_reminders WHERE starts_at < ?", (before.isoformat(),))
+            conn.commit()
+
+
+class ReminderEngine:
+    """
+    Keeps upcoming confirmed reservations in a heap ordered by reminder time
+    and fires each reminder through the first channel accepting its contact.
+
+    refresh() reloads the schedule with a handful of paged queries per run
+    (never one per reservation). Reminders due in the same second are sent
+    as one batch per channel, and their ids are recorded in ReminderProgress
+    before the next batch. Each batch is checked against the database once
+    more, so reservations discarded since the last refresh are skipped.
+    """
+
+    def __init__(
+        self,
+        channels: List[ReminderChannel],
+        progress: ReminderProgress,
+        clock: Callable[[], datetime] = datetime.now,
+    ):
+        self.channels = channels
+        self.progress = progress
+        self._clock = clock
+        self._pending: Dict[int, Reminder] = {}
+        self._restaurant_names: Dict[str, str] = {}
+        self._heap: List[Tuple[datetime, int]] = []
+        self._changed: Optional[asyncio.Event] = None
+        self._running = False
+        self._lead = timedelta(hours=settings.reminder_hours_before)
+        self.sent = 0
+        self.failed = 0
+        self.unroutable = 0
+        self.cancelled = 0
+        self.batches = 0
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    async def refresh(self):
+        """
+        Replaces the schedule with confirmed reservations starting between now
+        and the end of the look-ahead window, minus those already reminded.
+        A party on joined tables gets one reminder, for its lead reservation.
+        """
+        now = self._clock()
+        self._lead = await self._load_lead_time()
+        window_end = now + self._lead + timedelta(seconds=2 * settings.reminder_refresh_interval)
+
+        rows = [row for row in await self._load_reservations(now, window_end) if not is_group_member(row)]
+        already_sent = await self.progress.sent_ids(row["id"] for row in rows)
+        rows = [row for row in rows if row["id"] not in already_sent]
+        self._restaurant_names = await self._load_restaurant_names({row["restaurant_id"] for row in rows})
+
+        pending = {}
+        for row in rows:
+            reminder = self._to_reminder(row, self._restaurant_names.get(row["restaurant_id"], ""))
+            if reminder.starts_at > now:
+                pending[reminder.reservation_id] = reminder
+        self._pending = pending
+        self._heap = [(reminder.fire_at, reminder.reservation_id) for reminder in pending.values()]
+        heapq.heapify(self._heap)
+        self._notify()
+
+        await self.progress.prune(now - timedelta(days=1))
+        logger.info(f"Scheduled {len(pending)} client reminders (lead time {self._lead})")
+
+    def on_reservation_changed(self, reservation: Dict[str, Any]):
+        """
+        Keeps the schedule current between refreshes when a reservation is
+        confirmed or leaves the confirmed state. No-op unless the engine runs here.
+        """
+        if not self._running or not reservation.get("id") or is_group_member(reservation):
+            return
+        if reservation.get("status") != "confirmed":
+            self._pending.pop(reservation["id"], None)
+            return
+        reminder = self._to_reminder(reservation, self._restaurant_names.get(reservation.get("restaurant_id"), ""))
+        if reminder.starts_at <= self._clock():
+            return
+        self._pending[reminder.reservation_id] = reminder
+        heapq.heappush(self._heap, (reminder.fire_at, reminder.reservation_id))
+        self._notify()
+
+    async def run(self):
+        """
+        Fires reminders as they come due until cancelled.
+        """
+        self._changed = asyncio.Event()
+        self._running = True
+        try:
+            while True:
+                self._changed.clear()
+                batch, wait = self._due_batch()
+                if batch:
+                    await self._dispatch(batch)
+                    continue
+                try:
+                    await asyncio.wait_for(self._changed.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._running = False
+
+    def _due_batch(self) -> Tuple[List[Reminder], Optional[float]]:
+        """
+        Pops every reminder due up to the end of the current second. Returns
+        them, or the seconds to wait for the next one.
+        """
+        now = self._clock()
+        second_end = now.replace(microsecond=0) + timedelta(seconds=1)
+        batch = []
+        while self._heap:
+            fire_at, reservation_id = self._heap[0]
+            reminder = self._pending.get(reservation_id)
+            if reminder is None or reminder.fire_at != fire_at:
+                # Cancelled or rescheduled
+                heapq.heappop(self._heap)
+                continue
+            if fire_at >= second_end:
+                if batch:
+                    break
+                return batch, (fire_at - now).total_seconds()
+            heapq.heappop(self._heap)
+            del self._pending[reservation_id]
+            if reminder.starts_at > now:
+                batch.append(reminder)
+        return batch, None
+
+    async def _dispatch(self, batch: List[Reminder]):
+        self.batches += 1
+        batch = await self._still_confirmed(batch)
+        by_channel: Dict[int, List[Reminder]] = {}
+        for reminder in batch:
+            index = next(
+                (i for i, channel in enumerate(self.channels) if channel.accepts(reminder.contact)), None
+            )
+            if index is None:
+                self.unroutable += 1
+                logger.warning(f"No reminder channel accepts the contact of reservation {reminder.reservation_id}")
+                continue
+            by_channel.setdefault(index, []).append(reminder)
+
+        results = await asyncio.gather(
+            *(self.channels[index].send_batch(reminders) for index, reminders in by_channel.items()),
+            return_exceptions=True,
+        )
+        delivered: List[Reminder] = []
+        for (index, reminders), result in zip(by_channel.items(), results):
+            if isinstance(result, Exception):
+                logger.error(f"Reminder channel {self.channels[index].name} failed: {result}")
+                self.failed += len(reminders)
+                continue
+            delivered_ids = set(result)
+            delivered.extend(reminder for reminder in reminders if reminder.reservation_id in delivered_ids)
+            self.failed += len(reminders) - len(delivered_ids)
+
+        if delivered:
+            await self.progress.mark_sent(delivered)
+            self.sent += len(delivered)
+
+    async def _still_confirmed(self, batch: List[Reminder]) -> List[Reminder]:
+        """
+        Drops reminders whose reservation was discarded or changed since the
+        schedule was loaded, in one query. Status changes made through the API
+        process never reach on_reservation_changed in the worker.
+        """
+        try:
+            rows = await supabase_get("reservations", params={
+                "select": "id",
+                "id": f"in.({','.join(str(reminder.reservation_id) for reminder in batch)})",
+                "status": "eq.confirmed",
+            })
+        except Exception as e:
+            # Left to the next refresh, which schedules them again if still due
+            logger.error(f"Could not recheck {len(batch)} reminders before sending: {e}")
+            self.failed += len(batch)
+            return []
+        confirmed = {row["id"] for row in rows}
+        still_confirmed = [reminder for reminder in batch if reminder.reservation_id in confirmed]
+        self.cancelled += len(batch) - len(still_confirmed)
+        return still_confirmed
+
+    async def _load_lead_time(self) -> timedelta:
+        # system_settings.reminder_hours_before overrides the configured default
+        try:
+            rows = await supabase_get("system_settings", params={
+                "select": "setting_value",
+                "setting_key": "eq.reminder_hours_before",
+            })
+            if rows and rows[0].get("setting_value"):
+                return timedelta(hours=float(rows[0]["setting_value"]))
+        except Exception as e:
+            logger.warning(f"Could not load reminder_hours_before from system_settings: {e}")
+        return timedelta(hours=settings.reminder_hours_before)
+
+    async def _load_reservations(self, start: datetime, end: datetime) -> List[Dict[str, Any]]:
+        rows: List[Dict[str, Any]] = []
+        last_id = 0
+        while True:
+            page = await supabase_get("reservations", params={
+                "select": REMINDER_COLUMNS,
+                "status": "eq.confirmed",
+                "and": f"(reservation_date.gte.{start.date().isoformat()},reservation_date.lte.{end.date().isoformat()})",
+                "id": f"gt.{last_id}",
+                "order": "id.asc",
+                "limit": str(settings.reminder_page_size),
+            })
+            rows.extend(page)
+            if len(page) < settings.reminder_page_size:
+                return rows
+            last_id = page[-1]["id"]
+
+    async def _load_restaurant_names(self, restaurant_ids: Set[str]) -> Dict[str, str]:
+        if not restaurant_ids:
+            return {}
+        rows = await supabase_get("restaurants", params={
+            "select": "id,name",
+            "id": f"in.({','.join(sorted(restaurant_ids))})",
+        })
+        return {row["id"]: row["name"] for row in rows}
+
+    def _to_reminder(self, row: Dict[str, Any], restaurant_name: str) -> Reminder:
+        starts_at = datetime.fromisoformat(f"{row['reservation_date']}T{row['reservation_time']}")
+        return Reminder(
+            reservation_id=row["id"],
+            contact=(row.get("client_contact") or "").strip(),
+            client_name=row.get("client_name") or "",
+            restaurant_name=restaurant_name,
+            starts_at=starts_at,
+            party_size=booking_party_size(row),
+            fire_at=starts_at - self._lead,
+        )
+
+    def _notify(self):
+        if self._changed is not None:
+            self._changed.set()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._running,
+            "scheduled": len(self._pending),
+            "lead_hours": self._lead.total_seconds() / 3600,
+            "sent": self.sent,
+            "failed": self.failed,
+            "unroutable": self.unroutable,
+            "cancelled": self.cancelled,
+            "batches": self.batches,
+        }
+
+
+def create_reminder_channels() -> List[ReminderChannel]:
+    """
+    Builds the channels listed in REMINDER_CHANNELS, in priority order.
+    """
+    channels: List[ReminderChannel] = []
+    for name in settings.reminder_channels:
+        if name == "telegram":
+            channels.append(TelegramReminderChannel())
+        elif name == "email":
+            if not settings.smtp_host:
+                logger.warning("Email reminders need SMTP_HOST; skipping the email channel")
+                continue
+            channels.append(EmailReminderChannel(
+                host=settings.smtp_host,
+                port=settings.smtp_port,
+                username=settings.smtp_username,
+                password=settings.smtp_password,
+                sender=settings.smtp_sender,
+                use_tls=settings.smtp_use_tls,
+            ))
+        elif name == "file":
+            channels.append(FileReminderChannel(settings.reminder_file_path))
+        else:
+            logger.warning(f"Unknown reminder channel: {name}")
+    return channels
+
+
+# Singleton instance for use in app
+reminder_engine = ReminderEngine(create_reminder_channels(), ReminderProgress(settings.reminder_state_path))
@@ -1,29 +1,88 @@
 import logging
-from typing import List, Dict, Any, Optional 
-from datetime import datetime
-from app.supabase_client import supabase_get, supabase_post
+import uuid
+from typing import List, Dict, Any, Iterable, Optional, Tuple, Union
+from datetime import date, datetime, timezone
+from app.supabase_client import SupabaseError, supabase_get, supabase_patch, supabase_patch_many, supabase_post
 from app.schemas.reservation import Reservation
+from app.services.booking import ReservationConflictError
+from app.services.rollups import rollup_writer
 
 logger = logging.getLogger(__name__)
 
 from app.schemas.reservation import ReservationCreate
 
+# Reservations in these states hold their table
+ACTIVE_STATUSES = ("pending", "confirmed")
+
+# Columns the availability checks need
+AVAILABILITY_COLUMNS = "id,table_id,reservation_date,reservation_time"
+
+
 class ReservationService:
+    async def get_restaurant_tables(
+        self,
+        restaurant_id: str,
+        min_capacity: Optional[int] = None,
+        columns: str = "id,capacity",
+    ) -> List[Dict[str, Any]]:
+        """
+        Fetches a restaurant's tables in one query, optionally only those seating
+        at least min_capacity guests. Errors propagate to the caller.
+        """
+        params = {"select": columns, "restaurant_id": f"eq.{restaurant_id}"}
+        if min_capacity is not None:
+            params["capacity"] = f"gte.{min_capacity}"
+        return await supabase_get("tables", params=params)
+
+    async def get_active_reservations(
+        self,
+        table_ids: Iterable[int],
+        first_day: date,
+        last_day: date,
+        columns: str = AVAILABILITY_COLUMNS,
+    ) -> List[Dict[str, Any]]:
+        """
+        Fetches pending and confirmed reservations on the given tables whose date
+        falls within [first_day, last_day], selecting only the given columns.
+        Errors propagate to the caller.
+        """
+        table_ids = list(table_ids)
+        if not table_ids:
+            return []
+        params = {
+            "select": columns,
+            "table_id": f"in.({','.join(map(str, table_ids))})",
+            "status": f"in.({','.join(ACTIVE_STATUSES)})",
+            "and": f"(reservation_date.gte.{first_day.isoformat()},reservation_date.lte.{last_day.isoformat()})",
+        }
+        return await supabase_get("reservations", params=params)
+
+    async def get_day_reservations(self, table_ids: Iterable[int], day: date) -> List[Dict[str, Any]]:
+        """
+        Fetches every reservation, whatever its status, on the given tables for
+        one day, ordered by time. Errors propagate to the caller.
+        """
+        table_ids = list(table_ids)
+        if not table_ids:
+            return []
+        params = {
+            "select": "*",
+            "table_id": f"in.({','.join(map(str, table_ids))})",
+            "reservation_date": f"eq.{day.isoformat()}",
+            "order": "reservation_time.asc,id.asc",
+        }
+        return await supabase_get("reservations", params=params)
+
     async def get_pending_reservations(self, restaurant_id: Optional[str] = None) -> List[Reservation]:
         """
         Fetches all pending reservations from the database, optionally filtered by restaurant.
         """
         try:
-            params = {"status": "eq.pending", "reminder_sent": "is.false", "select": "*,reservation_date"}
+            params = {"status": "eq.pending", "reminder_sent": "is.false", "select": "*"}
             if restaurant_id:
-                tables_params = {"restaurant_id": f"eq.{restaurant_id}"}
-                tables_data = await supabase_get("tables", params=tables_params)
-                table_ids = [table["id"] for table in tables_data]
-
-                if not table_ids:
-                    return []
-
-                params["table_id"] = f"in.({','.join(map(str, table_ids))})"
+                # Filter on the embedded table so this stays a single round trip
+                params["select"] = "*,tables!inner(restaurant_id)"
+                params["tables.restaurant_id"] = f"eq.{restaurant_id}"
 
             pending_reservations_data = await supabase_get("reservations", params=params)
             
@@ -35,25 +94,143 @@ class ReservationService:
             logger.error(f"Error fetching pending reservations: {e}", exc_info=True)
             return []
 
+    async def get_unnotified_reservations(self, limit: Optional[int] = None) -> List[Tuple[Reservation, str]]:
+        """
+        Fetches pending reservations whose admins haven't been notified yet, together
+        with the restaurant id of their table, in a single query.
+        Errors propagate to the caller.
+        """
+        params = {
+            "select": "*,tables!inner(restaurant_id)",
+            "status": "eq.pending",
+            "reminder_sent": "is.false",
+            "order": "id.asc",
+        }
+        if limit:
+            params["limit"] = str(limit)
+        rows = await supabase_get("reservations", params=params)
+        return [(Reservation(**row), row["tables"]["restaurant_id"]) for row in rows]
+
+    async def mark_notified(self, reservation_ids: Iterable[int]):
+        """
+        Sets reminder_sent on all given reservations with one bulk update.
+        """
+        await supabase_patch_many("reservations", reservation_ids, {"reminder_sent": True})
+
     async def create_reservation(self, reservation_data: ReservationCreate) -> Optional[Reservation]:
         """
         Creates a new reservation in the database.
+        Raises ReservationConflictError when the slot was taken concurrently.
         """
         try:
-            data_to_insert = reservation_data.model_dump()
+            data_to_insert = reservation_data.model_dump(mode="json")
             data_to_insert["status"] = "pending"
             data_to_insert["reminder_sent"] = False
             
             created_reservation = await supabase_post("reservations", data=data_to_insert)
 
             if created_reservation:
+                rollup_writer.record_change(None, created_reservation[0])
                 return Reservation(**created_reservation[0])
             
             return None
 
+        except SupabaseError as e:
+            if e.status_code == 409:
+                raise ReservationConflictError(str(e)) from e
+            logger.error(f"Error creating reservation: {e}", exc_info=True)
+            return None
         except Exception as e:
             logger.error(f"Error creating reservation: {e}", exc_info=True)
             return None
 
+    async def create_joined_reservations(
+        self,
+        reservation_data: ReservationCreate,
+        seats: List[Tuple[int, int]],
+    ) -> List[Reservation]:
+        """
+        Books one party on several joined tables: one reservation per
+        (table_id, guests) seat, inserted in a single request so either all
+        of them are created or none is. The rows share a booking_group_id; the
+        first seat's row is the group's lead and carries the whole party in
+        group_party_size. Only the lead is notified (the others are created
+        as already notified) and counted in the rollups.
+        Raises ReservationConflictError when any of the slots was taken concurrently.
+        Returns the created reservations, lead first.
+        """
+        group_id = str(uuid.uuid4())
+        rows = []
+        for position, (table_id, guests) in enumerate(seats):
+            row = reservation_data.model_dump(mode="json")
+            row.update(
+                table_id=table_id,
+                party_size=guests,
+                status="pending",
+                reminder_sent=position > 0,
+                booking_group_id=group_id,
+                group_party_size=reservation_data.party_size if position == 0 else None,
+            )
+            rows.append(row)
+        try:
+            created = await supabase_post("reservations", data=rows)
+        except SupabaseError as e:
+            if e.status_code == 409:
+                raise ReservationConflictError(str(e)) from e
+            raise
+        created.sort(key=lambda row: not row.get("group_party_size"))
+        for row in created:
+            rollup_writer.record_change(None, row)
+        return [Reservation(**row) for row in created]
+
+    async def transition_status(
+        self,
+        reservation_id: int,
+        new_status: str,
+        restaurant_id: str,
+        expected_status: str = "pending",
+        admin_id: Optional[Union[int, str]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Moves a reservation to new_status only if it is still in expected_status,
+        in a single conditional write. Confirmations also record who confirmed
+        and when. A party seated on joined tables moves as one: the rest of its
+        group follows with a second conditional write. Only reservations on
+        restaurant_id's tables are updated, and the change is attributed to it
+        in the rollups when the rows do not carry it.
+        Returns the updated rows (the reservation first), or an empty list if
+        another update won or the reservation is not the restaurant's.
+        Errors propagate to the caller.
+        """
+        data: Dict[str, Any] = {"status": new_status}
+        if new_status == "confirmed":
+            data["confirmed_at"] = datetime.now(timezone.utc).isoformat()
+            if admin_id is not None:
+                data["confirmed_by"] = admin_id
+
+        tables = await self.get_restaurant_tables(restaurant_id, columns="id")
+        if not tables:
+            return []
+        filters = {
+            "status": f"eq.{expected_status}",
+            "table_id": f"in.({','.join(str(table['id']) for table in tables)})",
+        }
+
+        updated = await supabase_patch("reservations", row_id=reservation_id, data=data, filters=filters)
+        if not updated:
+            return []
+        group_id = updated[0].get("booking_group_id")
+        if group_id:
+            updated += await supabase_patch(
+                "reservations",
+                row_id=group_id,
+                data=data,
+                id_column="booking_group_id",
+                filters=filters,
+            )
+        for row in updated:
+            rollup_writer.record_change({**row, "status": expected_status}, row, restaurant_id)
+        return updated
+
 # Singleton instance for use in app
 reservation_service = ReservationService()
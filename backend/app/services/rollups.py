@@ -0,0 +1,239 @@
+"""Per-restaurant daily and hourly reservation counters, maintained on write"""
+
+import asyncio
+import logging
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.core.metrics import TimingStats
+from app.services.booking import booking_party_size, is_group_member
+from app.supabase_client import supabase_get, supabase_rpc
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_TABLE = "reservation_rollups"
+INCREMENT_FUNCTION = "increment_reservation_rollups"
+REPLACE_FUNCTION = "replace_reservation_rollups"
+
+# Statuses counted as seated for the peak-hours figures
+SEATED_STATUSES = ("confirmed", "completed")
+
+# (restaurant_id, day, hour, status)
+RollupKey = Tuple[str, str, int, str]
+
+
+def rollup_key(reservation: Dict[str, Any], restaurant_id: Optional[str] = None) -> Optional[RollupKey]:
+    """
+    The counter a reservation row contributes to, or None if the row lacks
+    the fields to place it. restaurant_id is used when the row has none.
+    """
+    try:
+        return (
+            str(reservation.get("restaurant_id") or restaurant_id or reservation["restaurant_id"]),
+            str(reservation["reservation_date"])[:10],
+            int(str(reservation["reservation_time"])[:2]),
+            str(reservation["status"]),
+        )
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class RollupWriter:
+    """
+    Buffers counter deltas from reservation writes and flushes them every
+    flush_interval seconds (or once max_keys counters are pending) with one
+    increment_reservation_rollups call, which applies them atomically in
+    Postgres so several API processes can flush concurrently.
+
+    Deltas still buffered when a process dies are lost; the rebuild command
+    (python -m app.rebuild_rollups) recomputes rollups from raw history.
+    """
+
+    def __init__(self, flush_interval: float = 5.0, max_keys: int = 1000, enabled: bool = True):
+        self.enabled = enabled
+        self.flush_interval = flush_interval
+        self.max_keys = max_keys
+        self._pending: Dict[RollupKey, List[int]] = {}
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self.recorded = 0
+        self.flushed = 0
+        self.failures = 0
+        self.flush_time = TimingStats()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def record_change(
+        self,
+        before: Optional[Dict[str, Any]],
+        after: Optional[Dict[str, Any]],
+        restaurant_id: Optional[str] = None,
+    ):
+        """
+        Records a reservation write: before is the row as it was (None for a
+        new reservation), after the row as it is now (None once deleted).
+        restaurant_id places rows that do not carry their own. A party seated
+        on joined tables counts once, through its lead row.
+        """
+        if not self.enabled:
+            return
+        for row, sign in ((before, -1), (after, 1)):
+            if row is None or is_group_member(row):
+                continue
+            key = rollup_key(row, restaurant_id)
+            if key is None:
+                logger.warning(f"Cannot roll up reservation {row.get('id')}: missing restaurant, date, time or status")
+                continue
+            counter = self._pending.setdefault(key, [0, 0])
+            counter[0] += sign
+            counter[1] += sign * int(booking_party_size(row))
+        self.recorded += 1
+        if self._wake is not None and len(self._pending) >= self.max_keys:
+            self._wake.set()
+
+    def start(self):
+        if self.running or not self.enabled:
+            return
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._flush_loop(), name="rollup-writer")
+
+    async def stop(self):
+        """
+        Stops the flush loop and flushes whatever is still buffered.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    async def flush(self):
+        """
+        Sends all buffered deltas. On failure they are merged back for the next flush.
+        """
+        async with self._lock:
+            pending, self._pending = self._pending, {}
+            deltas = [
+                {"restaurant_id": key[0], "day": key[1], "hour": key[2], "status": key[3], "reservations": count, "guests": guests}
+                for key, (count, guests) in pending.items()
+                if count or guests
+            ]
+            if not deltas:
+                return
+            started = asyncio.get_running_loop().time()
+            try:
+                await supabase_rpc(INCREMENT_FUNCTION, {"deltas": deltas}, writes=[ROLLUP_TABLE])
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"Failed to flush {len(deltas)} reservation rollups: {e}")
+                for key, (count, guests) in pending.items():
+                    counter = self._pending.setdefault(key, [0, 0])
+                    counter[0] += count
+                    counter[1] += guests
+                return
+            finally:
+                self.flush_time.observe(asyncio.get_running_loop().time() - started)
+            self.flushed += len(deltas)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "pending": len(self._pending),
+            "recorded": self.recorded,
+            "flushed": self.flushed,
+            "failures": self.failures,
+            "flush_time": self.flush_time.stats(),
+        }
+
+
+async def get_rollups(restaurant_id: str, first_day: date, last_day: date) -> List[Dict[str, Any]]:
+    """
+    Reads a restaurant's counters for a date range: at most one row per day,
+    hour and status.
+    """
+    return await supabase_get(ROLLUP_TABLE, params={
+        "select": "day,hour,status,reservations,guests",
+        "restaurant_id": f"eq.{restaurant_id}",
+        "and": f"(day.gte.{first_day.isoformat()},day.lte.{last_day.isoformat()})",
+        "order": "day.asc,hour.asc",
+    })
+
+
+def summarize_rollups(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Folds rollup rows into daily totals (the reservation_analytics view) and
+    seated reservations per hour (the peak_hours_analytics view).
+    """
+    daily: Dict[str, Dict[str, int]] = {}
+    hourly = [[0, 0] for _ in range(24)]
+    for row in rows:
+        day = daily.setdefault(str(row["day"]), {"total": 0, "guests": 0})
+        day["total"] += row["reservations"]
+        day["guests"] += row["guests"]
+        day[row["status"]] = day.get(row["status"], 0) + row["reservations"]
+        day[f"{row['status']}_guests"] = day.get(f"{row['status']}_guests", 0) + row["guests"]
+        if row["status"] in SEATED_STATUSES:
+            hourly[row["hour"]][0] += row["reservations"]
+            hourly[row["hour"]][1] += row["guests"]
+
+    return {
+        "daily": [
+            {
+                "date": day,
+                "total_reservations": counts["total"],
+                "confirmed_reservations": counts.get("confirmed", 0),
+                "discarded_reservations": counts.get("discarded", 0),
+                "no_shows": counts.get("no_show", 0),
+                "completed_reservations": counts.get("completed", 0),
+                "avg_party_size": round(counts["guests"] / counts["total"], 2) if counts["total"] else 0.0,
+                "total_confirmed_guests": counts.get("confirmed_guests", 0),
+            }
+            for day, counts in sorted(daily.items())
+            if counts["total"]
+        ],
+        "hourly": [
+            {
+                "hour": hour,
+                "reservation_count": count,
+                "avg_party_size": round(guests / count, 2) if count else 0.0,
+            }
+            for hour, (count, guests) in enumerate(hourly)
+            if count
+        ],
+    }
+
+
+async def replace_rollups(restaurant_id: str, first_day: date, last_day: date, rows: List[Dict[str, Any]]):
+    """
+    Atomically replaces a restaurant's counters in [first_day, last_day] with rows.
+    """
+    await supabase_rpc(
+        REPLACE_FUNCTION,
+        {
+            "p_restaurant_id": restaurant_id,
+            "p_first_day": first_day.isoformat(),
+            "p_last_day": last_day.isoformat(),
+            "p_rows": rows,
+        },
+        writes=[ROLLUP_TABLE],
+    )
+
+
+# Singleton instance for use in app
+rollup_writer = RollupWriter(
+    flush_interval=settings.rollup_flush_interval,
+    max_keys=settings.rollup_max_pending,
+    enabled=settings.rollups_enabled,
+)
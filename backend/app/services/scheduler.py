@@ -0,0 +1,179 @@
+"""Event-driven scheduler for the periodic background jobs"""
+
+import asyncio
+import heapq
+import logging
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from app.core.metrics import TimingStats
+
+logger = logging.getLogger(__name__)
+
+
+class ScheduledJob:
+    def __init__(self, name: str, func: Callable[[], Awaitable[Any]], interval: float, jitter: float):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.jitter = jitter
+        self.next_run: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+        self.rerun = False
+        self.runs = 0
+        self.failures = 0
+        self.wakeups = 0
+        self.coalesced = 0
+        self.timing = TimingStats()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "interval": self.interval,
+            "running": self.task is not None,
+            "runs": self.runs,
+            "failures": self.failures,
+            "wakeups": self.wakeups,
+            "coalesced": self.coalesced,
+            "duration": self.timing.stats(),
+        }
+
+
+class Scheduler:
+    """
+    Runs jobs from a heap of due times. Each job repeats on its interval (with
+    jitter so replicas don't sweep in lockstep) and can be woken early by
+    writers, so new work is handled right away while the interval only acts
+    as a reconciliation sweep.
+
+    A job never overlaps itself: a wake or due time while it's running is
+    coalesced into a single rerun once the current run finishes.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self._jobs: Dict[str, ScheduledJob] = {}
+        self._heap: List[Tuple[float, int, str]] = []
+        self._seq = 0
+        self._changed: Optional[asyncio.Event] = None
+        self._running = False
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def add_job(
+        self,
+        name: str,
+        func: Callable[[], Awaitable[Any]],
+        interval: float,
+        jitter: float = 0.1,
+        run_immediately: bool = True,
+    ):
+        """
+        Registers (or replaces) a job. jitter is the fraction of the interval
+        by which each sweep may be moved earlier or later.
+        """
+        job = ScheduledJob(name, func, interval, jitter)
+        self._jobs[name] = job
+        self._schedule(job, 0 if run_immediately else self._next_interval(job))
+
+    def wake(self, name: str, delay: float = 0.0) -> bool:
+        """
+        Asks for a job to run within delay seconds. Wakes arriving within the
+        same delay are served by one run. Returns False if the job isn't
+        scheduled in this process, so callers can fall back.
+        """
+        job = self._jobs.get(name)
+        if not self._running or job is None:
+            return False
+        job.wakeups += 1
+        if job.task is not None:
+            job.rerun = True
+            return True
+        due = self._clock() + delay
+        if job.next_run is None or due < job.next_run:
+            self._schedule(job, delay)
+        return True
+
+    async def run(self):
+        """
+        Runs due jobs until cancelled, then cancels any job still in flight.
+        """
+        self._changed = asyncio.Event()
+        self._running = True
+        try:
+            while True:
+                self._changed.clear()
+                timeout = self._run_due_jobs()
+                try:
+                    await asyncio.wait_for(self._changed.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._running = False
+            tasks = [job.task for job in self._jobs.values() if job.task is not None]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _run_due_jobs(self) -> Optional[float]:
+        """
+        Starts every job that is due and returns the seconds until the next one.
+        """
+        while self._heap:
+            due, _, name = self._heap[0]
+            job = self._jobs.get(name)
+            if job is None or job.next_run != due:
+                # Superseded by a later add_job or an earlier wake
+                heapq.heappop(self._heap)
+                continue
+            wait = due - self._clock()
+            if wait > 0:
+                return wait
+            heapq.heappop(self._heap)
+            job.next_run = None
+            if job.task is not None:
+                job.rerun = True
+                job.coalesced += 1
+                continue
+            job.task = asyncio.create_task(self._execute(job), name=f"scheduled-{name}")
+        return None
+
+    async def _execute(self, job: ScheduledJob):
+        started = self._clock()
+        try:
+            await job.func()
+            job.runs += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            job.failures += 1
+            logger.error(f"Scheduled job {job.name} failed: {e}", exc_info=True)
+        finally:
+            job.timing.observe(self._clock() - started)
+            job.task = None
+        if job.rerun:
+            job.rerun = False
+            self._schedule(job, 0)
+        elif job.next_run is None:
+            self._schedule(job, self._next_interval(job))
+
+    def _next_interval(self, job: ScheduledJob) -> float:
+        return job.interval * (1 + random.uniform(-job.jitter, job.jitter))
+
+    def _schedule(self, job: ScheduledJob, delay: float):
+        job.next_run = self._clock() + delay
+        self._seq += 1
+        heapq.heappush(self._heap, (job.next_run, self._seq, job.name))
+        if self._changed is not None:
+            self._changed.set()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._running,
+            "jobs": {name: job.stats() for name, job in self._jobs.items()},
+        }
+
+
+# Singleton instance for use in app
+scheduler = Scheduler()
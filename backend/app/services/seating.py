@@ -0,0 +1,167 @@
+"""Seats parties too large for any single table on sets of adjacent tables"""
+
+import logging
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.services.table_names import parse_table_number
+
+logger = logging.getLogger(__name__)
+
+Adjacency = Dict[Any, Set[Any]]
+
+
+def build_adjacency(tables: Sequence[Dict[str, Any]], floor_plan: Optional[Dict[str, List[str]]] = None) -> Adjacency:
+    """
+    Which tables can be pushed together.
+
+    With a floor plan (table name -> names of its neighbours) exactly those
+    pairs are adjacent, in both directions. Without one, tables in the same
+    location stand in a row in table-number order, each next to the one
+    before and after it.
+    """
+    adjacency: Adjacency = {table["id"]: set() for table in tables}
+    if floor_plan:
+        by_name = {str(table.get("name")): table["id"] for table in tables}
+        for name, neighbours in floor_plan.items():
+            for neighbour in neighbours:
+                a, b = by_name.get(name), by_name.get(neighbour)
+                if a is not None and b is not None and a != b:
+                    adjacency[a].add(b)
+                    adjacency[b].add(a)
+        return adjacency
+
+    rows: Dict[Any, List[Dict[str, Any]]] = {}
+    for table in tables:
+        rows.setdefault(table.get("location"), []).append(table)
+    for row in rows.values():
+        row.sort(key=lambda table: (parse_table_number(table.get("name")) or 0, str(table.get("name")), table["id"]))
+        for left, right in zip(row, row[1:]):
+            adjacency[left["id"]].add(right["id"])
+            adjacency[right["id"]].add(left["id"])
+    return adjacency
+
+
+class SeatingPlan:
+    """
+    Every connected set of two to max_tables tables in a floor plan, with
+    its combined capacity, precomputed once and sorted by (capacity, number
+    of tables).
+
+    Sets are bitmasks over the tables, so checking one against the free
+    tables at a time is a single AND. Finding a seating is a binary search
+    to the first set large enough followed by a scan for the first fully
+    free one, which by the sort order wastes the fewest seats and, among
+    equals, joins the fewest tables.
+    """
+
+    def __init__(self, tables: Sequence[Dict[str, Any]], adjacency: Adjacency, max_tables: int = 4, max_sets: int = 50000):
+        self.table_ids = [table["id"] for table in tables]
+        self._bits = {table_id: 1 << position for position, table_id in enumerate(self.table_ids)}
+        capacities = [table.get("capacity") or 0 for table in tables]
+        neighbours = [
+            sum(self._bits[other] for other in adjacency.get(table_id, ()) if other in self._bits)
+            for table_id in self.table_ids
+        ]
+
+        sets: Dict[int, int] = {}
+        frontier = [1 << position for position in range(len(self.table_ids))]
+        for size in range(2, max_tables + 1):
+            grown: Dict[int, int] = {}
+            for mask in frontier:
+                reachable = 0
+                for position in _positions(mask):
+                    reachable |= neighbours[position]
+                reachable &= ~mask
+                for position in _positions(reachable):
+                    grown.setdefault(mask | (1 << position), size)
+            if len(sets) + len(grown) > max_sets:
+                logger.warning(f"Seating plan stops at {size - 1} tables per party: {len(sets) + len(grown)} sets exceed {max_sets}")
+                break
+            sets.update(grown)
+            frontier = list(grown)
+
+        self._sets = sorted(
+            ((sum(capacities[position] for position in _positions(mask)), size, mask) for mask, size in sets.items()),
+        )
+        self._capacities = [capacity for capacity, _, _ in self._sets]
+
+    def __len__(self) -> int:
+        return len(self._sets)
+
+    def free_mask(self, is_free: Callable[[Any], bool]) -> int:
+        mask = 0
+        for table_id, bit in self._bits.items():
+            if is_free(table_id):
+                mask |= bit
+        return mask
+
+    def seatings(self, party_size: int, free: int) -> Iterable[List[Any]]:
+        """
+        Yields the free connected table sets that seat the party, least
+        wasted seats first.
+        """
+        busy = ~free
+        for capacity, size, mask in self._sets[bisect_left(self._capacities, party_size):]:
+            # Every joined table needs at least one guest
+            if size <= party_size and not mask & busy:
+                yield [self.table_ids[position] for position in _positions(mask)]
+
+    def best(self, party_size: int, free: int) -> Optional[List[Any]]:
+        return next(iter(self.seatings(party_size, free)), None)
+
+
+def _positions(mask: int) -> Iterable[int]:
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def split_party(party_size: int, capacities: Sequence[int]) -> List[int]:
+    """
+    Spreads a party over joined tables: one guest each, then the rest filling
+    the largest tables first. Returns the guests per table, in order.
+    """
+    guests = [1] * len(capacities)
+    remaining = party_size - len(capacities)
+    for position in sorted(range(len(capacities)), key=lambda p: -capacities[p]):
+        extra = min(remaining, capacities[position] - 1)
+        guests[position] += extra
+        remaining -= extra
+    return guests
+
+
+class SeatingPlanner:
+    """
+    Caches a SeatingPlan per restaurant floor plan. Plans are keyed by the
+    tables' ids, names, capacities and locations, so any change to the floor
+    plan builds a new one and unchanged restaurants reuse theirs.
+    """
+
+    def __init__(self, max_tables: int = 4, max_sets: int = 50000, max_entries: int = 256):
+        self.max_tables = max_tables
+        self.max_sets = max_sets
+        self._plans = TTLCache(max_entries=max_entries)
+        self.builds = 0
+
+    def plan(self, restaurant_id: str, tables: Sequence[Dict[str, Any]]) -> SeatingPlan:
+        floor_plan = settings.seating_floor_plans.get(str(restaurant_id))
+        key = (
+            str(restaurant_id),
+            tuple(sorted((t["id"], str(t.get("name")), t.get("capacity") or 0, t.get("location")) for t in tables)),
+        )
+        plan = self._plans.get(key)
+        if plan is None:
+            plan = SeatingPlan(tables, build_adjacency(tables, floor_plan), self.max_tables, self.max_sets)
+            self._plans.set(key, plan, settings.seating_plan_ttl)
+            self.builds += 1
+        return plan
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._plans.stats(), "builds": self.builds}
+
+
+# Singleton instance for use in app
+seating_planner = SeatingPlanner(max_tables=settings.seating_max_tables, max_sets=settings.seating_max_sets)
@@ -0,0 +1,291 @@
+"""Joined table groups (T1+T2+T3) per restaurant, kept in a cached union-find index"""
+
+import asyncio
+import logging
+from typing import Any, Dict, Iterable, List, Tuple
+from app.core.cache import SingleFlight, TTLCache
+from app.core.config import settings
+from app.services.table_names import parse_table_number
+from app.supabase_client import supabase_get, supabase_patch_many
+
+logger = logging.getLogger(__name__)
+
+
+class TableGroupError(Exception):
+    """Raised when a join or unjoin cannot be applied; status_code is the HTTP status to answer with."""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class UnionFind:
+    """
+    Disjoint sets of table ids with path compression and union by size.
+    Each root also carries its members and their combined capacity, so a
+    group's unit is read off its root without scanning other tables.
+    """
+
+    def __init__(self):
+        self._parent: Dict[Any, Any] = {}
+        self.members: Dict[Any, List[Any]] = {}
+        self.capacity: Dict[Any, int] = {}
+
+    def add(self, item: Any, capacity: int = 0):
+        self._parent[item] = item
+        self.members[item] = [item]
+        self.capacity[item] = capacity
+
+    def find(self, item: Any) -> Any:
+        root = item
+        while self._parent[root] != root:
+            root = self._parent[root]
+        while self._parent[item] != root:
+            self._parent[item], item = root, self._parent[item]
+        return root
+
+    def union(self, a: Any, b: Any) -> Any:
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a == root_b:
+            return root_a
+        if len(self.members[root_a]) < len(self.members[root_b]):
+            root_a, root_b = root_b, root_a
+        self._parent[root_b] = root_a
+        self.members[root_a].extend(self.members.pop(root_b))
+        self.capacity[root_a] += self.capacity.pop(root_b)
+        return root_a
+
+    def roots(self) -> Iterable[Any]:
+        return self.members.keys()
+
+
+def _name_key(table: Dict[str, Any]) -> Tuple[int, str]:
+    number = parse_table_number(table.get("name"))
+    return (number if number is not None else 1 << 30, str(table.get("name")))
+
+
+def group_id_for(tables: Iterable[Dict[str, Any]]) -> str:
+    """
+    The joined_group_id of a set of tables: their names in table-number
+    order, e.g. "T1-T2-T3".
+    """
+    return "-".join(str(table["name"]) for table in sorted(tables, key=_name_key))
+
+
+class RestaurantTableIndex:
+    """
+    One restaurant's tables with their joined groups as a union-find.
+    """
+
+    def __init__(self, restaurant_id: str, tables: List[Dict[str, Any]]):
+        self.restaurant_id = restaurant_id
+        self.tables: Dict[Any, Dict[str, Any]] = {table["id"]: table for table in tables}
+        self._rebuild()
+
+    def _rebuild(self):
+        self.groups = UnionFind()
+        self.by_name: Dict[str, Any] = {}
+        first_of_group: Dict[str, Any] = {}
+        for table_id, table in self.tables.items():
+            self.groups.add(table_id, table.get("capacity") or 0)
+            self.by_name[str(table.get("name"))] = table_id
+            group_id = table.get("joined_group_id") if table.get("is_joined") else None
+            if group_id:
+                if group_id in first_of_group:
+                    self.groups.union(first_of_group[group_id], table_id)
+                else:
+                    first_of_group[group_id] = table_id
+
+    def resolve(self, names: Iterable[str]) -> List[Any]:
+        """
+        Table ids for names, in order and without duplicates.
+        Raises TableGroupError (404) naming any table that does not exist.
+        """
+        ids, missing = [], []
+        for name in names:
+            table_id = self.by_name.get(name)
+            if table_id is None:
+                missing.append(name)
+            elif table_id not in ids:
+                ids.append(table_id)
+        if missing:
+            raise TableGroupError(f"Tables not found: {', '.join(missing)}", status_code=404)
+        return ids
+
+    def group_members(self, group_id: str) -> List[Any]:
+        for root in self.groups.roots():
+            members = self.groups.members[root]
+            if len(members) > 1 and self.tables[members[0]].get("joined_group_id") == group_id:
+                return list(members)
+        return []
+
+    def _merge(self, rows: Iterable[Dict[str, Any]]):
+        for row in rows:
+            self.tables[row["id"]] = {**self.tables.get(row["id"], {}), **row}
+
+    def apply_tables(self, rows: List[Dict[str, Any]]):
+        self._merge(rows)
+        self._rebuild()
+
+    def remove_table(self, table_id: Any):
+        if self.tables.pop(table_id, None) is not None:
+            self._rebuild()
+
+    def apply_join(self, table_ids: List[Any], rows: List[Dict[str, Any]]):
+        """
+        Merges the groups of freshly joined tables without rebuilding the index.
+        """
+        self._merge(rows)
+        for table_id in table_ids[1:]:
+            self.groups.union(table_ids[0], table_id)
+
+    def unit(self, root: Any) -> Dict[str, Any]:
+        """
+        A root's listing entry: the table itself, or a JoinedTableResponse
+        for a group.
+        """
+        members = sorted((self.tables[table_id] for table_id in self.groups.members[root]), key=_name_key)
+        if len(members) == 1:
+            return members[0]
+        statuses = [table.get("status") or "available" for table in members]
+        locations = {table.get("location") for table in members}
+        return {
+            "id": members[0].get("joined_group_id") or group_id_for(members),
+            "number": "+".join(str(table["name"]) for table in members),
+            "capacity": self.groups.capacity[root],
+            # A group is only as available as its least available table
+            "status": next((status for status in statuses if status != "available"), "available"),
+            "is_joined": True,
+            "joined_tables": [str(table["name"]) for table in members],
+            "location": locations.pop() if len(locations) == 1 else None,
+            # Tables are stamped when joined, so the latest update is the join time
+            "created_at": max(table.get("updated_at") or table.get("created_at") for table in members),
+        }
+
+    def listing(self) -> Dict[str, Any]:
+        units = [self.unit(root) for root in self.groups.roots()]
+        units.sort(key=lambda unit: _name_key({"name": unit.get("joined_tables", [unit.get("name")])[0]}))
+        joined = sum(1 for unit in units if unit.get("joined_tables"))
+        return {
+            "tables": units,
+            "total": len(units),
+            "individual_tables": len(units) - joined,
+            "joined_groups": joined,
+        }
+
+
+class TableGroupIndex:
+    """
+    Caches a RestaurantTableIndex per restaurant, built from one tables query
+    and patched in place by table writes made in this process; the TTL
+    bounds staleness from other processes. Joins and unjoins of a restaurant
+    are serialized and persisted with one bulk PATCH each.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self._entries = TTLCache(max_entries=max_entries)
+        self._builds = SingleFlight()
+        self._locks: Dict[str, asyncio.Lock] = {}
+        # Bumped on every patch so a build that raced a write is not cached
+        self._generation = 0
+        self.joins = 0
+        self.unjoins = 0
+
+    async def get(self, restaurant_id: str) -> RestaurantTableIndex:
+        index = self._entries.get(restaurant_id)
+        if index is not None:
+            return index
+        generation = self._generation
+        index = await self._builds.do(restaurant_id, lambda: self._build(restaurant_id))
+        if generation == self._generation:
+            self._entries.set(restaurant_id, index, settings.table_groups_cache_ttl)
+        return index
+
+    async def _build(self, restaurant_id: str) -> RestaurantTableIndex:
+        tables = await supabase_get("tables", params={"select": "*", "restaurant_id": f"eq.{restaurant_id}"})
+        return RestaurantTableIndex(restaurant_id, tables)
+
+    def _lock(self, restaurant_id: str) -> asyncio.Lock:
+        lock = self._locks.get(restaurant_id)
+        if lock is None:
+            lock = self._locks[restaurant_id] = asyncio.Lock()
+        return lock
+
+    async def join(self, restaurant_id: str, table_names: List[str]) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+        """
+        Joins the named tables, and any groups they already belong to, into
+        one group. Returns the joined unit and the updated table rows.
+        """
+        async with self._lock(restaurant_id):
+            index = await self.get(restaurant_id)
+            table_ids = index.resolve(table_names)
+            roots = {index.groups.find(table_id) for table_id in table_ids}
+            if len(roots) < 2:
+                raise TableGroupError("Tables are already joined" if len(table_ids) > 1 else "At least two tables are required to join")
+
+            member_ids = [table_id for root in roots for table_id in index.groups.members[root]]
+            group_id = group_id_for(index.tables[table_id] for table_id in member_ids)
+            rows = await supabase_patch_many("tables", member_ids, {"is_joined": True, "joined_group_id": group_id})
+            self._generation += 1
+            index.apply_join(member_ids, rows)
+            self.joins += 1
+            logger.info(f"Joined tables {group_id} in restaurant {restaurant_id}")
+            return index.unit(index.groups.find(member_ids[0])), rows
+
+    async def unjoin(self, restaurant_id: str, group_id: str) -> List[Dict[str, Any]]:
+        """
+        Splits a joined group back into individual tables and returns their rows.
+        """
+        async with self._lock(restaurant_id):
+            index = await self.get(restaurant_id)
+            member_ids = index.group_members(group_id)
+            if not member_ids:
+                raise TableGroupError(f"Joined table group {group_id} not found", status_code=404)
+
+            rows = await supabase_patch_many("tables", member_ids, {"is_joined": False, "joined_group_id": None})
+            self._generation += 1
+            index.apply_tables(rows)
+            self.unjoins += 1
+            logger.info(f"Unjoined tables {group_id} in restaurant {restaurant_id}")
+            return rows
+
+    async def release_leftover(self, restaurant_id: str, group_id: str) -> List[Dict[str, Any]]:
+        """
+        After a joined table is deleted, unjoins the last table left in its
+        group, if only one is left. Returns the updated rows.
+        """
+        async with self._lock(restaurant_id):
+            index = await self.get(restaurant_id)
+            leftover = [
+                table_id for table_id, table in index.tables.items()
+                if table.get("is_joined") and table.get("joined_group_id") == group_id
+            ]
+            if len(leftover) != 1:
+                return []
+            rows = await supabase_patch_many("tables", leftover, {"is_joined": False, "joined_group_id": None})
+            self._generation += 1
+            index.apply_tables(rows)
+            return rows
+
+    def apply_table(self, table: Dict[str, Any]):
+        """
+        Patches the cached index after a table is created or updated.
+        """
+        self._generation += 1
+        for restaurant_id, index in self._entries.items():
+            if table["id"] in index.tables and str(restaurant_id) != str(table.get("restaurant_id", restaurant_id)):
+                index.remove_table(table["id"])
+            elif table["id"] in index.tables or str(restaurant_id) == str(table.get("restaurant_id")):
+                index.apply_tables([table])
+
+    def remove_table(self, table_id: Any):
+        self._generation += 1
+        for _, index in self._entries.items():
+            index.remove_table(table_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._entries.stats(), "joins": self.joins, "unjoins": self.unjoins}
+
+
+# Singleton instance for use in app
+table_groups = TableGroupIndex(max_entries=settings.table_groups_cache_max_entries)
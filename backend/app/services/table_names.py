@@ -0,0 +1,20 @@
+"""Auto-style table names (T1, T2, ...), free of database dependencies"""
+
+import re
+from typing import Optional
+
+TABLE_NAME_PREFIX = "T"
+_TABLE_NUMBER = re.compile(rf"^{TABLE_NAME_PREFIX}(\d+)$")
+
+
+def parse_table_number(name: Optional[str]) -> Optional[int]:
+    """
+    The number in an auto-style table name ("T12" -> 12), or None for any
+    other name.
+    """
+    match = _TABLE_NUMBER.match(name or "")
+    return int(match.group(1)) if match else None
+
+
+def format_table_name(number: int) -> str:
+    return f"{TABLE_NAME_PREFIX}{number}"
@@ -0,0 +1,83 @@
+"""Hands out per-restaurant table numbers (T1, T2, ...) from a cached high-water mark"""
+
+import logging
+from typing import Any, Dict, Iterable, List, Optional
+from app.core.cache import SingleFlight
+from app.services.table_names import format_table_name, parse_table_number
+from app.supabase_client import invalidate_cache, supabase_get
+
+logger = logging.getLogger(__name__)
+
+
+class TableNumberAllocator:
+    """
+    Keeps the highest table number in use per restaurant, seeded once from
+    the database, and hands out the numbers after it.
+
+    Allocation takes no await between reading and advancing the mark, so
+    concurrent creates in this process never get the same number, and a bulk
+    create reserves its whole block in one step. Numbers of failed creates
+    are not reused, like a database sequence. Other processes keep their own
+    marks; a create that collides with one of their names should call
+    invalidate, which also drops cached tables responses, so the next
+    allocation reseeds from the database.
+    """
+
+    def __init__(self):
+        self._high_water: Dict[str, int] = {}
+        self._seeds = SingleFlight()
+        self.seeded = 0
+        self.allocated = 0
+
+    async def _ensure_seeded(self, restaurant_id: str):
+        if restaurant_id in self._high_water:
+            return
+        highest = await self._seeds.do(restaurant_id, lambda: self._load_highest(restaurant_id))
+        # Callers that awaited the same seed may already have allocated past it
+        self._high_water[restaurant_id] = max(highest, self._high_water.get(restaurant_id, 0))
+
+    async def _load_highest(self, restaurant_id: str) -> int:
+        rows = await supabase_get("tables", params={"select": "name", "restaurant_id": f"eq.{restaurant_id}"})
+        self.seeded += 1
+        return max((parse_table_number(row.get("name")) or 0 for row in rows if row), default=0)
+
+    async def allocate(self, restaurant_id: str, count: int = 1, taken: Iterable[Optional[str]] = ()) -> List[str]:
+        """
+        Reserves the next count table names for a restaurant, after any
+        auto-style names in taken (explicit names created alongside them).
+        """
+        if count <= 0:
+            return []
+        await self._ensure_seeded(restaurant_id)
+        self.observe(restaurant_id, taken)
+        first = self._high_water[restaurant_id] + 1
+        self._high_water[restaurant_id] += count
+        self.allocated += count
+        return [format_table_name(number) for number in range(first, first + count)]
+
+    def observe(self, restaurant_id: Optional[str], names: Iterable[Optional[str]]):
+        """
+        Raises a restaurant's mark past explicitly named tables (e.g. a table
+        created or renamed as "T40"), so later allocations skip them.
+        """
+        if restaurant_id is None or restaurant_id not in self._high_water:
+            return
+        highest = max((parse_table_number(name) or 0 for name in names), default=0)
+        if highest > self._high_water[restaurant_id]:
+            self._high_water[restaurant_id] = highest
+
+    def invalidate(self, restaurant_id: str):
+        self._high_water.pop(restaurant_id, None)
+        # The reseed must see the other process's table, not a cached listing
+        invalidate_cache("tables", "restaurant_id", [restaurant_id])
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "restaurants": len(self._high_water),
+            "seeded": self.seeded,
+            "allocated": self.allocated,
+        }
+
+
+# Singleton instance for use in app
+table_number_allocator = TableNumberAllocator()
@@ -0,0 +1,251 @@
+"""Rate-limited priority queue for outbound Telegram API calls"""
+
+import asyncio
+import heapq
+import logging
+import time
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from telegram.error import NetworkError, RetryAfter, TimedOut
+from app.core.metrics import TimingStats
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    """Lower values are sent first."""
+
+    EDIT = 0  # Callback answers: the admin is looking at the message
+    REPLY = 1  # Replies to bot commands
+    NOTIFICATION = 2  # New reservation notifications
+    REMINDER = 3  # Client reminders
+    DIGEST = 4  # Batched summaries
+
+
+class _Send:
+    __slots__ = ("priority", "seq", "chat_id", "call", "future", "attempts", "enqueued_at")
+
+    def __init__(self, priority: Priority, seq: int, chat_id: Any, call: Callable[[], Awaitable[Any]], future, enqueued_at: float):
+        self.priority = priority
+        self.seq = seq
+        self.chat_id = chat_id
+        self.call = call
+        self.future = future
+        self.attempts = 0
+        self.enqueued_at = enqueued_at
+
+    def __lt__(self, other: "_Send") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class _Chat:
+    __slots__ = ("queue", "next_allowed")
+
+    def __init__(self):
+        self.queue: List[_Send] = []
+        self.next_allowed = 0.0
+
+
+class TelegramSender:
+    """
+    Sends Telegram API calls within the bot limits: a global token bucket
+    (about 30 messages per second) and at most one message per chat per
+    per_chat_interval. Pending calls are served by priority, so callback edits
+    overtake notifications and notifications overtake digests.
+
+    A 429 pauses all sending for its retry_after and re-queues the call;
+    timeouts and network errors are retried up to max_retries times. Any
+    other error is raised to the caller of submit().
+    """
+
+    def __init__(
+        self,
+        global_rate: float = 30.0,
+        per_chat_interval: float = 1.0,
+        max_retries: int = 3,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.global_rate = global_rate
+        self.per_chat_interval = per_chat_interval
+        self.max_retries = max_retries
+        self._clock = clock
+        self._tokens = global_rate
+        self._refilled_at = clock()
+        self._paused_until = 0.0
+        self._chats: Dict[Any, _Chat] = {}
+        # (priority, seq, chat_id) of each chat's next send, for chats allowed to send now
+        self._ready: List[Tuple[int, int, Any]] = []
+        # (next_allowed, chat_id) for chats waiting on their per-chat limit
+        self._delayed: List[Tuple[float, Any]] = []
+        self._seq = 0
+        self._changed: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._in_flight: set = set()
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.rate_limited = 0
+        self.queue_wait = {priority.name.lower(): TimingStats() for priority in Priority}
+
+    async def submit(self, chat_id: Any, call: Callable[[], Awaitable[Any]], priority: Priority = Priority.NOTIFICATION) -> Any:
+        """
+        Queues call (a zero-argument coroutine function performing one API
+        request to chat_id) and returns its result once it has been sent.
+        """
+        self._ensure_dispatcher()
+        future = asyncio.get_running_loop().create_future()
+        self._seq += 1
+        send = _Send(priority, self._seq, chat_id, call, future, self._clock())
+        self._enqueue(send)
+        return await future
+
+    def _enqueue(self, send: _Send):
+        chat = self._chats.setdefault(send.chat_id, _Chat())
+        heapq.heappush(chat.queue, send)
+        self._mark_ready_or_delayed(send.chat_id, chat)
+        self._changed.set()
+
+    def _mark_ready_or_delayed(self, chat_id: Any, chat: _Chat):
+        top = chat.queue[0]
+        if chat.next_allowed <= self._clock():
+            heapq.heappush(self._ready, (top.priority, top.seq, chat_id))
+        else:
+            heapq.heappush(self._delayed, (chat.next_allowed, chat_id))
+
+    def _ensure_dispatcher(self):
+        if self._dispatcher is None or self._dispatcher.done():
+            self._changed = asyncio.Event()
+            self._dispatcher = asyncio.create_task(self._dispatch(), name="telegram-sender")
+
+    async def stop(self):
+        """
+        Stops dispatching and fails every call still queued.
+        """
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            await asyncio.gather(self._dispatcher, *self._in_flight, return_exceptions=True)
+            self._dispatcher = None
+        for chat in self._chats.values():
+            for send in chat.queue:
+                if not send.future.done():
+                    send.future.set_exception(RuntimeError("Telegram sender stopped"))
+        self._chats.clear()
+        self._ready.clear()
+        self._delayed.clear()
+
+    async def _dispatch(self):
+        while True:
+            self._changed.clear()
+            now = self._clock()
+            self._promote_delayed(now)
+
+            wait = self._wait_time(now)
+            if wait is None:
+                send = self._next_send()
+                if send is not None:
+                    self._take_token()
+                    task = asyncio.create_task(self._perform(send))
+                    self._in_flight.add(task)
+                    task.add_done_callback(self._in_flight.discard)
+                    continue
+                wait = self._delayed[0][0] - now if self._delayed else None
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+
+    def _promote_delayed(self, now: float):
+        while self._delayed and self._delayed[0][0] <= now:
+            _, chat_id = heapq.heappop(self._delayed)
+            chat = self._chats.get(chat_id)
+            if chat is None or chat.next_allowed > now:
+                continue
+            if chat.queue:
+                top = chat.queue[0]
+                heapq.heappush(self._ready, (top.priority, top.seq, chat_id))
+            else:
+                # Idle and past its per-chat limit, so its state can go
+                del self._chats[chat_id]
+
+    def _wait_time(self, now: float) -> Optional[float]:
+        """
+        Seconds until the global limits allow another send, or None if they do now.
+        """
+        if not self._ready:
+            return None
+        if now < self._paused_until:
+            return self._paused_until - now
+        self._tokens = min(self.global_rate, self._tokens + (now - self._refilled_at) * self.global_rate)
+        self._refilled_at = now
+        if self._tokens >= 1:
+            return None
+        return (1 - self._tokens) / self.global_rate
+
+    def _next_send(self) -> Optional[_Send]:
+        now = self._clock()
+        while self._ready:
+            _, seq, chat_id = heapq.heappop(self._ready)
+            chat = self._chats.get(chat_id)
+            # Entries go stale when a chat's queue changes or it already sent
+            if not chat or not chat.queue or chat.queue[0].seq != seq or chat.next_allowed > now:
+                continue
+            send = heapq.heappop(chat.queue)
+            chat.next_allowed = now + self.per_chat_interval
+            heapq.heappush(self._delayed, (chat.next_allowed, chat_id))
+            return send
+        return None
+
+    def _take_token(self):
+        self._tokens -= 1
+
+    async def _perform(self, send: _Send):
+        send.attempts += 1
+        self.queue_wait[send.priority.name.lower()].observe(self._clock() - send.enqueued_at)
+        try:
+            result = await send.call()
+        except RetryAfter as e:
+            self.rate_limited += 1
+            retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, "total_seconds") else float(e.retry_after)
+            logger.warning(f"Telegram rate limit hit for chat {send.chat_id}; pausing sends for {retry_after}s")
+            self._paused_until = max(self._paused_until, self._clock() + retry_after)
+            self._retry(send, e, delay=retry_after)
+        except (TimedOut, NetworkError) as e:
+            self._retry(send, e, delay=min(2 ** send.attempts, 30))
+        except Exception as e:
+            self.failed += 1
+            if not send.future.done():
+                send.future.set_exception(e)
+        else:
+            self.sent += 1
+            if not send.future.done():
+                send.future.set_result(result)
+
+    def _retry(self, send: _Send, error: Exception, delay: float):
+        if send.attempts > self.max_retries or send.future.done():
+            self.failed += 1
+            if not send.future.done():
+                send.future.set_exception(error)
+            return
+        self.retried += 1
+        chat = self._chats.setdefault(send.chat_id, _Chat())
+        chat.next_allowed = max(chat.next_allowed, self._clock() + delay)
+        heapq.heappush(chat.queue, send)
+        heapq.heappush(self._delayed, (chat.next_allowed, send.chat_id))
+        self._changed.set()
+
+    def stats(self) -> Dict[str, Any]:
+        depth = {priority.name.lower(): 0 for priority in Priority}
+        for chat in self._chats.values():
+            for send in chat.queue:
+                depth[send.priority.name.lower()] += 1
+        return {
+            "queued": depth,
+            "in_flight": len(self._in_flight),
+            "chats": len(self._chats),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "rate_limited": self.rate_limited,
+            "paused_for": max(0.0, round(self._paused_until - self._clock(), 3)),
+            "queue_wait": {name: timing.stats() for name, timing in self.queue_wait.items()},
+        }
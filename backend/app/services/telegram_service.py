@@ -1,20 +1,94 @@
 import logging
-from typing import Optional
+from typing import Any, List, Optional, Tuple
 from telegram import Bot, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.error import TelegramError
 from app.core.config import settings
 from app.schemas.restaurant import Restaurant
 from app.schemas.admin import Admin  
-from app.supabase_client import supabase_get
+from app.core.cache import SingleFlight, TTLCache
+from app.supabase_client import supabase_get, supabase_patch
 from app.i18n.telegram_i18n import telegram_i18n, get_admin_language
+from app.services.telegram_sender import Priority, TelegramSender
 
 logger = logging.getLogger(__name__)
 
+# Admin profiles keyed by Telegram chat id. None is cached too (for a shorter
+# time) so unlinked chats don't hit the database on every message.
+_admin_cache = TTLCache(max_entries=settings.admin_cache_max_entries)
+_admin_flights = SingleFlight()
+_admin_generation = 0
+
+# Telegram Bot API limits for one message
+MAX_MESSAGE_LENGTH = 4096
+MAX_KEYBOARD_BUTTONS = 100
+
+
+def chunk_digest(blocks: List[str], max_length: int, max_items: int) -> List[List[int]]:
+    """
+    Groups block indexes into messages of at most max_items blocks whose text,
+    joined by blank lines, stays within max_length characters.
+    """
+    chunks: List[List[int]] = []
+    length = 0
+    for index, block in enumerate(blocks):
+        added = len(block) + 2
+        if not chunks or len(chunks[-1]) >= max_items or length + added > max_length:
+            chunks.append([])
+            length = 0
+        chunks[-1].append(index)
+        length += added
+    return chunks
+
 class TelegramService:
     def __init__(self, token: Optional[str]):
         if not token:
             raise ValueError("Telegram bot token is not set in environment variables.")
         self.bot = Bot(token=token)
+        self.sender = TelegramSender(
+            global_rate=settings.telegram_global_rate,
+            per_chat_interval=settings.telegram_per_chat_interval,
+            max_retries=settings.telegram_send_max_retries,
+        )
+
+    async def send_message(self, chat_id: int, text: str, priority: Priority = Priority.REPLY, **kwargs):
+        """
+        Sends a message through the rate-limited send queue.
+        """
+        return await self.sender.submit(
+            chat_id,
+            lambda: self.bot.send_message(chat_id=chat_id, text=text, **kwargs),
+            priority,
+        )
+
+    async def edit_message_text(self, chat_id: int, message_id: int, text: str, priority: Priority = Priority.EDIT, **kwargs):
+        """
+        Edits a message through the rate-limited send queue.
+        """
+        return await self.sender.submit(
+            chat_id,
+            lambda: self.bot.edit_message_text(chat_id=chat_id, message_id=message_id, text=text, **kwargs),
+            priority,
+        )
+
+    async def edit_message_reply_markup(self, chat_id: int, message_id: int, reply_markup, priority: Priority = Priority.EDIT):
+        """
+        Replaces a message's inline keyboard through the rate-limited send queue.
+        """
+        return await self.sender.submit(
+            chat_id,
+            lambda: self.bot.edit_message_reply_markup(chat_id=chat_id, message_id=message_id, reply_markup=reply_markup),
+            priority,
+        )
+
+    async def answer_callback_query(self, chat_id: int, callback_query_id: str, text: str, show_alert: bool = False):
+        """
+        Answers an inline button press, e.g. with an alert explaining why nothing happened.
+        """
+        return await self.sender.submit(
+            chat_id,
+            lambda: self.bot.answer_callback_query(callback_query_id=callback_query_id, text=text, show_alert=show_alert),
+            Priority.EDIT,
+        )
 
     async def send_start_message(self, chat_id: int, first_name: str):
         """
@@ -24,7 +98,7 @@ class TelegramService:
             language = await get_admin_language(chat_id)
             start_text = telegram_i18n.get_text("start_message", language, first_name=first_name)
             
-            await self.bot.send_message(
+            await self.send_message(
                 chat_id=chat_id,
                 text=start_text,
                 parse_mode="HTML"
@@ -40,7 +114,7 @@ class TelegramService:
             language = await get_admin_language(chat_id)
             help_text = telegram_i18n.get_help_menu(language)
             
-            await self.bot.send_message(
+            await self.send_message(
                 chat_id=chat_id,
                 text=help_text,
                 parse_mode="HTML"
@@ -48,12 +122,19 @@ class TelegramService:
         except TelegramError as e:
             logger.error(f"Failed to send help menu: {e}")
 
-    async def send_reservation_notification(self, chat_id: int, reservation_id: str, reservation_info: str):
+    async def send_reservation_notification(
+        self,
+        chat_id: int,
+        reservation_id: str,
+        reservation_info: str,
+        language: Optional[str] = None,
+    ):
         """
         Sends a reservation notification with inline Confirm/Discard buttons.
+        The admin's language is looked up unless the caller already knows it.
         """
         try:
-            language = await get_admin_language(chat_id)
+            language = language or await get_admin_language(chat_id)
             
             # Get button texts in appropriate language
             confirm_text = telegram_i18n.get_text("reservation_notification.buttons.confirm", language)
@@ -69,9 +150,10 @@ class TelegramService:
             reply_markup = InlineKeyboardMarkup(keyboard)
             message_text = f"{title_text}\n{reservation_info}"
             
-            sent_message = await self.bot.send_message(
+            sent_message = await self.send_message(
                 chat_id=chat_id,
                 text=message_text,
+                priority=Priority.NOTIFICATION,
                 reply_markup=reply_markup,
                 parse_mode="HTML"
             )
@@ -80,16 +162,89 @@ class TelegramService:
             logger.error(f"Failed to send Telegram message: {e}")
             return None
 
+    async def send_reservation_digest(
+        self,
+        chat_id: int,
+        reservations: List[Tuple[str, str]],
+        language: Optional[str] = None,
+    ) -> List[Any]:
+        """
+        Sends several (reservation_id, reservation_info) notifications as digest
+        messages, one Confirm/Discard row per reservation, split into as many
+        messages as Telegram's length and keyboard limits require. Returns, for
+        each reservation in order, the Message it was sent in or the
+        TelegramError that kept it from being sent.
+        """
+        language = language or await get_admin_language(chat_id)
+        confirm_text = telegram_i18n.get_text("reservation_notification.buttons.confirm", language)
+        discard_text = telegram_i18n.get_text("reservation_notification.buttons.discard", language)
+        title_text = telegram_i18n.get_text("reservation_digest.title", language, count=len(reservations))
+        # Room for the title and a "(part x of y)" suffix on every message
+        header_room = len(title_text) + len(telegram_i18n.get_text("reservation_digest.part", language, part=999, parts=999)) + 3
+
+        blocks = [info for _, info in reservations]
+        chunks = chunk_digest(blocks, MAX_MESSAGE_LENGTH - header_room, MAX_KEYBOARD_BUTTONS // 2)
+        results: List[Any] = [None] * len(reservations)
+        for part, indexes in enumerate(chunks, start=1):
+            header = title_text
+            if len(chunks) > 1:
+                header += " " + telegram_i18n.get_text("reservation_digest.part", language, part=part, parts=len(chunks))
+            keyboard = [
+                [
+                    InlineKeyboardButton(f"{confirm_text} #{reservations[i][0]}", callback_data=f"confirm:{reservations[i][0]}"),
+                    InlineKeyboardButton(f"{discard_text} #{reservations[i][0]}", callback_data=f"discard:{reservations[i][0]}"),
+                ]
+                for i in indexes
+            ]
+            text = header + "\n\n" + "\n\n".join(blocks[i] for i in indexes)
+            try:
+                sent_message = await self.send_message(
+                    chat_id=chat_id,
+                    text=text,
+                    priority=Priority.DIGEST,
+                    reply_markup=InlineKeyboardMarkup(keyboard),
+                    parse_mode="HTML"
+                )
+            except TelegramError as e:
+                logger.error(f"Failed to send reservation digest part {part} to chat {chat_id}: {e}")
+                sent_message = e
+            for i in indexes:
+                results[i] = sent_message
+        return results
+
 
 async def get_admin_by_telegram_id(telegram_chat_id: int) -> Optional[Admin]:
     """
     Fetches an admin by their Telegram chat ID.
+    Served from a short-lived cache; call invalidate_admin after modifying the row.
     """
+    key = str(telegram_chat_id)
+    found, admin = _admin_cache.get(key, (False, None))
+    if found:
+        return admin
 
-    admins = await supabase_get("admins", params=f"telegram_chat_id=eq.{telegram_chat_id}")
-    if admins:
-        return Admin(**admins[0])
-    return None
+    async def load() -> Optional[Admin]:
+        generation = _admin_generation
+        admins = await supabase_get("admins", params={"telegram_chat_id": f"eq.{telegram_chat_id}"})
+        admin = Admin(**admins[0]) if admins else None
+        # Don't cache a row that was invalidated while it was being read
+        if generation == _admin_generation:
+            ttl = settings.admin_cache_ttl if admin else settings.admin_cache_negative_ttl
+            _admin_cache.set(key, (True, admin), ttl)
+        return admin
+
+    return await _admin_flights.do(key, load)
+
+def invalidate_admin(telegram_chat_id: int):
+    """
+    Drops the cached admin profile for a Telegram chat ID.
+    """
+    global _admin_generation
+    _admin_generation += 1
+    _admin_cache.delete(str(telegram_chat_id))
+
+def get_admin_cache_stats() -> dict:
+    return {**_admin_cache.stats(), "coalesced_reads": _admin_flights.hits}
 
 async def set_admin_restaurant(telegram_chat_id: int, restaurant_id: str) -> Optional[Admin]:
     """
@@ -104,16 +259,15 @@ async def set_admin_restaurant(telegram_chat_id: int, restaurant_id: str) -> Opt
         return None
 
 
-    admins = await supabase_get("admins", params=f"telegram_chat_id=eq.{telegram_chat_id}")
-    if admins:
-        admin_id = admins[0]['id']
-        update_data = {"restaurant_id": restaurant_id}
-        updated_admin_data = await supabase_get(
-            "admins", 
-            params=f"id=eq.{admin_id}", 
-            method="patch", 
-            data=update_data
+    admin = await get_admin_by_telegram_id(telegram_chat_id)
+    if admin:
+        updated_admin_data = await supabase_patch(
+            "admins",
+            row_id=admin.id,
+            data={"restaurant_id": restaurant_id},
+            id_column="id"
         )
+        invalidate_admin(telegram_chat_id)
         if updated_admin_data:
             return Admin(**updated_admin_data[0])
     else:
@@ -125,8 +279,7 @@ async def is_telegram_admin(user_id: int) -> bool:
     Checks if a given Telegram user ID corresponds to an admin in the database.
     Only checks by telegram_chat_id for linked accounts.
     """
-    admins = await supabase_get("admins", params=f"telegram_chat_id=eq.{user_id}")
-    return bool(admins)
+    return await get_admin_by_telegram_id(user_id) is not None
 
 # Singleton instance for use in app
 telegram_service: Optional[TelegramService] = None
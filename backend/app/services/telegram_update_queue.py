@@ -0,0 +1,104 @@
+"""Bounded queue and worker pool for processing Telegram webhook updates off the request path"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from app.core.metrics import TimingStats
+
+logger = logging.getLogger(__name__)
+
+
+class UpdateQueue:
+    """
+    Lets the webhook acknowledge Telegram immediately. Updates are queued
+    raw and a fixed pool of worker coroutines runs the handler on them.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[Dict[str, Any]], Awaitable[Any]],
+        maxsize: int = 1000,
+        workers: int = 4,
+    ):
+        self.handler = handler
+        self.maxsize = maxsize
+        self.workers = workers
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self.enqueued = 0
+        self.rejected = 0
+        self.processed = 0
+        self.failed = 0
+        self.wait_time = TimingStats()
+        self.processing_time = TimingStats()
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"telegram-update-worker-{i}")
+            for i in range(self.workers)
+        ]
+        logger.info(f"Started {self.workers} Telegram update workers (queue size {self.maxsize})")
+
+    async def stop(self, drain_timeout: float = 10.0):
+        """
+        Waits up to drain_timeout seconds for queued updates, then stops the workers.
+        """
+        if not self.running:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Dropping {self._queue.qsize()} unprocessed Telegram updates on shutdown")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, update: Dict[str, Any]) -> bool:
+        """
+        Queues an update. Returns False if the queue is full.
+        """
+        try:
+            self._queue.put_nowait((update, time.monotonic()))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return False
+        self.enqueued += 1
+        return True
+
+    async def _worker(self):
+        while True:
+            update, enqueued_at = await self._queue.get()
+            started = time.monotonic()
+            self.wait_time.observe(started - enqueued_at)
+            try:
+                await self.handler(update)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Failed to process Telegram update {update.get('update_id')}: {e}", exc_info=True)
+            finally:
+                self.processing_time.observe(time.monotonic() - started)
+                self._queue.task_done()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "depth": self._queue.qsize() if self._queue else 0,
+            "maxsize": self.maxsize,
+            "workers": self.workers,
+            "enqueued": self.enqueued,
+            "rejected": self.rejected,
+            "processed": self.processed,
+            "failed": self.failed,
+            "wait_time": self.wait_time.stats(),
+            "processing_time": self.processing_time.stats(),
+        }
@@ -1,13 +1,98 @@
 from dotenv import load_dotenv
 
 load_dotenv()
+import copy
 import os
+import logging
+import importlib.util
 import httpx
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, AsyncIterator, Iterable, List, Tuple, Union
+from urllib.parse import parse_qsl
+from app.core.config import settings
+from app.core.cache import SingleFlight, TTLCache
+
+logger = logging.getLogger(__name__)
 
 SUPABASE_URL = os.environ["SUPABASE_URL"].rstrip("/")
 SUPABASE_KEY = os.environ["SUPABASE_SERVICE_KEY"]
 
+# Shared connection pool, opened and closed by the application lifespan
+_http_client: Optional[httpx.AsyncClient] = None
+
+# Identical concurrent GETs share one upstream request
+_get_flights = SingleFlight()
+
+# Optional read-through cache for rarely changing tables, see settings.supabase_cache_ttl
+_response_cache = TTLCache(max_entries=settings.supabase_cache_max_entries)
+# Bumped on every write so a read that raced a write is not cached
+_table_generations: Dict[str, int] = {}
+_MISSING = object()
+
+Timeout = Union[float, httpx.Timeout, None]
+
+
+class SupabaseError(Exception):
+    """Raised when a Supabase write is rejected. Carries the HTTP status code."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _create_http_client() -> httpx.AsyncClient:
+    http2 = settings.supabase_http2
+    if http2 and importlib.util.find_spec("h2") is None:
+        logger.warning("SUPABASE_HTTP2 is enabled but the 'h2' package is not installed; using HTTP/1.1")
+        http2 = False
+
+    return httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=settings.supabase_max_connections,
+            max_keepalive_connections=settings.supabase_max_keepalive_connections,
+            keepalive_expiry=settings.supabase_keepalive_expiry,
+        ),
+        timeout=httpx.Timeout(
+            settings.supabase_timeout,
+            connect=settings.supabase_connect_timeout,
+        ),
+    )
+
+
+async def init_http_client() -> httpx.AsyncClient:
+    """
+    Opens the process-wide Supabase HTTP client. Called from the app lifespan.
+    """
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = _create_http_client()
+    return _http_client
+
+
+async def close_http_client():
+    """
+    Closes the process-wide Supabase HTTP client and its pooled connections.
+    """
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Returns the shared Supabase HTTP client.
+    Scripts that run outside the app lifespan get a lazily created client.
+    """
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = _create_http_client()
+    return _http_client
+
+
+def _timeout(timeout: Timeout):
+    return httpx.USE_CLIENT_DEFAULT if timeout is None else timeout
+
 
 def get_supabase_headers():
     return {
@@ -18,61 +103,245 @@ def get_supabase_headers():
     }
 
 
-async def supabase_get(table: str, params: Optional[Dict[str, Any]] = None):
-    async with httpx.AsyncClient() as client:
-        # Handle both string and dict params for backwards compatibility
-        if isinstance(params, str):
-            url = f"{SUPABASE_URL}/rest/v1/{table}?{params}"
-            query_params = None
-        else:
-            url = f"{SUPABASE_URL}/rest/v1/{table}"
-            query_params = params
-            
-        resp = await client.get(
-            url,
-            headers=get_supabase_headers(),
-            params=query_params,
-        )
+def normalize_params(params: Union[str, Dict[str, Any], None]) -> Tuple[Tuple[str, str], ...]:
+    """
+    Returns a canonical, hashable form of PostgREST query params so that the
+    same query expressed as a string or dict, in any order, compares equal.
+    """
+    if not params:
+        return ()
+    if isinstance(params, str):
+        items = parse_qsl(params, keep_blank_values=True)
+    else:
+        items = []
+        for key, value in params.items():
+            values = value if isinstance(value, (list, tuple)) else [value]
+            items.extend((str(key), str(v)) for v in values)
+    return tuple(sorted(items))
+
+
+def get_supabase_stats() -> Dict[str, Any]:
+    """
+    Returns counters for monitoring the Supabase client layer.
+    """
+    return {
+        "coalesced_gets": _get_flights.stats(),
+        "response_cache": {
+            "enabled": settings.supabase_cache_enabled,
+            **_response_cache.stats(),
+        },
+    }
+
+
+def _cache_ttl(table: str) -> float:
+    if not settings.supabase_cache_enabled:
+        return 0.0
+    return settings.supabase_cache_ttl.get(table, 0.0)
+
+
+def invalidate_cache(table: str, column: Optional[str] = None, values: Optional[Iterable[Any]] = None):
+    """
+    Drops cached GET responses for a table.
+
+    Without a column every entry for the table is dropped. With a column and
+    row values, entries pinned to a different row by an ``eq`` filter on that
+    column are kept, since the write cannot have changed them.
+    """
+    _table_generations[table] = _table_generations.get(table, 0) + 1
+    if column is None or values is None:
+        _response_cache.delete_where(lambda key: key[0] == table)
+        return
+
+    targets = {f"eq.{value}" for value in values}
+
+    def is_stale(key) -> bool:
+        key_table, params = key
+        if key_table != table:
+            return False
+        filters = [value for name, value in params if name == column]
+        if not filters:
+            return True
+        return any(not f.startswith("eq.") or f in targets for f in filters)
+
+    _response_cache.delete_where(is_stale)
+
+
+async def supabase_get(table: str, params: Optional[Dict[str, Any]] = None, timeout: Timeout = None):
+    key = (table, normalize_params(params))
+    ttl = _cache_ttl(table)
+    if ttl > 0:
+        cached = _response_cache.get(key, _MISSING)
+        if cached is not _MISSING:
+            # Callers may modify the rows they get; the cached ones must not change
+            return copy.deepcopy(cached)
+
+    generation = _table_generations.get(table, 0)
+    # A read started after a write to the table never joins one started before it
+    result = await _get_flights.do((*key, generation), lambda: _fetch(table, params, timeout))
+    if ttl > 0 and _table_generations.get(table, 0) == generation:
+        _response_cache.set(key, result, ttl)
+    # Every caller merged into the flight gets its own rows, as on a cache hit;
+    # the shared result is never handed out, so the cache can keep it as is
+    return copy.deepcopy(result)
+
+
+async def supabase_pages(
+    table: str,
+    params: Dict[str, Any],
+    page_size: int,
+    after: Optional[Any] = None,
+    key: str = "id",
+    timeout: Timeout = None,
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    Yields the rows matching params one page at a time, in ascending key
+    order, using keyset pagination (key > last key seen) rather than offsets,
+    so every page costs the same however deep the scan goes. key must be
+    unique and non-null. Starts after the given key when resuming. Pages
+    bypass the response cache and request coalescing, so only one page is
+    held in memory at a time.
+    """
+    last = after
+    while True:
+        page_params = {**params, "order": f"{key}.asc", "limit": str(page_size)}
+        if last is not None:
+            page_params[key] = f"gt.{last}"
+        page = await _fetch(table, page_params, timeout)
+        if not page:
+            return
+        yield page
+        if len(page) < page_size:
+            return
+        last = page[-1][key]
+
+
+async def _fetch(table: str, params: Optional[Dict[str, Any]], timeout: Timeout):
+    client = get_http_client()
+    # Handle both string and dict params for backwards compatibility
+    if isinstance(params, str):
+        url = f"{SUPABASE_URL}/rest/v1/{table}?{params}"
+        query_params = None
+    else:
+        url = f"{SUPABASE_URL}/rest/v1/{table}"
+        query_params = params
+
+    resp = await client.get(
+        url,
+        headers=get_supabase_headers(),
+        params=query_params,
+        timeout=_timeout(timeout),
+    )
+    resp.raise_for_status()
+    return resp.json()
+
+
+async def supabase_post(table, data, timeout: Timeout = None):
+    client = get_http_client()
+    resp = await client.post(
+        f"{SUPABASE_URL}/rest/v1/{table}",
+        headers=get_supabase_headers(),
+        json=data,
+        timeout=_timeout(timeout),
+    )
+    try:
+        resp.raise_for_status()
+    except httpx.HTTPStatusError as e:
+        raise SupabaseError(f"Supabase POST error: {resp.text}", resp.status_code) from e
+    result = resp.json()
+    created_ids = [row["id"] for row in result if "id" in row] if isinstance(result, list) else []
+    invalidate_cache(table, "id" if created_ids else None, created_ids or None)
+    return result
+
+
+async def supabase_patch(
+    table,
+    row_id,
+    data,
+    id_column="id",
+    timeout: Timeout = None,
+    filters: Optional[Dict[str, str]] = None,
+):
+    """
+    Updates the row matching id_column. Extra PostgREST filters (e.g.
+    {"status": "eq.pending"}) make the update conditional; the response then
+    only contains the rows that were actually updated.
+    """
+    client = get_http_client()
+    params = {id_column: f"eq.{row_id}", **(filters or {})}
+    resp = await client.patch(
+        f"{SUPABASE_URL}/rest/v1/{table}",
+        headers=get_supabase_headers(),
+        params=params,
+        json=data,
+        timeout=_timeout(timeout),
+    )
+    try:
+        resp.raise_for_status()
+    except httpx.HTTPStatusError as e:
+        raise SupabaseError(f"Supabase PATCH error: {resp.text}", resp.status_code) from e
+    invalidate_cache(table, id_column, [row_id])
+    return resp.json()
+
+
+async def supabase_patch_many(table, row_ids, data, id_column="id", timeout: Timeout = None):
+    """
+    Applies the same update to every row whose id_column is in row_ids, in one request.
+    """
+    row_ids = list(row_ids)
+    if not row_ids:
+        return []
+    client = get_http_client()
+    resp = await client.patch(
+        f"{SUPABASE_URL}/rest/v1/{table}",
+        headers=get_supabase_headers(),
+        params={id_column: f"in.({','.join(map(str, row_ids))})"},
+        json=data,
+        timeout=_timeout(timeout),
+    )
+    try:
+        resp.raise_for_status()
+    except httpx.HTTPStatusError as e:
+        raise SupabaseError(f"Supabase PATCH error: {resp.text}", resp.status_code) from e
+    invalidate_cache(table, id_column, row_ids)
+    return resp.json()
+
+
+async def supabase_rpc(
+    function: str,
+    params: Optional[Dict[str, Any]] = None,
+    writes: Iterable[str] = (),
+    timeout: Timeout = None,
+):
+    """
+    Calls a Postgres function through PostgREST (POST /rest/v1/rpc/<function>).
+    Cached reads of the tables listed in writes are invalidated.
+    """
+    client = get_http_client()
+    resp = await client.post(
+        f"{SUPABASE_URL}/rest/v1/rpc/{function}",
+        headers=get_supabase_headers(),
+        json=params or {},
+        timeout=_timeout(timeout),
+    )
+    try:
+        resp.raise_for_status()
+    except httpx.HTTPStatusError as e:
+        raise SupabaseError(f"Supabase RPC error: {resp.text}", resp.status_code) from e
+    for table in writes:
+        invalidate_cache(table)
+    return resp.json() if resp.content else None
+
+
+async def supabase_delete(table, row_id, id_column="id", timeout: Timeout = None):
+    client = get_http_client()
+    resp = await client.delete(
+        f"{SUPABASE_URL}/rest/v1/{table}?{id_column}=eq.{row_id}",
+        headers=get_supabase_headers(),
+        timeout=_timeout(timeout),
+    )
+    try:
         resp.raise_for_status()
-        return resp.json()
-
-
-async def supabase_post(table, data):
-    async with httpx.AsyncClient() as client:
-        resp = await client.post(
-            f"{SUPABASE_URL}/rest/v1/{table}",
-            headers=get_supabase_headers(),
-            json=data,
-        )
-        try:
-            resp.raise_for_status()
-        except httpx.HTTPStatusError as e:
-            raise Exception(f"Supabase POST error: {resp.text}") from e
-        return resp.json()
-
-
-async def supabase_patch(table, row_id, data, id_column="id"):
-    async with httpx.AsyncClient() as client:
-        resp = await client.patch(
-            f"{SUPABASE_URL}/rest/v1/{table}?{id_column}=eq.{row_id}",
-            headers=get_supabase_headers(),
-            json=data,
-        )
-        try:
-            resp.raise_for_status()
-        except httpx.HTTPStatusError as e:
-            raise Exception(f"Supabase PATCH error: {resp.text}") from e
-        return resp.json()
-
-
-async def supabase_delete(table, row_id, id_column="id"):
-    async with httpx.AsyncClient() as client:
-        resp = await client.delete(
-            f"{SUPABASE_URL}/rest/v1/{table}?{id_column}=eq.{row_id}",
-            headers=get_supabase_headers(),
-        )
-        try:
-            resp.raise_for_status()
-        except httpx.HTTPStatusError as e:
-            raise Exception(f"Supabase DELETE error: {resp.text}") from e
-        return resp.json()
+    except httpx.HTTPStatusError as e:
+        raise SupabaseError(f"Supabase DELETE error: {resp.text}", resp.status_code) from e
+    invalidate_cache(table, id_column, [row_id])
+    return resp.json()
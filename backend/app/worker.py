@@ -0,0 +1,58 @@
+"""Standalone background worker for Restaurant Manager.
+
+Runs the periodic jobs outside the API so API processes can scale freely:
+
+    python -m app.worker
+
+Start API processes with RUN_BACKGROUND_TASKS=false. Any number of workers
+can run; leader election (LEADER_LOCK_BACKEND) keeps exactly one active.
+"""
+
+import asyncio
+import logging
+import signal
+from dotenv import load_dotenv
+
+from .core.leader import create_leader_lock, run_as_leader
+from .services.background_tasks import main_task
+from .services.telegram_service import telegram_service
+from .services.outbox import outbox
+from .supabase_client import init_http_client, close_http_client
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+async def run_worker():
+    await init_http_client()
+    if telegram_service:
+        outbox.start()
+    task = asyncio.create_task(run_as_leader(create_leader_lock(), main_task))
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, task.cancel)
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    finally:
+        await outbox.stop()
+        if telegram_service:
+            await telegram_service.sender.stop()
+        await close_http_client()
+        logger.info("Background worker stopped")
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="[%(asctime)s] %(levelname)s %(name)s: %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    asyncio.run(run_worker())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the vectorized analytics engine.
+
+Builds a synthetic reservation history (5M rows by default) directly as
+ReservationHistory arrays and times compute_report in-process and through a
+worker process, against a pure-Python aggregation over row dicts on a
+smaller sample.
+
+Usage:
+    python benchmarks/analytics_benchmark.py [--rows 5000000] [--tables 1000] [--days 1095]
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+
+# Add the backend directory to Python path
+backend_dir = Path(__file__).parent.parent.absolute()
+sys.path.insert(0, str(backend_dir))
+
+from app.services.analytics import STATUSES, ReservationHistory, compute_report
+
+SLOT_MINUTES = 15
+OPEN_MINUTES = 13 * 60
+DURATION_MINUTES = 120
+
+
+def synthetic_history(rows: int, tables: int, days: int, first_day: date) -> ReservationHistory:
+    rng = np.random.default_rng(1)
+    first = (first_day - date(1970, 1, 1)).days
+    return ReservationHistory(
+        day=(first + rng.integers(0, days, rows)).astype(np.int32),
+        slot=rng.integers(11 * 60 // SLOT_MINUTES, 23 * 60 // SLOT_MINUTES, rows).astype(np.int16),
+        table=rng.integers(0, tables, rows).astype(np.int32),
+        party_size=rng.integers(1, 9, rows).astype(np.int16),
+        status=rng.choice(len(STATUSES), rows, p=[0.05, 0.55, 0.1, 0.25, 0.05]).astype(np.int8),
+        table_ids=np.arange(1, tables + 1, dtype=np.int64),
+        capacities=np.array(random.Random(2).choices([2, 4, 6, 8], k=tables), dtype=np.int32),
+        slot_minutes=SLOT_MINUTES,
+    )
+
+
+def to_rows(history: ReservationHistory, count: int):
+    """Row dicts shaped like Supabase responses, for the baselines."""
+    epoch = date(1970, 1, 1)
+    rows = []
+    for i in range(count):
+        minute = int(history.slot[i]) * SLOT_MINUTES
+        rows.append({
+            "id": i,
+            "table_id": int(history.table_ids[history.table[i]]),
+            "reservation_date": (epoch + timedelta(days=int(history.day[i]))).isoformat(),
+            "reservation_time": f"{minute // 60:02d}:{minute % 60:02d}:00",
+            "party_size": int(history.party_size[i]),
+            "status": STATUSES[history.status[i]],
+        })
+    return rows
+
+
+def naive_report(rows, capacities):
+    """The same aggregates with dicts and loops, one pass per metric."""
+    daily = defaultdict(lambda: defaultdict(int))
+    heatmap = defaultdict(int)
+    per_table = defaultdict(lambda: [0, 0, 0.0])
+    for row in rows:
+        day = daily[row["reservation_date"]]
+        day["total"] += 1
+        day[row["status"]] += 1
+        day["guests"] += row["party_size"]
+        stats = per_table[row["table_id"]]
+        stats[0] += 1
+        if row["status"] == "confirmed":
+            stats[1] += 1
+        if row["status"] in ("confirmed", "completed"):
+            weekday = date.fromisoformat(row["reservation_date"]).weekday()
+            heatmap[(weekday, int(row["reservation_time"][:2]))] += 1
+            stats[2] += min(row["party_size"], capacities[row["table_id"]]) * DURATION_MINUTES
+    return daily, heatmap, per_table
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+async def timed_in_pool(pool, *args):
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    result = await loop.run_in_executor(pool, compute_report, *args)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=5_000_000)
+    parser.add_argument("--tables", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=1095)
+    parser.add_argument("--naive-rows", type=int, default=500_000,
+                        help="Sample size for the row-dict baselines (they are too slow at full size)")
+    args = parser.parse_args()
+
+    first_day = date(2023, 1, 1)
+    last_day = first_day + timedelta(days=args.days - 1)
+    history, build_seconds = timed(synthetic_history, args.rows, args.tables, args.days, first_day)
+    size_mb = sum(a.nbytes for a in (history.day, history.slot, history.table, history.party_size, history.status)) / 1e6
+    print(f"📊 {args.rows:,} reservations, {args.tables} tables, {args.days} days ({size_mb:,.0f} MB of columns)")
+
+    report_args = (history, first_day, last_day, OPEN_MINUTES, DURATION_MINUTES)
+    compute_report(*report_args)  # warm up
+    report, seconds = timed(compute_report, *report_args)
+    print(f"   vectorized report, in-process: {seconds * 1000:,.1f} ms "
+          f"({len(report['daily'])} days, confirmation {report['confirmation_rate']}%, "
+          f"utilization {report['seat_utilization']}%)")
+
+    async def pool_run():
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            await timed_in_pool(pool, *report_args)  # start the worker
+            return await timed_in_pool(pool, *report_args)
+
+    _, pool_seconds = asyncio.run(pool_run())
+    print(f"   vectorized report, worker process: {pool_seconds * 1000:,.1f} ms (including pickling the columns)")
+
+    sample = min(args.naive_rows, args.rows)
+    rows = to_rows(history, sample)
+    tables = [{"id": int(t), "capacity": int(c)} for t, c in zip(history.table_ids, history.capacities)]
+    capacities = {table["id"]: table["capacity"] for table in tables}
+
+    _, parse_seconds = timed(ReservationHistory.from_rows, rows, tables, SLOT_MINUTES)
+    print(f"   loading {sample:,} rows into columns: {parse_seconds * 1000:,.1f} ms "
+          f"(~{parse_seconds * args.rows / sample * 1000:,.0f} ms at {args.rows:,})")
+
+    _, naive_seconds = timed(naive_report, rows, capacities)
+    scaled = naive_seconds * args.rows / sample
+    print(f"   row-dict loops ({sample:,} rows): {naive_seconds * 1000:,.1f} ms "
+          f"(~{scaled * 1000:,.0f} ms at {args.rows:,}, {scaled / seconds:,.0f}x slower)")
+
+
+if __name__ == "__main__":
+    main()
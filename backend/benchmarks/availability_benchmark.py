@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for the reservation availability engine.
+
+Compares the original O(tables x reservations) conflict scan with
+AvailabilityIndex on a synthetic restaurant (500 tables, 1M historical
+reservations by default).
+
+Usage:
+    python benchmarks/availability_benchmark.py [--tables 500] [--reservations 1000000]
+"""
+
+import argparse
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+# Add the backend directory to Python path
+backend_dir = Path(__file__).parent.parent.absolute()
+sys.path.insert(0, str(backend_dir))
+
+from app.services.availability import AvailabilityIndex, slot_bounds, to_minutes
+
+DURATION = timedelta(hours=2)
+
+
+def synthetic_tables(count: int):
+    rng = random.Random(1)
+    return [{"id": i, "capacity": rng.choice([2, 2, 4, 4, 6, 8])} for i in range(1, count + 1)]
+
+
+def synthetic_reservations(count: int, table_count: int, days: int, first_day: date):
+    """Yields reservation rows shaped like Supabase responses, spread over `days` days."""
+    rng = random.Random(2)
+    for i in range(count):
+        day = first_day + timedelta(days=rng.randrange(days))
+        minute = rng.randrange(11 * 60, 23 * 60, 15)
+        yield {
+            "id": i,
+            "table_id": rng.randint(1, table_count),
+            "reservation_date": day.isoformat(),
+            "reservation_time": f"{minute // 60:02d}:{minute % 60:02d}:00",
+        }
+
+
+def naive_first_free(tables, reservations, party_size: int, requested: datetime):
+    """The pre-engine algorithm from create_reservation."""
+    slot_start, slot_end = requested, requested + DURATION
+
+    def is_conflict(existing, current_table_id):
+        existing_start = datetime.fromisoformat(f"{existing['reservation_date']}T{existing['reservation_time']}")
+        return (
+            existing["table_id"] == current_table_id
+            and slot_start < existing_start + DURATION
+            and slot_end > existing_start
+        )
+
+    for table in tables:
+        if table["capacity"] < party_size:
+            continue
+        if not any(is_conflict(r, table["id"]) for r in reservations):
+            return table["id"]
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tables", type=int, default=500)
+    parser.add_argument("--reservations", type=int, default=1_000_000)
+    parser.add_argument("--days", type=int, default=730, help="Days of history the reservations span")
+    parser.add_argument("--queries", type=int, default=10_000)
+    parser.add_argument("--naive-reservations", type=int, default=100_000,
+                        help="History size for the naive baseline (it is too slow at full size)")
+    args = parser.parse_args()
+
+    first_day = date(2024, 1, 1)
+    target_day = first_day + timedelta(days=args.days // 2)
+    tables = synthetic_tables(args.tables)
+    rng = random.Random(3)
+    requests = [
+        (rng.choice([2, 4, 6]), datetime.combine(target_day, datetime.min.time()) + timedelta(minutes=rng.randrange(12 * 60, 22 * 60, 15)))
+        for _ in range(args.queries)
+    ]
+
+    print(f"🍽️  {args.tables} tables, {args.reservations:,} reservations over {args.days} days")
+
+    # Build once for the whole target day, as the booking path does per request
+    day_start = datetime.combine(target_day, datetime.min.time())
+    started = time.perf_counter()
+    index = AvailabilityIndex.build(
+        tables,
+        synthetic_reservations(args.reservations, args.tables, args.days, first_day),
+        window_start=day_start,
+        window_end=day_start + timedelta(days=1),
+    )
+    build_seconds = time.perf_counter() - started
+    kept = sum(len(starts) for starts in index._starts.values())
+    print(f"   index build (full history scan): {build_seconds * 1000:,.1f} ms, {kept:,} reservations kept")
+
+    started = time.perf_counter()
+    for party_size, requested in requests:
+        index.first_free_table(party_size, to_minutes(slot_bounds(requested)[0]))
+    query_seconds = time.perf_counter() - started
+    print(f"   indexed lookup: {query_seconds / len(requests) * 1e6:,.2f} µs/query over {len(requests):,} queries")
+
+    naive_history = list(synthetic_reservations(args.naive_reservations, args.tables, args.days, first_day))
+    naive_queries = requests[:5]
+    started = time.perf_counter()
+    for party_size, requested in naive_queries:
+        naive_first_free(tables, naive_history, party_size, requested)
+    naive_seconds = (time.perf_counter() - started) / len(naive_queries)
+    scaled = naive_seconds * args.reservations / len(naive_history)
+    print(f"   naive scan ({len(naive_history):,} reservations): {naive_seconds * 1000:,.1f} ms/query "
+          f"(~{scaled * 1000:,.0f} ms at {args.reservations:,})")
+
+
+if __name__ == "__main__":
+    main()
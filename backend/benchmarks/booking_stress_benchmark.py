@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Stress benchmark for concurrent bookings.
+
+Fires thousands of concurrent bookings at an in-memory fake backend that
+behaves like Supabase: reads and inserts take simulated network latency and
+the only database-level protection is the unique index on
+(table_id, reservation_date, reservation_time). Reports throughput and the
+number of double-booked tables with and without BookingCoordinator.
+
+Usage:
+    python benchmarks/booking_stress_benchmark.py [--bookings 5000] [--tables 60]
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Add the backend directory to Python path
+backend_dir = Path(__file__).parent.parent.absolute()
+sys.path.insert(0, str(backend_dir))
+
+from app.services.availability import AvailabilityIndex, to_minutes
+from app.services.booking import BookingCoordinator, ReservationConflictError
+
+DURATION = 120
+
+
+class FakeBackend:
+    """In-memory reservations store with PostgREST-like latency and the exact-time unique index."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.rows = []
+        self._unique = set()
+
+    async def _delay(self):
+        await asyncio.sleep(random.uniform(0, self.latency))
+
+    async def read_active(self, table_ids):
+        await self._delay()
+        return [dict(row) for row in self.rows if row["table_id"] in table_ids]
+
+    async def insert(self, table_id, when: datetime):
+        await self._delay()
+        key = (table_id, when)
+        if key in self._unique:
+            raise ReservationConflictError("duplicate key value violates unique constraint")
+        self._unique.add(key)
+        row = {
+            "id": len(self.rows) + 1,
+            "table_id": table_id,
+            "reservation_date": when.date().isoformat(),
+            "reservation_time": when.time().isoformat(),
+        }
+        self.rows.append(row)
+        return row
+
+    def double_bookings(self) -> int:
+        by_table = {}
+        for row in self.rows:
+            start = to_minutes(datetime.fromisoformat(f"{row['reservation_date']}T{row['reservation_time']}"))
+            by_table.setdefault(row["table_id"], []).append(start)
+        overlaps = 0
+        for starts in by_table.values():
+            starts.sort()
+            overlaps += sum(1 for a, b in zip(starts, starts[1:]) if b - a < DURATION)
+        return overlaps
+
+
+async def book(backend, tables, coordinator, party_size, when):
+    rows = await backend.read_active({table["id"] for table in tables})
+    index = AvailabilityIndex.build(tables, rows, when, when + timedelta(minutes=DURATION), DURATION)
+    start = to_minutes(when)
+
+    if coordinator is None:
+        table_id = index.first_free_table(party_size, start)
+        if table_id is None:
+            return None
+        try:
+            return await backend.insert(table_id, when)
+        except ReservationConflictError:
+            return None
+
+    return await coordinator.book(
+        index.free_tables(party_size, start),
+        start,
+        DURATION,
+        lambda table_id: backend.insert(table_id, when),
+    )
+
+
+async def run(args, use_coordinator: bool):
+    random.seed(7)
+    tables = [{"id": i, "capacity": random.choice([2, 4, 6])} for i in range(1, args.tables + 1)]
+    day = datetime(2026, 6, 1)
+    # Few distinct slots so many bookings contend for the same tables
+    slots = [day + timedelta(hours=19, minutes=15 * i) for i in range(args.slots)]
+    backend = FakeBackend(args.latency)
+    coordinator = BookingCoordinator() if use_coordinator else None
+
+    requests = [(random.choice([2, 2, 4]), random.choice(slots)) for _ in range(args.bookings)]
+    started = time.perf_counter()
+    results = await asyncio.gather(*(book(backend, tables, coordinator, p, w) for p, w in requests))
+    elapsed = time.perf_counter() - started
+
+    booked = sum(1 for r in results if r is not None)
+    label = "BookingCoordinator" if use_coordinator else "read-then-write  "
+    print(f"   {label}: {args.bookings / elapsed:,.0f} bookings/s, {booked:,} booked, "
+          f"{args.bookings - booked:,} rejected, {backend.double_bookings():,} double-booked")
+    if coordinator:
+        print(f"      {coordinator.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bookings", type=int, default=5000)
+    parser.add_argument("--tables", type=int, default=60)
+    parser.add_argument("--slots", type=int, default=8, help="Distinct 15-minute start times requested")
+    parser.add_argument("--latency", type=float, default=0.02, help="Max simulated round-trip seconds")
+    args = parser.parse_args()
+
+    print(f"🍽️  {args.bookings:,} concurrent bookings, {args.tables} tables, {args.slots} slots")
+    asyncio.run(run(args, use_coordinator=False))
+    asyncio.run(run(args, use_coordinator=True))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for large-party seating on joined tables.
+
+Builds a SeatingPlan for a synthetic restaurant (200 tables by default) laid
+out either in per-location rows or as a floor-plan grid, then times finding
+the least-waste free set of adjacent tables for random parties and
+occupancies, against searching connected sets from scratch per request.
+
+Usage:
+    python benchmarks/seating_benchmark.py [--tables 200] [--layout rows|grid] [--max-tables 4] [--queries 2000]
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Add the backend directory to Python path
+backend_dir = Path(__file__).parent.parent.absolute()
+sys.path.insert(0, str(backend_dir))
+
+from app.services.seating import SeatingPlan, build_adjacency
+
+LOCATIONS = ["Main", "Patio", "Terrace", "Bar", "Window", "Garden", "Upstairs", "Private"]
+
+
+def synthetic_tables(count: int):
+    rng = random.Random(1)
+    return [
+        {"id": i, "name": f"T{i}", "capacity": rng.choice([2, 2, 4, 4, 6, 8]), "location": LOCATIONS[(i - 1) * len(LOCATIONS) // count]}
+        for i in range(1, count + 1)
+    ]
+
+
+def grid_floor_plan(tables, width: int = 20):
+    """Tables on a grid, each next to the tables left, right, in front and behind."""
+    plan = {}
+    for position, table in enumerate(tables):
+        neighbours = []
+        if position % width:
+            neighbours.append(tables[position - 1]["name"])
+        if position >= width:
+            neighbours.append(tables[position - width]["name"])
+        plan[table["name"]] = neighbours
+    return plan
+
+
+def naive_best(tables, adjacency, free, party_size: int, max_tables: int):
+    """Enumerates the connected sets of free tables on every request."""
+    capacity = {table["id"]: table["capacity"] for table in tables}
+    best, best_key = None, None
+    seen = set()
+
+    def extend(group, total):
+        nonlocal best, best_key
+        key = frozenset(group)
+        if key in seen:
+            return
+        seen.add(key)
+        if len(group) >= 2 and total >= party_size and len(group) <= party_size:
+            candidate = (total, len(group))
+            if best_key is None or candidate < best_key:
+                best, best_key = sorted(group), candidate
+        if len(group) == max_tables:
+            return
+        for table_id in group:
+            for neighbour in adjacency[table_id]:
+                if neighbour in free and neighbour not in key:
+                    extend(group | {neighbour}, total + capacity[neighbour])
+
+    for table_id in free:
+        extend(frozenset([table_id]), capacity[table_id])
+    return best, best_key
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tables", type=int, default=200)
+    parser.add_argument("--layout", choices=["rows", "grid"], default="rows")
+    parser.add_argument("--max-tables", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--naive-queries", type=int, default=50)
+    args = parser.parse_args()
+
+    tables = synthetic_tables(args.tables)
+    adjacency = build_adjacency(tables, grid_floor_plan(tables) if args.layout == "grid" else None)
+
+    started = time.perf_counter()
+    plan = SeatingPlan(tables, adjacency, max_tables=args.max_tables, max_sets=10_000_000)
+    build_seconds = time.perf_counter() - started
+    print(f"🪑 {args.tables} tables ({args.layout}), up to {args.max_tables} joined: "
+          f"{len(plan):,} connected sets precomputed in {build_seconds * 1000:,.1f} ms (once per floor plan)")
+
+    rng = random.Random(2)
+    scenarios = []
+    for _ in range(args.queries):
+        occupancy = rng.uniform(0.3, 0.9)
+        free = {table["id"] for table in tables if rng.random() > occupancy}
+        scenarios.append((free, rng.randint(5, 20)))
+
+    mask_times, search_times, found = [], [], 0
+    for free, party_size in scenarios:
+        started = time.perf_counter()
+        free_mask = plan.free_mask(free.__contains__)
+        mask_times.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        seating = plan.best(party_size, free_mask)
+        search_times.append(time.perf_counter() - started)
+        found += seating is not None
+
+    def describe(samples):
+        samples = sorted(samples)
+        return (f"mean {statistics.mean(samples) * 1e6:,.1f} µs, "
+                f"p99 {samples[int(len(samples) * 0.99) - 1] * 1e6:,.1f} µs, max {samples[-1] * 1e6:,.1f} µs")
+
+    print(f"   free mask from availability: {describe(mask_times)}")
+    print(f"   least-waste seating search:  {describe(search_times)} ({found}/{len(scenarios)} parties seated)")
+
+    naive_times, mismatches = [], 0
+    for free, party_size in scenarios[:args.naive_queries]:
+        started = time.perf_counter()
+        _, naive_key = naive_best(tables, adjacency, free, party_size, args.max_tables)
+        naive_times.append(time.perf_counter() - started)
+        seating = plan.best(party_size, plan.free_mask(free.__contains__))
+        capacity = {table["id"]: table["capacity"] for table in tables}
+        key = (sum(capacity[table_id] for table_id in seating), len(seating)) if seating else None
+        mismatches += key != naive_key
+    print(f"   per-request enumeration ({len(naive_times)} queries): {describe(naive_times)}, "
+          f"{mismatches} results differing in waste or size")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Shared fixtures: settings for an offline run and an in-memory Supabase stand-in"""
+
+import asyncio
+import os
+from typing import Any, Dict, List, Optional
+
+# app.supabase_client reads these at import time
+os.environ.setdefault("SUPABASE_URL", "http://supabase.test")
+os.environ.setdefault("SUPABASE_SERVICE_KEY", "test-key")
+
+import pytest
+
+from app.supabase_client import SupabaseError
+
+ACTIVE_STATUSES = ("pending", "confirmed")
+
+
+def _matches(row: Dict[str, Any], column: str, expression: str) -> bool:
+    if column == "and":
+        conditions = expression.strip("()").split(",")
+        return all(_matches(row, *condition.split(".", 1)) for condition in conditions)
+    operator, _, value = expression.partition(".")
+    actual = row.get(column)
+    if operator == "eq":
+        return str(actual) == value
+    if operator == "in":
+        return str(actual) in value.strip("()").split(",")
+    if actual is None:
+        return False
+    compare = {"gt": str.__gt__, "gte": str.__ge__, "lt": str.__lt__, "lte": str.__le__}[operator]
+    return compare(str(actual), value)
+
+
+class FakeSupabase:
+    """
+    The supabase_* functions over in-memory tables, enough for the queries
+    reservation_service makes. Inserts enforce the reservations unique index
+    on (table_id, reservation_date, reservation_time) for active rows with a
+    409 like PostgREST, and yield to the event loop first so concurrent
+    bookings interleave the way they do against the real database.
+    """
+
+    def __init__(self):
+        self.tables: Dict[str, List[Dict[str, Any]]] = {"tables": [], "reservations": []}
+        self.next_id = 1
+        self.inserts = 0
+        self.conflicts = 0
+
+    def _select(self, table: str, params: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        filters = {k: v for k, v in (params or {}).items() if k not in ("select", "order", "limit")}
+        return [
+            dict(row) for row in self.tables.setdefault(table, [])
+            if all(_matches(row, column, expression) for column, expression in filters.items())
+        ]
+
+    async def get(self, table: str, params: Optional[Dict[str, Any]] = None, timeout: Any = None):
+        await asyncio.sleep(0)
+        return self._select(table, params)
+
+    def _taken(self, row: Dict[str, Any]) -> bool:
+        if row.get("status") not in ACTIVE_STATUSES:
+            return False
+        slot = (row.get("table_id"), row.get("reservation_date"), row.get("reservation_time"))
+        return any(
+            (other["table_id"], other["reservation_date"], other["reservation_time"]) == slot
+            for other in self.tables["reservations"] if other.get("status") in ACTIVE_STATUSES
+        )
+
+    async def post(self, table: str, data: Any, timeout: Any = None):
+        await asyncio.sleep(0.001)
+        rows = data if isinstance(data, list) else [data]
+        if table == "reservations" and any(self._taken(row) for row in rows):
+            self.conflicts += 1
+            raise SupabaseError("duplicate key value violates unique constraint", 409)
+        created = []
+        for row in rows:
+            row = {**row, "id": self.next_id}
+            self.next_id += 1
+            self.tables.setdefault(table, []).append(row)
+            created.append(dict(row))
+        self.inserts += 1
+        return created
+
+    async def patch(self, table: str, row_id: Any, data: Dict[str, Any], id_column: str = "id",
+                    timeout: Any = None, filters: Optional[Dict[str, Any]] = None):
+        matches = {id_column: f"eq.{row_id}", **(filters or {})}
+        updated = []
+        for row in self.tables.setdefault(table, []):
+            if all(_matches(row, column, expression) for column, expression in matches.items()):
+                row.update(data)
+                updated.append(dict(row))
+        return updated
+
+    async def patch_many(self, table: str, row_ids: List[Any], data: Dict[str, Any], timeout: Any = None):
+        updated = []
+        for row_id in row_ids:
+            updated += await self.patch(table, row_id, data)
+        return updated
+
+    def active_slots(self) -> List[tuple]:
+        return [
+            (row["table_id"], row["reservation_date"], row["reservation_time"])
+            for row in self.tables["reservations"] if row.get("status") in ACTIVE_STATUSES
+        ]
+
+
+@pytest.fixture
+def fake_supabase(monkeypatch):
+    from app.services import reservation_service
+
+    fake = FakeSupabase()
+    monkeypatch.setattr(reservation_service, "supabase_get", fake.get)
+    monkeypatch.setattr(reservation_service, "supabase_post", fake.post)
+    monkeypatch.setattr(reservation_service, "supabase_patch", fake.patch)
+    monkeypatch.setattr(reservation_service, "supabase_patch_many", fake.patch_many)
+    return fake
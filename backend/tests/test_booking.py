@@ -0,0 +1,178 @@
+"""Concurrent bookings must never put two active reservations on one table slot"""
+
+import asyncio
+from collections import Counter
+from datetime import date, datetime, time
+
+import pytest
+from fastapi import BackgroundTasks, HTTPException
+
+from app.routers import reservations as reservations_router
+from app.schemas.reservation import ReservationCreate
+from app.services.availability import to_minutes
+from app.services.booking import BookingCoordinator, ReservationConflictError
+from app.services.reservation_service import reservation_service
+
+DAY = date(2030, 3, 14)
+DURATION = 120
+
+
+def _request(party_size: int = 2, at: time = time(19, 0), day: date = DAY, name: str = "Guest") -> ReservationCreate:
+    return ReservationCreate(
+        client_name=name,
+        client_contact=f"{name.lower()}@example.com",
+        party_size=party_size,
+        customer_id=1,
+        restaurant_id="r1",
+        reservation_date=day,
+        reservation_time=at,
+    )
+
+
+def _add_tables(fake, *capacities: int, location: str = "Main"):
+    for number, capacity in enumerate(capacities, start=len(fake.tables["tables"]) + 1):
+        fake.tables["tables"].append({
+            "id": number, "name": f"T{number}", "capacity": capacity, "location": location,
+            "restaurant_id": "r1", "status": "available",
+        })
+
+
+@pytest.fixture
+def coordinator(monkeypatch):
+    coordinator = BookingCoordinator()
+    monkeypatch.setattr(reservations_router, "booking_coordinator", coordinator)
+    return coordinator
+
+
+async def _insert(table_id: int):
+    # The database's 409 surfaces from create_reservation as ReservationConflictError
+    return await reservation_service.create_reservation(_request().model_copy(update={"table_id": table_id}))
+
+
+async def test_concurrent_bookings_for_the_same_slot_take_different_tables(fake_supabase):
+    coordinator = BookingCoordinator()
+    start = to_minutes(datetime.combine(DAY, time(19, 0)))
+
+    results = await asyncio.gather(*(
+        coordinator.book([1, 2, 3], start, DURATION, _insert)
+        for _ in range(5)
+    ))
+
+    booked = [result.table_id for result in results if result is not None]
+    assert sorted(booked) == [1, 2, 3]
+    assert results.count(None) == 2
+    assert not [slot for slot, count in Counter(fake_supabase.active_slots()).items() if count > 1]
+    # Claims made under the lock keep later attempts off the database entirely
+    assert fake_supabase.conflicts == 0
+
+
+async def test_database_conflict_moves_on_to_the_next_candidate(fake_supabase):
+    # Two processes: separate coordinators share only the database
+    first, second = BookingCoordinator(), BookingCoordinator()
+    start = to_minutes(datetime.combine(DAY, time(19, 0)))
+
+    a, b = await asyncio.gather(
+        first.book([1, 2], start, DURATION, _insert),
+        second.book([1, 2], start, DURATION, _insert),
+    )
+
+    assert {a.table_id, b.table_id} == {1, 2}
+    assert fake_supabase.conflicts == 1
+    assert first.conflicts + second.conflicts == 1
+
+
+async def test_other_errors_abort_the_booking():
+    coordinator = BookingCoordinator()
+
+    async def insert(table_id):
+        raise RuntimeError("database unavailable")
+
+    with pytest.raises(RuntimeError):
+        await coordinator.book([1, 2], 0, DURATION, insert)
+    assert coordinator.stats()["locked_table_days"] == 0
+
+
+async def test_overlapping_slots_across_midnight_conflict():
+    coordinator = BookingCoordinator()
+    late = to_minutes(datetime.combine(DAY, time(23, 30)))
+    early = late + 60
+
+    async def insert(table_id):
+        await asyncio.sleep(0.001)
+        return table_id
+
+    results = await asyncio.gather(
+        coordinator.book([7, 8], late, DURATION, insert),
+        coordinator.book([7, 8], early, DURATION, insert),
+    )
+
+    assert sorted(results) == [7, 8]
+
+
+async def test_group_bookings_never_share_a_table():
+    coordinator = BookingCoordinator()
+    start = to_minutes(datetime.combine(DAY, time(20, 0)))
+    candidates = [[1, 2], [2, 3], [3, 4], [4, 5]]
+
+    async def insert(table_ids):
+        await asyncio.sleep(0.001)
+        return list(table_ids)
+
+    results = await asyncio.gather(*(coordinator.book_group(candidates, start, DURATION, insert) for _ in range(4)))
+
+    seated = [table_id for result in results if result for table_id in result]
+    assert len(seated) == len(set(seated))
+    assert sorted(map(tuple, filter(None, results))) == [(1, 2), (3, 4)]
+
+
+async def test_group_conflict_from_the_database_tries_the_next_set():
+    coordinator = BookingCoordinator()
+    attempts = []
+
+    async def insert(table_ids):
+        attempts.append(list(table_ids))
+        if 2 in table_ids:
+            raise ReservationConflictError("taken by another process")
+        return list(table_ids)
+
+    assert await coordinator.book_group([[1, 2], [3, 4]], 0, DURATION, insert) == [3, 4]
+    assert attempts == [[1, 2], [3, 4]]
+    assert coordinator.conflicts == 1
+
+
+async def test_concurrent_reservation_requests_never_double_book(fake_supabase, coordinator):
+    _add_tables(fake_supabase, 4, 4, 4)
+
+    async def create(number: int):
+        try:
+            return await reservations_router.create_reservation(_request(name=f"Guest{number}"), BackgroundTasks())
+        except HTTPException as e:
+            return e
+
+    results = await asyncio.gather(*(create(number) for number in range(6)))
+
+    created = [result for result in results if not isinstance(result, HTTPException)]
+    rejected = [result for result in results if isinstance(result, HTTPException)]
+    assert sorted(result.table_id for result in created) == [1, 2, 3]
+    assert [error.status_code for error in rejected] == [400, 400, 400]
+    assert len(fake_supabase.active_slots()) == len(set(fake_supabase.active_slots())) == 3
+
+
+async def test_large_party_is_seated_once_on_joined_tables(fake_supabase, coordinator):
+    _add_tables(fake_supabase, 4, 4, 2)
+
+    async def create():
+        try:
+            return await reservations_router.create_reservation(_request(party_size=9), BackgroundTasks())
+        except HTTPException as e:
+            return e
+
+    first, second = await asyncio.gather(create(), create())
+
+    booked = first if not isinstance(first, HTTPException) else second
+    assert sorted(booked.joined_table_ids) == [1, 2, 3]
+    assert isinstance(first, HTTPException) != isinstance(second, HTTPException)
+    rows = fake_supabase.tables["reservations"]
+    assert len({row["booking_group_id"] for row in rows}) == 1
+    assert [row["group_party_size"] for row in rows].count(9) == 1
+    assert sum(row["party_size"] for row in rows) == 9
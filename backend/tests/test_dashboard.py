@@ -0,0 +1,160 @@
+"""Dashboard snapshots stay equal to a fresh build as writes patch them, and their ETags drive 304s"""
+
+import json
+from datetime import date
+
+import pytest
+
+from app.routers import reservations as reservations_router
+from app.services import dashboard
+from app.services.dashboard import DashboardCache, DashboardSnapshot
+
+DAY = date(2030, 3, 14)
+
+
+def _table(table_id: int, restaurant_id: str = "r1", status: str = "available"):
+    return {"id": table_id, "name": f"T{table_id}", "capacity": 4, "location": "Main",
+            "status": status, "restaurant_id": restaurant_id}
+
+
+def _reservation(reservation_id: int, table_id: int, at: str = "19:00:00", status: str = "pending",
+                 day: date = DAY, **extra):
+    return {
+        "id": reservation_id, "table_id": table_id, "reservation_date": day.isoformat(),
+        "reservation_time": at, "status": status, "party_size": 2, "client_name": f"Guest{reservation_id}",
+        "client_contact": "guest@example.com", "customer_id": 1, "restaurant_id": "r1", **extra,
+    }
+
+
+def _times(snapshot: DashboardSnapshot, table_id: int):
+    return [(r["id"], r["reservation_time"]) for r in snapshot.by_table[table_id]]
+
+
+def _tables(snapshot: DashboardSnapshot):
+    return {table.id: table for table in snapshot.to_response().tables}
+
+
+@pytest.fixture
+def snapshot():
+    return DashboardSnapshot("r1", DAY, [_table(1), _table(2)], [
+        _reservation(1, 1, "20:00:00"),
+        _reservation(2, 1, "18:00:00", status="discarded"),
+        _reservation(3, 2, "19:00:00", status="confirmed"),
+    ])
+
+
+def test_reservations_are_kept_in_time_order_per_table(snapshot):
+    assert _times(snapshot, 1) == [(2, "18:00:00"), (1, "20:00:00")]
+
+    snapshot.apply_reservation(_reservation(4, 1, "19:00:00"))
+    assert _times(snapshot, 1) == [(2, "18:00:00"), (4, "19:00:00"), (1, "20:00:00")]
+
+    # Moved to the other table and to a later time
+    snapshot.apply_reservation(_reservation(4, 2, "21:00:00"))
+    assert _times(snapshot, 1) == [(2, "18:00:00"), (1, "20:00:00")]
+    assert _times(snapshot, 2) == [(3, "19:00:00"), (4, "21:00:00")]
+
+
+def test_reservations_leaving_the_day_or_restaurant_are_dropped(snapshot):
+    snapshot.apply_reservation(_reservation(1, 1, "20:00:00", day=date(2030, 3, 15)))
+    snapshot.apply_reservation(_reservation(3, 99))
+    snapshot.apply_reservation(_reservation(5, 99))
+
+    assert set(snapshot.reservations) == {2}
+    assert _times(snapshot, 2) == []
+
+
+def test_table_shows_its_earliest_active_reservation(snapshot):
+    tables = _tables(snapshot)
+    # The earlier reservation was discarded, so it does not hold the table
+    assert (tables[1].status, tables[1].reservation.id) == ("pending", 1)
+    assert (tables[2].status, tables[2].reservation.id) == ("confirmed", 3)
+
+    snapshot.apply_reservation(_reservation(3, 2, "19:00:00", status="completed"))
+    tables = _tables(snapshot)
+    assert (tables[2].status, tables[2].reservation) == ("available", None)
+    assert [r.id for r in tables[2].reservations] == [3]
+
+
+def test_tables_are_updated_added_and_moved_away(snapshot):
+    snapshot.apply_table({**_table(2), "status": "maintenance", "name": "Window"})
+    tables = _tables(snapshot)
+    # A table out of service shows as such whatever its reservations
+    assert (tables[2].name, tables[2].status) == ("Window", "maintenance")
+
+    snapshot.apply_table(_table(3))
+    assert _tables(snapshot)[3].reservations == []
+
+    # Moved to another restaurant: gone with its reservations
+    snapshot.apply_table(_table(1, restaurant_id="r2"))
+    assert set(_tables(snapshot)) == {2, 3}
+    assert set(snapshot.reservations) == {3}
+
+
+def test_joined_tables_show_the_whole_party():
+    snapshot = DashboardSnapshot("r1", DAY, [_table(1), _table(2)], [
+        _reservation(1, 1, booking_group_id="g1", group_party_size=7, party_size=4),
+        _reservation(2, 2, booking_group_id="g1", party_size=3),
+    ])
+
+    assert [table.reservation.party_size for table in _tables(snapshot).values()] == [7, 7]
+
+
+def test_patched_snapshot_renders_like_a_fresh_build(snapshot):
+    body, etag = snapshot.render()
+    assert snapshot.render() == (body, etag)
+
+    snapshot.apply_reservation(_reservation(4, 2, "18:30:00"))
+    patched_body, patched_etag = snapshot.render()
+    assert patched_etag != etag
+
+    fresh = DashboardSnapshot("r1", DAY, [_table(1), _table(2)], [
+        _reservation(1, 1, "20:00:00"),
+        _reservation(2, 1, "18:00:00", status="discarded"),
+        _reservation(3, 2, "19:00:00", status="confirmed"),
+        _reservation(4, 2, "18:30:00"),
+    ])
+    # The ETag hashes the body, so any process that built the same dashboard agrees on it
+    assert fresh.render() == (patched_body, patched_etag)
+
+
+@pytest.fixture
+def cache(fake_supabase, monkeypatch):
+    cache = DashboardCache()
+    monkeypatch.setattr(reservations_router, "dashboard_cache", cache)
+    monkeypatch.setattr(dashboard, "supabase_get", fake_supabase.get)
+    fake_supabase.tables["tables"] += [_table(1), _table(2), _table(3, restaurant_id="r2")]
+    fake_supabase.tables["reservations"] += [_reservation(1, 1), _reservation(2, 3, "20:00:00")]
+    return cache
+
+
+async def _status(restaurant_id=None, if_none_match=None):
+    return await reservations_router.dashboard_status(date=DAY, restaurant_id=restaurant_id, if_none_match=if_none_match)
+
+
+async def test_etag_answers_304_until_the_dashboard_changes(cache):
+    first = await _status("r1")
+    etag = first.headers["etag"]
+    assert first.status_code == 200
+    assert [table["id"] for table in json.loads(first.body)["tables"]] == [1, 2]
+
+    for header in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+        assert (await _status("r1", header)).status_code == 304
+    assert cache.stats()["misses"] == 1
+
+    cache.apply_reservation(_reservation(3, 2, "21:00:00"))
+    changed = await _status("r1", etag)
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert [r["id"] for r in json.loads(changed.body)["reservations"]] == [1, 3]
+    assert cache.stats()["misses"] == 1
+
+
+async def test_unscoped_dashboard_combines_restaurants_without_caching(cache):
+    response = await _status()
+    body = json.loads(response.body)
+
+    assert [table["id"] for table in body["tables"]] == [1, 2, 3]
+    assert [r["id"] for r in body["reservations"]] == [1, 2]
+    assert (await _status(if_none_match=response.headers["etag"])).status_code == 304
+    assert cache.stats()["size"] == 0
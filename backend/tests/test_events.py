@@ -0,0 +1,123 @@
+"""Event streams resume from Last-Event-ID, reset when they cannot, and never wait on slow clients"""
+
+import json
+
+import pytest
+
+from app.services.events import EventBus, SubscriberLimitError
+
+
+def _parse(message: str):
+    fields = dict(line.split(": ", 1) for line in message.strip().splitlines())
+    return fields.get("id"), fields["event"], json.loads(fields["data"])
+
+
+def _drain(subscription):
+    messages = []
+    while not subscription.queue.empty():
+        messages.append(_parse(subscription.queue.get_nowait()))
+    return messages
+
+
+def _publish(bus: EventBus, count: int, restaurant_id: str = "r1"):
+    for reservation_id in range(count):
+        bus.publish(restaurant_id, "reservation.updated", {"id": reservation_id})
+
+
+@pytest.fixture
+def bus():
+    return EventBus(history_size=5, max_buffer=4, max_subscribers=2)
+
+
+def test_resuming_replays_the_missed_events_in_order(bus):
+    _publish(bus, 3)
+
+    subscription = bus.subscribe("r1", f"{bus.epoch}-1")
+
+    assert [(event_id, data["seq"]) for event_id, _, data in _drain(subscription)] == [
+        (f"{bus.epoch}-2", 2), (f"{bus.epoch}-3", 3),
+    ]
+    # Caught up: nothing to replay
+    assert _drain(bus.subscribe("r1", f"{bus.epoch}-3")) == []
+    assert bus.resets == 0
+
+
+def test_events_of_other_restaurants_are_not_replayed(bus):
+    _publish(bus, 2, "r2")
+    _publish(bus, 1)
+
+    assert [data["seq"] for _, _, data in _drain(bus.subscribe("r1", f"{bus.epoch}-0"))] == [1]
+
+
+@pytest.mark.parametrize("last_event_id", [
+    "0123abcd-2",  # another process, or this one before a restart
+    "{epoch}-1",  # older than the oldest event kept
+    "{epoch}-9",  # ahead of this stream
+    "{epoch}-x",
+    "garbage",
+])
+def test_unresumable_ids_get_a_reset(bus, last_event_id):
+    _publish(bus, 7)
+
+    subscription = bus.subscribe("r1", last_event_id.format(epoch=bus.epoch))
+
+    # A reset carries no id, so the client keeps its Last-Event-ID until it reloads
+    assert _drain(subscription) == [(None, "reset", {"seq": 7})]
+    assert bus.resets == 1
+
+
+def test_history_reaches_back_exactly_history_size_events(bus):
+    bus.max_buffer = 10
+    _publish(bus, 7)
+
+    # Events 3..7 are kept, so a client that saw 2 can still resume
+    assert [data["seq"] for _, _, data in _drain(bus.subscribe("r1", f"{bus.epoch}-2"))] == [3, 4, 5, 6, 7]
+    assert bus.resets == 0
+
+
+def test_more_missed_events_than_a_client_buffer_get_a_reset(bus):
+    _publish(bus, 5)
+
+    # All five are in the history, but they would not fit the client's queue
+    assert _drain(bus.subscribe("r1", f"{bus.epoch}-0")) == [(None, "reset", {"seq": 5})]
+
+
+async def test_slow_subscribers_are_dropped_without_holding_back_the_others(bus):
+    slow = bus.subscribe("r1")
+    fast = bus.subscribe("r1")
+
+    for reservation_id in range(6):
+        bus.publish("r1", "reservation.updated", {"id": reservation_id})
+        assert await fast.next(timeout=1)
+
+    assert slow.dropped
+    assert bus.stats()["dropped"] == 1
+    assert bus.stats()["subscribers"] == 1
+    # What was queued before falling behind is lost with it: the client reconnects and resumes
+    assert await slow.next(timeout=1) is None
+
+
+async def test_next_times_out_with_a_keepalive(bus):
+    subscription = bus.subscribe("r1")
+
+    assert await subscription.next(timeout=0.01) == ""
+
+
+def test_subscribers_are_limited_per_restaurant(bus):
+    first = bus.subscribe("r1")
+    bus.subscribe("r1")
+
+    with pytest.raises(SubscriberLimitError):
+        bus.subscribe("r1")
+    bus.subscribe("r2")
+    bus.unsubscribe(first)
+    bus.subscribe("r1")
+
+    assert bus.stats()["rejected"] == 1
+    assert bus.stats()["subscribers"] == 3
+
+
+def test_events_without_a_restaurant_are_ignored(bus):
+    bus.publish(None, "reservation.updated", {"id": 1})
+
+    assert bus.stats()["published"] == 0
@@ -0,0 +1,122 @@
+"""The notification outbox delivers at least once, without duplicates, across restarts"""
+
+import asyncio
+import time
+
+import pytest
+
+from app.core.config import settings
+from app.services.outbox import Outbox, OutboxEntry, OutboxStore
+
+
+def _entry(key: str, chat_id: int = 55) -> OutboxEntry:
+    return OutboxEntry(kind="notification", dedupe_key=key, chat_id=chat_id, payload={"text": key})
+
+
+@pytest.fixture
+def store(tmp_path):
+    return OutboxStore(str(tmp_path / "outbox.sqlite3"))
+
+
+@pytest.fixture(autouse=True)
+def fast_outbox(monkeypatch):
+    monkeypatch.setattr(settings, "outbox_flush_interval", 0.0)
+    monkeypatch.setattr(settings, "outbox_lease_seconds", 0.2)
+    monkeypatch.setattr(settings, "outbox_max_attempts", 3)
+
+
+def _outbox(store: OutboxStore, delivered: list, fail: bool = False) -> Outbox:
+    outbox = Outbox(store)
+
+    async def handler(entry: OutboxEntry):
+        if fail:
+            raise RuntimeError("Telegram unavailable")
+        delivered.append(entry.dedupe_key)
+        return len(delivered)
+
+    outbox.register_handler("notification", handler)
+    return outbox
+
+
+def test_store_ignores_duplicate_keys(store):
+    assert store.insert([[_entry("a"), _entry("b")], [_entry("a")]]) == [2, 0]
+    assert store.counts() == {"pending": 2}
+
+
+def test_expired_lease_is_claimed_again(store):
+    store.insert([[_entry("a")]])
+
+    claimed = store.claim(limit=10, lease=0.1)
+    assert [entry.dedupe_key for entry in claimed] == ["a"]
+    # Leased to the first claimer: nobody else gets it meanwhile
+    assert store.claim(limit=10, lease=0.1) == []
+
+    time.sleep(0.15)
+    reclaimed = store.claim(limit=10, lease=0.1)
+    assert [entry.id for entry in reclaimed] == [claimed[0].id]
+
+    store.complete(sent=[(reclaimed[0].id, 7)], failed=[], dead=[])
+    assert store.claim(limit=10, lease=0.1) == []
+    assert store.counts() == {"sent": 1}
+
+
+async def test_reenqueued_entries_are_delivered_once(store):
+    delivered = []
+    outbox = _outbox(store, delivered)
+
+    assert await outbox.enqueue([_entry("reservation:1"), _entry("reservation:2")]) == 2
+    assert await outbox.enqueue([_entry("reservation:1")]) == 0
+    await outbox.stop(drain_timeout=2)
+
+    assert sorted(delivered) == ["reservation:1", "reservation:2"]
+    assert outbox.stats()["deduplicated"] == 1
+    # Still deduplicated once sent, e.g. when a restarted job enqueues it again
+    assert store.insert([[_entry("reservation:1")]]) == [0]
+
+
+async def test_stop_drains_due_entries(store):
+    delivered = []
+    outbox = _outbox(store, delivered)
+
+    await asyncio.gather(*(outbox.enqueue([_entry(f"reservation:{i}")]) for i in range(20)))
+    await outbox.stop(drain_timeout=5)
+
+    assert not outbox.running
+    assert sorted(delivered) == sorted(f"reservation:{i}" for i in range(20))
+    assert store.counts() == {"sent": 20}
+
+
+async def test_stop_leaves_undeliverable_entries_for_the_next_start(store):
+    failing = _outbox(store, [], fail=True)
+    await failing.enqueue([_entry("reservation:1")])
+
+    started = time.monotonic()
+    await failing.stop(drain_timeout=5)
+    # The retry is scheduled after a backoff, so there is nothing due to wait for
+    assert time.monotonic() - started < 1
+    assert store.counts() == {"pending": 1}
+
+    # Due again after its backoff, the next process delivers it
+    conn = store._connect()
+    conn.execute("UPDATE outbox SET next_attempt_at = 0")
+    conn.commit()
+    delivered = []
+    outbox = _outbox(store, delivered)
+    outbox.start()
+    await outbox.stop(drain_timeout=2)
+    assert delivered == ["reservation:1"]
+
+
+async def test_entries_claimed_by_a_crashed_process_are_delivered_after_the_lease(store):
+    store.insert([[_entry("reservation:1")]])
+    # Another process claimed it and died before completing
+    assert len(store.claim(limit=10, lease=settings.outbox_lease_seconds)) == 1
+
+    delivered = []
+    outbox = _outbox(store, delivered)
+    outbox.start()
+    await asyncio.sleep(settings.outbox_lease_seconds + 0.3)
+    await outbox.stop(drain_timeout=2)
+
+    assert delivered == ["reservation:1"]
+    assert store.counts() == {"sent": 1}